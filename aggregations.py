@@ -0,0 +1,516 @@
+import copy
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class Aggregates:
+    """Contagens e somas por risco que alimentam os cards de métricas e os gráficos.
+
+    counts: contagem por classe de risco, na ordem de risk_labels.
+    sums: {medida: soma por classe de risco}.
+    dimensions: {coluna: (rótulos, matriz rótulos x risco com as contagens)}.
+    bin_edges: {coluna: bordas} dos histogramas guardados em dimensions['<coluna>_bins'].
+    """
+
+    def __init__(self, risk_labels, counts, sums, dimensions, bin_edges=None):
+        self.risk_labels = list(risk_labels)
+        self.counts = counts
+        self.sums = sums
+        self.dimensions = dimensions
+        self.bin_edges = bin_edges or {}
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    @property
+    def empty(self):
+        return self.total == 0
+
+    @property
+    def nbytes(self):
+        """Bytes ocupados pelas contagens e somas (não depende do número de linhas)."""
+        return (
+            self.counts.nbytes
+            + sum(values.nbytes for values in self.sums.values())
+            + sum(matrix.nbytes for _, matrix in self.dimensions.values())
+        )
+
+    def __add__(self, other):
+        return Aggregates(
+            self.risk_labels,
+            self.counts + other.counts,
+            {measure: self.sums[measure] + other.sums[measure] for measure in self.sums},
+            {
+                name: (labels, matrix + other.dimensions[name][1])
+                for name, (labels, matrix) in self.dimensions.items()
+            },
+            self.bin_edges,
+        )
+
+    def __sub__(self, other):
+        return Aggregates(
+            self.risk_labels,
+            self.counts - other.counts,
+            {measure: self.sums[measure] - other.sums[measure] for measure in self.sums},
+            {
+                name: (labels, matrix - other.dimensions[name][1])
+                for name, (labels, matrix) in self.dimensions.items()
+            },
+            self.bin_edges,
+        )
+
+    def risk_counts(self):
+        """Equivalente a df['risk'].value_counts() sobre as linhas agregadas."""
+        return self._value_counts(self.risk_labels, self.counts, 'risk')
+
+    def value_counts(self, column):
+        """Equivalente a df[column].value_counts() sobre as linhas agregadas."""
+        labels, matrix = self.dimensions[column]
+        return self._value_counts(labels, matrix.sum(axis=1), column)
+
+    def crosstab(self, column, normalize=False):
+        """Equivalente a pd.crosstab(df[column], df['risk'], normalize=normalize)."""
+        labels, matrix = self.dimensions[column]
+        table = pd.DataFrame(
+            matrix,
+            index=pd.Index(labels, name=column),
+            columns=pd.Index(self.risk_labels, name='risk'),
+        )
+        table = table.loc[table.sum(axis=1) > 0, table.sum(axis=0) > 0]
+        if normalize == 'index':
+            table = table.div(table.sum(axis=1), axis=0)
+        return table
+
+    def histogram(self, column):
+        """Bordas e contagens por faixa do histograma pré-calculado de `column`."""
+        _, matrix = self.dimensions[f'{column}_bins']
+        return self.bin_edges[column], matrix.sum(axis=1)
+
+    def mean(self, measure):
+        total = self.total
+        return self.sums[measure].sum() / total if total else float('nan')
+
+    @staticmethod
+    def _value_counts(labels, counts, name):
+        series = pd.Series(counts, index=pd.Index(labels, name=name), name='count')
+        return series[series > 0].sort_values(ascending=False, kind='stable')
+
+
+class CreditCube:
+    """Cubo pré-agregado risco x idade x faixa de valor do crédito x cada dimensão categórica.
+
+    Cada célula guarda a contagem de linhas (e, no cubo base, a soma de credit_amount).
+    As consultas somam apenas as células dentro dos filtros; as faixas de crédito
+    cortadas pelos limites do slider são completadas com as linhas dessas faixas,
+    localizadas pelo índice ordenado de credit_amount do FilterIndex.
+
+    histogram_bins define colunas numéricas cujos histogramas (faixas de mesma
+    largura sobre todo o dataset) entram no cubo como dimensões '<coluna>_bins';
+    cada valor é o número de faixas ou as bordas já definidas. age_bounds fixa as
+    idades do cubo (padrão: as do dataset). Cubos de partes de um dataset com as
+    mesmas categorias, bordas e idades dão Aggregates que podem ser somados.
+    """
+
+    def __init__(self, df, filter_index, credit_buckets=32, histogram_bins=None, chunk_rows=1 << 20,
+                 age_bounds=None):
+        self.risk_labels = df['risk'].cat.categories.tolist()
+
+        ages = df['age_in_years'].to_numpy()
+        age_low, age_high = age_bounds or (ages.min(), ages.max())
+        self.age_min = int(age_low)
+        self.age_values = np.arange(self.age_min, int(age_high) + 1)
+
+        # Menor valor de cada faixa de crédito (quantis do índice ordenado)
+        _, sorted_credit, _ = filter_index.sorted_indexes['credit_amount']
+        self.bucket_min = np.unique(
+            np.quantile(sorted_credit, np.linspace(0, 1, credit_buckets + 1)[:-1], method='lower')
+        )
+        self.bin_edges = {
+            column: np.histogram_bin_edges(df[column].to_numpy(), bins=n_bins)
+            for column, n_bins in (histogram_bins or {}).items()
+        }
+        self._index_rows(df, filter_index)
+
+        self.shape = (len(self.risk_labels), len(self.age_values), len(self.bucket_min))
+        self.counts = np.zeros(self.shape, dtype=np.int64)
+        self.credit_sums = np.zeros(self.shape)
+        self.dimension_counts = {
+            column: np.zeros((len(labels),) + self.shape, dtype=np.int64)
+            for column, (labels, _) in self.dimension_codes.items()
+        }
+        self._accumulate(0, chunk_rows)
+
+    def _index_rows(self, df, filter_index):
+        """Códigos de cada linha e posições das faixas de crédito no índice ordenado, pelas faixas do cubo."""
+        self.risk_codes = df['risk'].cat.codes.to_numpy()
+        self.age_codes = (df['age_in_years'].to_numpy() - self.age_min).astype(np.int16)
+        self.credit = df['credit_amount'].to_numpy()
+        order, sorted_credit, _ = filter_index.sorted_indexes['credit_amount']
+        self.credit_order = order
+        self.bucket_starts = np.append(np.searchsorted(sorted_credit, self.bucket_min, side='left'), len(sorted_credit))
+        self.bucket_max = sorted_credit[self.bucket_starts[1:] - 1]
+
+        self.dimension_codes = {
+            column: (df[column].cat.categories.tolist(), df[column].cat.codes.to_numpy())
+            for column in df.select_dtypes('category').columns
+            if column != 'risk'
+        }
+        for column, column_edges in self.bin_edges.items():
+            values = df[column].to_numpy()
+            n_bins = len(column_edges) - 1
+            codes = np.clip(np.searchsorted(column_edges, values, side='right') - 1, 0, n_bins - 1)
+            self.dimension_codes[f'{column}_bins'] = (column_edges[:-1].tolist(), codes.astype(np.int16))
+
+    def _accumulate(self, start, chunk_rows):
+        """Soma às células as linhas a partir de `start`, por blocos (memória temporária limitada ao bloco)."""
+        n_cells = self.counts.size
+        counts = self.counts.reshape(-1)
+        credit_sums = self.credit_sums.reshape(-1)
+        dimension_counts = {column: values.reshape(len(values), -1) for column, values in self.dimension_counts.items()}
+        for chunk_start in range(start, len(self.credit), chunk_rows):
+            chunk = slice(chunk_start, chunk_start + chunk_rows)
+            cell = self.row_cells(chunk)
+            known = cell >= 0
+            counts += np.bincount(cell[known], minlength=n_cells)
+            credit_sums += np.bincount(cell[known], weights=self.credit[chunk][known], minlength=n_cells)
+            chunk_columns = {column: (labels, codes[chunk]) for column, (labels, codes) in self.dimension_codes.items()}
+            for column, chunk_counts in self._count_by(cell, n_cells, chunk_columns).items():
+                dimension_counts[column] += chunk_counts
+
+    def row_cells(self, rows):
+        """Célula (risco, idade, faixa de crédito) de cada linha em `rows`, como índice plano.
+
+        Linhas sem risco (código -1) ficam fora de todos os filtros e recebem -1.
+        """
+        risk_codes = self.risk_codes[rows]
+        bucket_codes = np.searchsorted(self.bucket_min, self.credit[rows], side='right') - 1
+        cells = np.ravel_multi_index((np.maximum(risk_codes, 0), self.age_codes[rows], bucket_codes), self.shape)
+        cells[risk_codes < 0] = -1
+        return cells
+
+    def extended(self, df, filter_index, chunk_rows=1 << 20):
+        """Cubo de df, cujas primeiras linhas são as deste cubo, somando às células só as linhas novas.
+
+        As faixas (idades, crédito, histogramas) e as categorias continuam as deste cubo;
+        retorna None se alguma linha nova cair fora delas (o cubo precisa ser reconstruído).
+        As faixas de crédito deixam de ser quantis exatos, o que não muda os resultados.
+        """
+        start = len(self.credit)
+        if len(df) <= start:
+            return None
+        categories = {column: df[column].cat.categories.tolist() for column in df.select_dtypes('category').columns}
+        expected = {'risk': self.risk_labels}
+        expected.update({
+            column: labels for column, (labels, _) in self.dimension_codes.items()
+            if not (column.endswith('_bins') and column[:-5] in self.bin_edges)
+        })
+        ages = df['age_in_years'].to_numpy()[start:]
+        if (
+            categories != expected
+            or ages.min() < self.age_values[0] or ages.max() > self.age_values[-1]
+            or df['credit_amount'].to_numpy()[start:].min() < self.bucket_min[0]
+        ):
+            return None
+        for column, column_edges in self.bin_edges.items():
+            values = df[column].to_numpy()[start:]
+            if values.min() < column_edges[0] or values.max() > column_edges[-1]:
+                return None
+
+        cube = copy.copy(self)
+        cube._index_rows(df, filter_index)
+        cube.counts = self.counts.copy()
+        cube.credit_sums = self.credit_sums.copy()
+        cube.dimension_counts = {column: values.copy() for column, values in self.dimension_counts.items()}
+        cube._accumulate(start, chunk_rows)
+        return cube
+
+    @property
+    def n_cells(self):
+        return self.counts.size + sum(counts.size for counts in self.dimension_counts.values())
+
+    def query(self, risk=None, age_range=None, credit_range=None):
+        """Agrega as linhas com risco em `risk` e idade/crédito dentro dos intervalos (inclusive)."""
+        risk_mask, age_mask, inside, rows = self.split(risk, age_range, credit_range)
+        result = self._from_cells(risk_mask, age_mask, inside)
+        if rows is not None:
+            result = result + self.aggregate_rows(rows)
+        return result
+
+    def split(self, risk=None, age_range=None, credit_range=None):
+        """Divide os filtros entre células inteiras e linhas avulsas.
+
+        Retorna as máscaras de risco, idade e faixas de crédito inteiramente dentro do
+        filtro, e as posições das linhas das faixas cortadas pelo filtro de crédito que
+        estão dentro dos filtros (None se não houver faixa cortada).
+        """
+        risk_mask = np.ones(len(self.risk_labels), dtype=bool) if risk is None else np.isin(self.risk_labels, list(risk))
+        age_low, age_high = age_range or (self.age_values[0], self.age_values[-1])
+        credit_low, credit_high = credit_range or (self.bucket_min[0], self.bucket_max[-1])
+
+        age_mask = (self.age_values >= age_low) & (self.age_values <= age_high)
+        overlaps = (self.bucket_max >= credit_low) & (self.bucket_min <= credit_high)
+        inside = (self.bucket_min >= credit_low) & (self.bucket_max <= credit_high)
+
+        partial = np.flatnonzero(overlaps & ~inside)
+        if not (partial.size and risk_mask.any() and age_mask.any()):
+            return risk_mask, age_mask, inside, None
+        rows = np.concatenate([
+            self.credit_order[self.bucket_starts[b]:self.bucket_starts[b + 1]] for b in partial
+        ])
+        ages = self.age_codes[rows] + self.age_min
+        credit = self.credit[rows]
+        risk_codes = self.risk_codes[rows]
+        keep = (
+            (risk_codes >= 0) & risk_mask[risk_codes]
+            & (ages >= age_low) & (ages <= age_high)
+            & (credit >= credit_low) & (credit <= credit_high)
+        )
+        return risk_mask, age_mask, inside, rows[keep]
+
+    def aggregate_rows(self, rows):
+        """Agrega diretamente um conjunto de posições de linha numa única passada."""
+        n_risk = len(self.risk_labels)
+        risk_codes = self.risk_codes[rows]
+        columns = {'age_in_years': (self.age_values, self.age_codes), **self.dimension_codes}
+        dimensions = self._count_by(risk_codes, n_risk, columns, rows)
+        credit_sums = np.bincount(risk_codes, weights=self.credit[rows], minlength=n_risk)
+        age_counts = dimensions.pop('age_in_years').T
+        return self._build(age_counts, credit_sums, dimensions)
+
+    @staticmethod
+    def _count_by(base, base_size, columns, rows=None, chunk_rows=1 << 20):
+        """Conta base x código de cada coluna com um único bincount sobre as chaves combinadas.
+
+        Cada coluna recebe um deslocamento próprio no vetor de contagens, de forma que
+        todas as tabelas saem da mesma passada. Valores ausentes (código -1) não são
+        contados, como no value_counts, nem as linhas com base negativa (sem célula).
+        Retorna {coluna: matriz rótulos x base}.
+        """
+        sizes = [len(labels) * base_size for labels, _ in columns.values()]
+        offsets = np.cumsum([0] + sizes[:-1])
+        # A última posição recebe as chaves descartadas e fica fora das tabelas
+        discard = sum(sizes)
+        counts = np.zeros(discard + 1, dtype=np.int64)
+        for start in range(0, len(base), chunk_rows):
+            chunk = slice(start, start + chunk_rows)
+            keys = np.empty((len(base[chunk]), len(columns)), dtype=np.int64)
+            for j, (_, codes) in enumerate(columns.values()):
+                keys[:, j] = codes[chunk] if rows is None else codes[rows[chunk]]
+            missing = keys < 0
+            missing |= base[chunk, None] < 0
+            keys *= base_size
+            keys += base[chunk, None]
+            keys += offsets
+            keys[missing] = discard
+            counts += np.bincount(keys.ravel(), minlength=counts.size)
+        return {
+            column: counts[offset:offset + size].reshape(len(labels), base_size)
+            for (column, (labels, _)), offset, size in zip(columns.items(), offsets, sizes)
+        }
+
+    def _from_cells(self, risk_mask, age_mask, bucket_mask):
+        selection = np.ix_(risk_mask, age_mask, bucket_mask)
+        n_risk = len(self.risk_labels)
+        age_counts = np.zeros((n_risk, len(self.age_values)), dtype=np.int64)
+        age_counts[np.ix_(risk_mask, age_mask)] = self.counts[selection].sum(axis=2)
+        credit_sums = np.zeros(n_risk)
+        credit_sums[risk_mask] = self.credit_sums[selection].sum(axis=(1, 2))
+        dimensions = {}
+        for column, counts in self.dimension_counts.items():
+            matrix = np.zeros((counts.shape[0], n_risk), dtype=np.int64)
+            matrix[:, risk_mask] = counts[(slice(None),) + selection].sum(axis=(2, 3))
+            dimensions[column] = matrix
+        return self._build(age_counts, credit_sums, dimensions)
+
+    def _build(self, age_counts, credit_sums, dimensions):
+        labelled = {'age_in_years': (self.age_values.tolist(), age_counts.T)}
+        labelled.update({
+            column: (self.dimension_codes[column][0], matrix) for column, matrix in dimensions.items()
+        })
+        return Aggregates(
+            self.risk_labels,
+            age_counts.sum(axis=1),
+            {'age_in_years': age_counts @ self.age_values, 'credit_amount': credit_sums},
+            labelled,
+            self.bin_edges,
+        )
+
+
+class Crosstab:
+    """Tabela de contingência de duas colunas categóricas sobre as linhas agregadas.
+
+    counts: matriz rótulos de `rows` x rótulos de `columns` com as contagens.
+    """
+
+    def __init__(self, rows, row_labels, columns, column_labels, counts):
+        self.rows = rows
+        self.row_labels = list(row_labels)
+        self.columns = columns
+        self.column_labels = list(column_labels)
+        self.counts = counts
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    @property
+    def empty(self):
+        return self.total == 0
+
+    def __add__(self, other):
+        return Crosstab(self.rows, self.row_labels, self.columns, self.column_labels, self.counts + other.counts)
+
+    def table(self, normalize=False):
+        """Equivalente a pd.crosstab(df[rows], df[columns], normalize=normalize), sem linhas e colunas vazias."""
+        table = pd.DataFrame(
+            self.counts,
+            index=pd.Index(self.row_labels, name=self.rows),
+            columns=pd.Index(self.column_labels, name=self.columns),
+        )
+        table = table.loc[table.sum(axis=1) > 0, table.sum(axis=0) > 0]
+        if normalize == 'index':
+            table = table.div(table.sum(axis=1), axis=0)
+        elif normalize == 'columns':
+            table = table.div(table.sum(axis=0), axis=1)
+        elif normalize == 'all':
+            table = table / table.to_numpy().sum()
+        return table
+
+
+class PairCube:
+    """Tabelas de contingência de qualquer par de colunas categóricas, pelas células de um CreditCube.
+
+    Para cada par pedido guarda a contagem de cada combinação de categorias em cada
+    célula risco x idade x faixa de crédito do cubo; uma consulta soma as células
+    dentro dos filtros e completa as faixas de crédito cortadas com as linhas delas,
+    como CreditCube.query. As tabelas de um par são montadas numa passada pelas
+    linhas na primeira consulta e reaproveitadas nas seguintes (também para o par
+    invertido).
+    """
+
+    def __init__(self, cube, chunk_rows=1 << 20):
+        self.cube = cube
+        self.chunk_rows = chunk_rows
+        self.dimensions = {'risk': (cube.risk_labels, cube.risk_codes)}
+        self.dimensions.update({
+            column: codes for column, codes in cube.dimension_codes.items()
+            if not (column.endswith('_bins') and column[:-5] in cube.bin_edges)
+        })
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def columns(self):
+        return list(self.dimensions)
+
+    def pair_counts(self, rows, columns):
+        """Contagens (rótulos de rows x rótulos de columns) x célula do cubo, montadas na primeira chamada."""
+        key = tuple(sorted((rows, columns)))
+        with self._lock:
+            counts = self._counts.get(key)
+        if counts is None:
+            counts = self._build(*key)
+            with self._lock:
+                counts = self._counts.setdefault(key, counts)
+        return counts if key == (rows, columns) else counts.transpose(1, 0, 2, 3, 4)
+
+    def _build(self, rows, columns):
+        (row_labels, row_codes), (column_labels, column_codes) = self.dimensions[rows], self.dimensions[columns]
+        n_rows, n_columns, n_cells = len(row_labels), len(column_labels), self.cube.counts.size
+        counts = np.zeros((n_rows, n_columns) + self.cube.shape, dtype=np.int64)
+        flat = counts.reshape(-1)
+        for start in range(0, len(self.cube.credit), self.chunk_rows):
+            chunk = slice(start, start + self.chunk_rows)
+            cells = self.cube.row_cells(chunk)
+            # Linhas com valor ausente (código -1) em qualquer das duas colunas ou sem risco
+            # ficam de fora, como no pd.crosstab
+            known = (row_codes[chunk] >= 0) & (column_codes[chunk] >= 0) & (cells >= 0)
+            keys = row_codes[chunk][known].astype(np.int64) * n_columns + column_codes[chunk][known]
+            keys *= n_cells
+            keys += cells[known]
+            flat += np.bincount(keys, minlength=flat.size)
+        return counts
+
+    def query(self, rows, columns, risk=None, age_range=None, credit_range=None):
+        """Crosstab de `rows` x `columns` das linhas dentro dos filtros."""
+        (row_labels, row_codes), (column_labels, column_codes) = self.dimensions[rows], self.dimensions[columns]
+        risk_mask, age_mask, inside, selected = self.cube.split(risk, age_range, credit_range)
+        cells = self.pair_counts(rows, columns)[(slice(None), slice(None)) + np.ix_(risk_mask, age_mask, inside)]
+        counts = cells.sum(axis=(2, 3, 4))
+        if selected is not None:
+            selected = selected[(row_codes[selected] >= 0) & (column_codes[selected] >= 0)]
+            keys = row_codes[selected].astype(np.int64) * len(column_labels) + column_codes[selected]
+            counts += np.bincount(keys, minlength=counts.size).reshape(counts.shape)
+        return Crosstab(rows, row_labels, columns, column_labels, counts)
+
+
+class DensityGrid:
+    """Grade 2D fixa (x por y) por classe de risco para desenhar dispersões agregadas.
+
+    A célula de cada linha é calculada uma vez; contar uma seleção é um único
+    bincount, e o tamanho do resultado depende só da grade, não do número de linhas.
+    Linhas sem risco (código -1) ficam numa célula de descarte, fora das contagens.
+    """
+
+    def __init__(self, df, x, y, x_bins=40, y_bins=30, chunk_rows=1 << 20):
+        self.risk_labels = df['risk'].cat.categories.tolist()
+        x_values, y_values = df[x].to_numpy(), df[y].to_numpy()
+        risk_codes = df['risk'].cat.codes.to_numpy()
+        self.x_edges = np.histogram_bin_edges(x_values, bins=x_bins)
+        self.y_edges = np.histogram_bin_edges(y_values, bins=y_bins)
+        self.shape = (len(self.risk_labels), x_bins, y_bins)
+        self.discard = int(np.prod(self.shape))
+        self.cells = np.empty(len(df), dtype=np.int32)
+        for start in range(0, len(df), chunk_rows):
+            chunk = slice(start, start + chunk_rows)
+            self.cells[chunk] = self._cells(x_values[chunk], y_values[chunk], risk_codes[chunk])
+        self.columns = (x, y)
+
+    def _cells(self, x_values, y_values, risk_codes):
+        _, x_bins, y_bins = self.shape
+        x_codes = np.clip(np.searchsorted(self.x_edges, x_values, side='right') - 1, 0, x_bins - 1)
+        y_codes = np.clip(np.searchsorted(self.y_edges, y_values, side='right') - 1, 0, y_bins - 1)
+        cells = np.ravel_multi_index((np.maximum(risk_codes, 0), x_codes, y_codes), self.shape)
+        cells[risk_codes < 0] = self.discard
+        return cells
+
+    def extended(self, df):
+        """Grade de df, cujas primeiras linhas são as desta grade, calculando a célula só das linhas novas.
+
+        Retorna None se alguma linha nova cair fora das faixas atuais ou trouxer outro risco.
+        """
+        start = len(self.cells)
+        x, y = self.columns
+        x_values, y_values = df[x].to_numpy()[start:], df[y].to_numpy()[start:]
+        if (
+            len(df) <= start
+            or df['risk'].cat.categories.tolist() != self.risk_labels
+            or x_values.min() < self.x_edges[0] or x_values.max() > self.x_edges[-1]
+            or y_values.min() < self.y_edges[0] or y_values.max() > self.y_edges[-1]
+        ):
+            return None
+        grid = copy.copy(self)
+        tail = self._cells(x_values, y_values, df['risk'].cat.codes.to_numpy()[start:])
+        grid.cells = np.concatenate([self.cells, tail.astype(np.int32)])
+        return grid
+
+    def counts(self, rows):
+        """Contagens risco x faixa de x x faixa de y das linhas selecionadas."""
+        counts = np.bincount(self.cells[rows], minlength=self.discard + 1)
+        return counts[:self.discard].reshape(self.shape)
+
+    def cells_frame(self, rows):
+        """Células não vazias como DataFrame (risk, x, y, count), com x e y no centro de cada faixa."""
+        counts = self.counts(rows)
+        risk_idx, x_idx, y_idx = np.nonzero(counts)
+        x_centers = (self.x_edges[:-1] + self.x_edges[1:]) / 2
+        y_centers = (self.y_edges[:-1] + self.y_edges[1:]) / 2
+        return pd.DataFrame({
+            'risk': np.asarray(self.risk_labels)[risk_idx],
+            'x': x_centers[x_idx],
+            'y': y_centers[y_idx],
+            'count': counts[risk_idx, x_idx, y_idx],
+        })
@@ -0,0 +1,277 @@
+"""Endpoint HTTP JSON local com as métricas e figuras do dashboard, sem Streamlit.
+
+As requisições são atendidas por um pool de threads que compartilham o mesmo
+Dashboard (dataset mapeado em memória, índices, cubo e cache de figuras).
+
+Uso:
+    python api.py --port 8502 --workers 8
+    curl 'http://127.0.0.1:8502/dashboard?risk=Bad%20Risk&age_range=25,40&charts=risk_by_age'
+    curl -X POST http://127.0.0.1:8502/dashboard -d '{"filters": {"credit_range": [1000, 3000]}}'
+    curl 'http://127.0.0.1:8502/crosstab?rows=purpose&columns=housing_type&normalize=index&risk=Bad%20Risk'
+    curl -OJ 'http://127.0.0.1:8502/export?format=parquet&age_range=25,40'
+
+Rotas:
+    GET  /health      estado do servidor
+    GET  /summary     opções e limites dos filtros
+    GET  /dashboard   filtros na query string (risk e periods repetíveis, age_range=min,max,
+                      credit_range=min,max, charts=a,b)
+    POST /dashboard   {"filters": {...}, "charts": [...]} no corpo
+    GET  /crosstab    tabela cruzada: rows=coluna, columns=coluna, normalize=index|columns|all
+                      e os mesmos filtros de /dashboard
+    GET  /export      linhas dentro dos filtros de /dashboard, format=csv|parquet, enviadas
+                      em blocos (Transfer-Encoding: chunked)
+"""
+import argparse
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import export
+from dashboard import (
+    CHART_POOL, CHART_WORKERS, CHARTS, DATA_PATH, WATCH_INTERVAL, Dashboard, compute_crosstab, compute_dashboard,
+    to_json,
+)
+
+
+logger = logging.getLogger("credit_dashboard.api")
+
+# Tamanho máximo aceito para o corpo de um POST
+MAX_BODY_BYTES = 64 * 1024
+
+
+class BadRequest(ValueError):
+    """Parâmetros inválidos enviados pelo cliente (respondidos com 400)."""
+
+
+def parse_range(text):
+    try:
+        low, high = (int(part) for part in text.split(","))
+    except ValueError:
+        raise BadRequest(f"Intervalo inválido: {text!r} (esperado min,max)") from None
+    return low, high
+
+
+def check_charts(charts):
+    unknown = [name for name in charts or () if name not in CHARTS]
+    if unknown:
+        raise BadRequest(f"Gráficos desconhecidos: {', '.join(unknown)}")
+    return charts
+
+
+def filters_from_query(query):
+    """Filtros e gráficos de uma query string; parâmetros ausentes não filtram."""
+    params = parse_qs(query, keep_blank_values=True)
+    filters = {}
+    for name in ('risk', 'periods'):
+        if name in params:
+            filters[name] = [value for value in params[name] if value]
+    for name in ('age_range', 'credit_range'):
+        if name in params:
+            filters[name] = parse_range(params[name][-1])
+    charts = params['charts'][-1].split(",") if 'charts' in params else None
+    return filters, check_charts(charts)
+
+
+def crosstab_from_query(query, columns):
+    """Filtros, colunas cruzadas e normalização de /crosstab; columns são as colunas aceitas."""
+    filters, _ = filters_from_query(query)
+    params = parse_qs(query, keep_blank_values=True)
+    rows, cross = (params[name][-1] if name in params else None for name in ('rows', 'columns'))
+    if rows not in columns or cross not in columns:
+        raise BadRequest(f"'rows' e 'columns' devem ser colunas entre: {', '.join(columns)}")
+    normalize = params['normalize'][-1] if 'normalize' in params else ''
+    if normalize not in ('', 'index', 'columns', 'all'):
+        raise BadRequest(f"Normalização inválida: {normalize!r} (esperado index, columns ou all)")
+    return filters, rows, cross, normalize or False
+
+
+def export_from_query(query):
+    """Filtros e formato de /export."""
+    filters, _ = filters_from_query(query)
+    params = parse_qs(query, keep_blank_values=True)
+    fmt = params['format'][-1] if 'format' in params else 'csv'
+    if fmt not in export.FORMATS:
+        raise BadRequest(f"Formato inválido: {fmt!r} (esperado {' ou '.join(export.FORMATS)})")
+    return filters, fmt
+
+
+def filters_from_body(body):
+    """Filtros e gráficos de um corpo JSON {"filters": {...}, "charts": [...]}."""
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError as error:
+        raise BadRequest(f"JSON inválido: {error}") from None
+    filters = payload.get('filters') or {}
+    charts = payload.get('charts')
+    if not isinstance(filters, dict) or not all(isinstance(filters.get(name, []), list) for name in ('risk', 'periods')):
+        raise BadRequest("'filters' deve ser um objeto e 'risk' e 'periods' listas")
+    if charts is not None and not isinstance(charts, list):
+        raise BadRequest("'charts' deve ser uma lista")
+    for name in ('age_range', 'credit_range'):
+        if name in filters:
+            value = filters[name]
+            if not isinstance(value, list) or len(value) != 2 or not all(isinstance(v, (int, float)) for v in value):
+                raise BadRequest(f"'{name}' deve ser [min, max]")
+    return filters, check_charts(charts)
+
+
+class DashboardRequestHandler(BaseHTTPRequestHandler):
+    server_version = "CreditDashboardAPI/1.0"
+    protocol_version = "HTTP/1.1"
+    # Conexões keep-alive ociosas liberam a thread do pool depois deste tempo
+    timeout = 10
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/health':
+            self.send_json(json.dumps({'status': 'ok', 'version': self.server.dashboard.version}))
+        elif url.path == '/summary':
+            dashboard = self.server.dashboard
+            self.send_json(json.dumps(
+                {**dashboard.summary, 'charts': list(CHARTS), 'crosstab_columns': dashboard.crosstab_columns},
+                ensure_ascii=False,
+            ))
+        elif url.path == '/dashboard':
+            self.respond_dashboard(lambda: filters_from_query(url.query))
+        elif url.path == '/crosstab':
+            self.respond_crosstab(url.query)
+        elif url.path == '/export':
+            self.respond_export(url.query)
+        else:
+            self.send_error_json(404, f"Rota desconhecida: {url.path}")
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/dashboard':
+            self.send_error_json(404, f"Rota desconhecida: {self.path}")
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            self.send_error_json(413, "Corpo da requisição muito grande")
+            return
+        body = self.rfile.read(length)
+        self.respond_dashboard(lambda: filters_from_body(body))
+
+    def respond_dashboard(self, parse):
+        try:
+            filters, charts = parse()
+            result = compute_dashboard(filters, charts, dashboard=self.server.dashboard)
+        except BadRequest as error:
+            self.send_error_json(400, str(error))
+            return
+        self.send_json(to_json(result))
+
+    def respond_crosstab(self, query):
+        try:
+            filters, rows, columns, normalize = crosstab_from_query(query, self.server.dashboard.crosstab_columns)
+            result = compute_crosstab(rows, columns, filters, normalize, dashboard=self.server.dashboard)
+        except BadRequest as error:
+            self.send_error_json(400, str(error))
+            return
+        self.send_json(json.dumps(result, ensure_ascii=False))
+
+    def respond_export(self, query):
+        dashboard = self.server.dashboard
+        try:
+            filters, fmt = export_from_query(query)
+        except BadRequest as error:
+            self.send_error_json(400, str(error))
+            return
+        normalized = dashboard.normalize(
+            filters.get('risk'), filters.get('age_range'), filters.get('credit_range'), filters.get('periods')
+        )
+        metadata, stream = export.stream_export(dashboard, normalized, fmt)
+        self.send_response(200)
+        self.send_header('Content-Type', export.FORMATS[fmt][0])
+        self.send_header('Content-Disposition', f'attachment; filename="{export.export_filename(metadata, fmt)}"')
+        self.send_header('X-Dataset-Version', metadata['dataset_version'])
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for data in stream:
+                if data:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.write(b"0\r\n\r\n")
+        except Exception:
+            # O status já foi enviado: a resposta fica truncada e a conexão é encerrada
+            self.close_connection = True
+            stream.close()
+            raise
+
+    def send_json(self, text, status=200):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message):
+        self.send_json(json.dumps({'error': message}, ensure_ascii=False), status)
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer que atende cada conexão num pool fixo de threads.
+
+    Diferente do ThreadingHTTPServer (uma thread nova por conexão), o número de
+    requisições calculadas ao mesmo tempo fica limitado a `workers`; as demais
+    esperam na fila do pool.
+    """
+
+    def __init__(self, address, dashboard, workers=8):
+        super().__init__(address, DashboardRequestHandler)
+        self.dashboard = dashboard
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-worker")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--workers", type=int, default=8, help="threads atendendo requisições")
+    parser.add_argument("--backend", choices=("memory", "sqlite", "partitioned"), default="memory")
+    parser.add_argument("--data", default=DATA_PATH, help="CSV de origem do dataset (ou diretório, com --backend partitioned)")
+    parser.add_argument("--chart-workers", type=int, default=CHART_WORKERS,
+                        help="workers que constroem as figuras em paralelo (0 = em sequência)")
+    parser.add_argument("--chart-pool", choices=("process", "thread"), default=CHART_POOL)
+    parser.add_argument("--watch-interval", type=float, default=WATCH_INTERVAL,
+                        help="segundos entre as verificações do CSV de origem (0 = não observa)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    dashboard = Dashboard(
+        args.data, backend=args.backend, chart_workers=args.chart_workers, chart_pool=args.chart_pool,
+        watch_interval=args.watch_interval,
+    )
+    server = PooledHTTPServer((args.host, args.port), dashboard, workers=args.workers)
+    print(f"{dashboard.summary['rows']:,} linhas carregadas; ouvindo em http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        dashboard.close()
+
+
+if __name__ == "__main__":
+    main()
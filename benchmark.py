@@ -0,0 +1,409 @@
+"""Mede cada etapa do pipeline do dashboard em datasets sintéticos de tamanhos diferentes.
+
+Para cada escala o benchmark gera (uma vez) o CSV sintético, ingere o snapshot,
+regrava as colunas derivadas, monta os índices e executa o bloco de filtros,
+os cards de métricas e cada função plot_* (e o caminho rápido equivalente de
+figure_specs.py), registrando tempo, pico de memória (tracemalloc) e tamanho do
+JSON de cada figura. Os resultados são gravados em
+JSON e podem ser comparados com uma execução anterior:
+
+    python benchmark.py --scales 10k 1m
+    python benchmark.py --scales 10k 1m --compare benchmark_results/anterior.json
+    python benchmark.py --scales 1m --chart-workers 4
+    python benchmark.py --scales 1m --append
+    python benchmark.py --scales 1m --partitions 12
+    python benchmark.py --scales 1m --export
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from aggregations import CreditCube, DensityGrid, PairCube
+from charts import (
+    plot_risk_distribution, plot_risk_by_age, plot_age_distribution, plot_personal_status,
+    plot_credit_amount_distribution, plot_credit_vs_duration, plot_purpose_distribution,
+    plot_housing_type_distribution, plot_risk_by_category,
+)
+import figure_specs
+from dashboard import APPROX_SAMPLE_ROWS, CHARTS, HISTOGRAM_BINS, SCATTER_GRID, Dashboard
+from export import FORMATS, stream_export
+from data import (
+    append_snapshot, build_snapshot, derive_columns, last_line_end, load_snapshot, load_sorted_indexes,
+    snapshot_dir_for,
+)
+from filters import FilterIndex
+from generate_data import CreditDataGenerator, SCALES, SOURCE_PATH
+from partitions import PartitionedSource, update_manifest
+from sampling import StratifiedSample
+from selection import IncrementalSelection
+from sql_backend import SQLiteBackend, build_database, database_path_for
+
+import pandas as pd
+import plotly.io as pio
+import plotly.tools
+
+
+DATA_DIR = ".bench_data"
+RESULTS_DIR = "benchmark_results"
+
+# Filtro representativo: intervalos que cortam faixas do cubo no meio
+BENCH_FILTERS = {
+    "risk": ["Good Risk", "Bad Risk"],
+    "age_range": (25, 50),
+    "credit_range": (1000, 8000),
+}
+
+
+def dataset_for(scale, n_rows):
+    """Caminho do CSV sintético da escala, gerando-o se ainda não existir."""
+    path = os.path.join(DATA_DIR, f"german_credit_{scale}.csv")
+    if not os.path.exists(path):
+        print(f"Gerando {n_rows:,} linhas em {path}...", file=sys.stderr)
+        CreditDataGenerator(pd.read_csv(SOURCE_PATH), seed=42).write_csv(path, n_rows)
+    return path
+
+
+def measure(func, repeat):
+    """Executa func repeat vezes e mais uma sob tracemalloc; retorna o último resultado e as métricas."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, {
+        "seconds": statistics.median(timings),
+        "seconds_min": min(timings),
+        "peak_bytes": peak,
+    }
+
+
+def plotly_chart_payload(figure_or_data):
+    """O que st.plotly_chart faz com a figura antes de enviá-la: valida e serializa."""
+    figure = plotly.tools.return_figure_from_figure_or_data(figure_or_data, validate_figure=True)
+    return pio.to_json(figure, validate=False)
+
+
+def metric_cards(aggregates):
+    """Mesmos valores calculados pelos cards de métricas do dashboard."""
+    risk_counts = aggregates.risk_counts()
+    return (
+        aggregates.total,
+        risk_counts.get("Good Risk", 0) / max(aggregates.total, 1) * 100,
+        aggregates.mean("age_in_years"),
+        aggregates.mean("credit_amount"),
+    )
+
+
+def bench_sqlite(csv_path, repeat, stages):
+    """Etapas do backend SQLite: construção do banco e a consulta dos filtros de referência."""
+    histogram_bins = {"age_in_years": 20, "credit_amount": 30}
+    _, stages["sqlite: construção do banco"] = measure(lambda: build_database(csv_path, histogram_bins=histogram_bins), 1)
+    backend = SQLiteBackend(database_path_for(csv_path))
+    _, stages["sqlite: filtros da sidebar"] = measure(lambda: backend.query(**BENCH_FILTERS), repeat)
+
+
+def bench_chart_pool(csv_path, repeat, workers, stages):
+    """As dez figuras da página (construção + JSON) em sequência e nos pools de gráficos."""
+    names = list(CHARTS)
+    sequential = Dashboard(csv_path, watch_interval=0)
+    filters = sequential.normalize(**BENCH_FILTERS)
+    aggregates = sequential.aggregate(filters)
+    _, stages["figuras da página (sequencial)"] = measure(
+        lambda: [sequential.serialize_figure(sequential.build_chart(name, filters, aggregates)) for name in names],
+        repeat,
+    )
+    for kind in ("process", "thread"):
+        dashboard = Dashboard(csv_path, chart_workers=workers, chart_pool=kind, watch_interval=0)
+        try:
+            _, stages[f"figuras da página (pool {kind}, {workers} workers)"] = measure(
+                lambda: dashboard.chart_pool.map(names, filters, aggregates), repeat
+            )
+        finally:
+            dashboard.close()
+
+
+def bench_append(csv_path, repeat, stages, tail_fraction=0.01):
+    """Append ao CSV: ingestão só das linhas novas e extensão do cubo, numa cópia do dataset.
+
+    A cópia começa sem a última fração (tail_fraction) das linhas, que é acrescentada
+    depois de o snapshot e o cubo estarem prontos.
+    """
+    histogram_bins = {"age_in_years": 20, "credit_amount": 30}
+    with tempfile.TemporaryDirectory(dir=DATA_DIR) as tmp_dir:
+        path = os.path.join(tmp_dir, os.path.basename(csv_path))
+        cut = last_line_end(csv_path, 0, int(os.path.getsize(csv_path) * (1 - tail_fraction)))
+        shutil.copyfile(csv_path, path)
+        os.truncate(path, cut)
+        build_snapshot(path)
+        df = load_snapshot(snapshot_dir_for(path))
+        cube = CreditCube(df, FilterIndex(df, bitmap_columns=(), presorted=load_sorted_indexes(df)),
+                          histogram_bins=histogram_bins)
+
+        with open(csv_path, "rb") as source, open(path, "ab") as target:
+            source.seek(cut)
+            shutil.copyfileobj(source, target)
+        _, stages["append: ingestão das linhas novas"] = measure(lambda: append_snapshot(path), 1)
+        df = load_snapshot(snapshot_dir_for(path))
+        filter_index = FilterIndex(df, bitmap_columns=(), presorted=load_sorted_indexes(df))
+        extended, stages["append: extensão do cubo"] = measure(lambda: cube.extended(df, filter_index), repeat)
+        if extended is None:
+            print("append: linhas novas fora das faixas do cubo (seria reconstruído)", file=sys.stderr)
+
+
+def bench_partitions(csv_path, n_rows, repeat, periods, stages):
+    """Fonte particionada por risco e período: manifesto, consulta a todos os períodos e a um só.
+
+    O diretório (mesmo número de linhas, em `periods` meses) é gerado uma vez ao lado do CSV.
+    """
+    directory = os.path.splitext(csv_path)[0] + f"_parts{periods}"
+    if not os.path.exists(directory):
+        print(f"Gerando {n_rows:,} linhas em {directory}...", file=sys.stderr)
+        months = pd.period_range("2024-01", periods=periods, freq="M").astype(str)
+        CreditDataGenerator(pd.read_csv(SOURCE_PATH), seed=42).write_partitions(directory, n_rows, months)
+    _, stages["partições: manifesto e snapshots"] = measure(lambda: update_manifest(directory), 1)
+
+    filters = (tuple(sorted(BENCH_FILTERS["risk"])), BENCH_FILTERS["age_range"], BENCH_FILTERS["credit_range"])
+    source = PartitionedSource(directory, histogram_bins=HISTOGRAM_BINS, scatter=SCATTER_GRID)
+    first_period = source.summary()["periods"][:1]
+    # A primeira consulta a um período carrega só as partições dele
+    _, stages["partições: primeira consulta (um período)"] = measure(lambda: source.query(*filters, first_period), 1)
+    _, stages["partições: primeira consulta (todos os períodos)"] = measure(lambda: source.query(*filters), 1)
+    _, stages["partições: consulta (um período)"] = measure(lambda: source.query(*filters, first_period), repeat)
+    _, stages["partições: consulta (todos os períodos)"] = measure(lambda: source.query(*filters), repeat)
+    source.close()
+
+
+def bench_export(csv_path, repeat, stages):
+    """Exportação das linhas dos filtros de referência em cada formato, sem gravar em disco.
+
+    O pico de memória depende do tamanho do bloco, não do número de linhas exportadas.
+    """
+    dashboard = Dashboard(csv_path, watch_interval=0)
+    filters = dashboard.normalize(**BENCH_FILTERS)
+
+    def run(fmt):
+        _, stream = stream_export(dashboard, filters, fmt)
+        return sum(len(data) for data in stream)
+
+    for fmt in FORMATS:
+        size, stages[f"exportação ({fmt})"] = measure(lambda: run(fmt), repeat)
+        stages[f"exportação ({fmt})"]["payload_bytes"] = size
+    dashboard.close()
+
+
+def bench_scale(csv_path, repeat, sqlite=False, chart_workers=0, append=False, partitions=0, export=False):
+    """Executa todas as etapas para um CSV e retorna {etapa: métricas}."""
+    stages = {}
+    snapshot_dir = snapshot_dir_for(csv_path)
+
+    _, stages["load_data (ingestão do CSV)"] = measure(lambda: build_snapshot(csv_path, snapshot_dir), 1)
+    _, stages["colunas derivadas (faixas)"] = measure(lambda: derive_columns(snapshot_dir), repeat)
+    df, stages["load_data (snapshot)"] = measure(lambda: load_snapshot(snapshot_dir), repeat)
+
+    filter_index, stages["índice de filtros"] = measure(
+        lambda: FilterIndex(
+            df, range_columns=("age_in_years", "credit_amount"), bitmap_columns=("risk",),
+            presorted=load_sorted_indexes(df),
+        ),
+        repeat,
+    )
+    cube, stages["cubo pré-agregado"] = measure(
+        lambda: CreditCube(df, filter_index, histogram_bins={"age_in_years": 20, "credit_amount": 30}), repeat
+    )
+    grid, stages["grade da dispersão"] = measure(
+        lambda: DensityGrid(df, "credit_amount", "duration_in_month", x_bins=40, y_bins=30), repeat
+    )
+
+    # Modo aproximado: só há níveis de amostra quando o dataset é bem maior que o primeiro nível
+    sample, stages["amostra estratificada"] = measure(
+        lambda: StratifiedSample(df, cube, first_rows=APPROX_SAMPLE_ROWS), repeat
+    )
+    if sample.levels:
+        _, stages["estimativa pela amostra (primeiro nível)"] = measure(
+            lambda: sample.query(0, BENCH_FILTERS["risk"], BENCH_FILTERS["age_range"], BENCH_FILTERS["credit_range"]),
+            repeat,
+        )
+
+    def apply_filters():
+        rows = filter_index.select(
+            categories={"risk": BENCH_FILTERS["risk"]},
+            ranges={"age_in_years": BENCH_FILTERS["age_range"], "credit_amount": BENCH_FILTERS["credit_range"]},
+        )
+        return rows, cube.query(**BENCH_FILTERS)
+
+    (rows, aggregates), stages["filtros da sidebar"] = measure(apply_filters, repeat)
+
+    # Arrasto do slider de idade em um ano, atualizado pela diferença em relação à seleção anterior
+    selection = IncrementalSelection(filter_index, cube)
+    selection.update(**BENCH_FILTERS)
+    age_low, age_high = BENCH_FILTERS["age_range"]
+    drags = itertools.count()
+    _, stages["filtros incrementais (arrasto)"] = measure(
+        lambda: selection.update(BENCH_FILTERS["risk"], (age_low, age_high + next(drags) % 2), BENCH_FILTERS["credit_range"]),
+        repeat,
+    )
+    _, stages["cards de métricas"] = measure(lambda: metric_cards(aggregates), repeat)
+
+    # Tabela cruzada de um par qualquer: a primeira consulta monta as tabelas do par, as seguintes só somam células
+    pairs = PairCube(cube)
+    _, stages["tabela cruzada (primeira consulta do par)"] = measure(
+        lambda: PairCube(cube).query("purpose", "credit_history", **BENCH_FILTERS), repeat
+    )
+    pairs.query("purpose", "credit_history", **BENCH_FILTERS)
+    _, stages["tabela cruzada (par já montado)"] = measure(
+        lambda: pairs.query("purpose", "credit_history", **BENCH_FILTERS), repeat
+    )
+    _, stages["tabela cruzada (pd.crosstab das linhas filtradas)"] = measure(
+        lambda: pd.crosstab(df["purpose"].to_numpy()[rows], df["credit_history"].to_numpy()[rows]), repeat
+    )
+
+    charts = {
+        "plot_risk_distribution": lambda: plot_risk_distribution(aggregates),
+        "plot_risk_by_age": lambda: plot_risk_by_age(aggregates),
+        "plot_age_distribution": lambda: plot_age_distribution(aggregates),
+        "plot_personal_status": lambda: plot_personal_status(aggregates),
+        "plot_credit_amount_distribution": lambda: plot_credit_amount_distribution(aggregates),
+        "plot_credit_vs_duration": lambda: plot_credit_vs_duration(df, rows, grid),
+        "plot_purpose_distribution": lambda: plot_purpose_distribution(aggregates),
+        "plot_housing_type_distribution": lambda: plot_housing_type_distribution(aggregates),
+        "plot_risk_by_category (purpose)": lambda: plot_risk_by_category(aggregates, "purpose", "Propósito", "Propósito"),
+        "plot_risk_by_category (employment_status)": lambda: plot_risk_by_category(
+            aggregates, "employment_status", "Status de Emprego", "Status de Emprego"
+        ),
+    }
+    fast_charts = {
+        "plot_risk_distribution": lambda: figure_specs.risk_distribution_spec(aggregates),
+        "plot_risk_by_age": lambda: figure_specs.risk_by_age_spec(aggregates),
+        "plot_age_distribution": lambda: figure_specs.age_distribution_spec(aggregates),
+        "plot_personal_status": lambda: figure_specs.personal_status_spec(aggregates),
+        "plot_credit_amount_distribution": lambda: figure_specs.credit_amount_distribution_spec(aggregates),
+        "plot_credit_vs_duration": lambda: figure_specs.credit_vs_duration_spec(df, rows, grid),
+        "plot_purpose_distribution": lambda: figure_specs.purpose_distribution_spec(aggregates),
+        "plot_housing_type_distribution": lambda: figure_specs.housing_type_distribution_spec(aggregates),
+        "plot_risk_by_category (purpose)": lambda: figure_specs.risk_by_category_spec(
+            aggregates, "purpose", "Propósito", "Propósito"
+        ),
+        "plot_risk_by_category (employment_status)": lambda: figure_specs.risk_by_category_spec(
+            aggregates, "employment_status", "Status de Emprego", "Status de Emprego"
+        ),
+    }
+    for name, build in charts.items():
+        fig, stages[name] = measure(build, repeat)
+        _, stages[f"{name} (serialização)"] = measure(fig.to_json, repeat)
+        payload = fig.to_json()
+        stages[name]["payload_bytes"] = len(payload)
+        # Envio pelo st.plotly_chart: o JSON em cache volta como go.Figure (pio.from_json)...
+        _, stages[f"{name} (renderização)"] = measure(lambda: plotly_chart_payload(pio.from_json(payload)), repeat)
+
+        # ...e no caminho rápido como dict, sem revalidar o template
+        spec, stages[f"{name} (rápido)"] = measure(fast_charts[name], repeat)
+        _, stages[f"{name} (rápido, serialização)"] = measure(lambda: figure_specs.to_json(spec), repeat)
+        fast_payload = figure_specs.to_json(spec)
+        stages[f"{name} (rápido)"]["payload_bytes"] = len(fast_payload)
+        _, stages[f"{name} (rápido, renderização)"] = measure(
+            lambda: plotly_chart_payload(json.loads(fast_payload)), repeat
+        )
+
+    if chart_workers:
+        bench_chart_pool(csv_path, repeat, chart_workers, stages)
+    if sqlite:
+        bench_sqlite(csv_path, repeat, stages)
+    if append:
+        bench_append(csv_path, repeat, stages)
+    if partitions:
+        bench_partitions(csv_path, len(df), repeat, partitions, stages)
+    if export:
+        bench_export(csv_path, repeat, stages)
+    return {"rows": len(df), "stages": stages}
+
+
+def compare(previous, current, threshold):
+    """Imprime a comparação etapa a etapa e retorna as regressões acima de threshold."""
+    regressions = []
+    for scale, result in current["results"].items():
+        before = previous["results"].get(scale)
+        if not before:
+            continue
+        print(f"\n== {scale} ==")
+        print(f"{'etapa':<66} {'antes (ms)':>12} {'agora (ms)':>12} {'razão':>8}")
+        for stage, metrics in result["stages"].items():
+            old = before["stages"].get(stage)
+            if not old:
+                continue
+            ratio = metrics["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+            flag = "  <-- regressão" if ratio > threshold else ""
+            print(f"{stage:<66} {old['seconds'] * 1000:>12.2f} {metrics['seconds'] * 1000:>12.2f} {ratio:>8.2f}{flag}")
+            if ratio > threshold:
+                regressions.append((scale, stage, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", default=["10k", "1m"], choices=sorted(SCALES))
+    parser.add_argument("--sqlite", action="store_true", help="inclui o backend SQLite")
+    parser.add_argument("--chart-workers", type=int, default=0,
+                        help="compara as figuras da página em sequência e em pools com N workers")
+    parser.add_argument("--append", action="store_true",
+                        help="inclui o append incremental de linhas ao CSV (numa cópia do dataset)")
+    parser.add_argument("--partitions", type=int, default=0,
+                        help="inclui a fonte particionada por risco e N períodos mensais")
+    parser.add_argument("--export", action="store_true", help="inclui a exportação das linhas filtradas (CSV e Parquet)")
+    parser.add_argument("--repeat", type=int, default=3, help="repetições por etapa (mediana)")
+    parser.add_argument("--output", help="arquivo JSON de saída (padrão: benchmark_results/<data>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=1.25, help="razão de tempo considerada regressão")
+    args = parser.parse_args()
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": {},
+    }
+    for scale in args.scales:
+        csv_path = dataset_for(scale, SCALES[scale])
+        print(f"Executando escala {scale}...", file=sys.stderr)
+        report["results"][scale] = bench_scale(
+            csv_path, args.repeat, sqlite=args.sqlite, chart_workers=args.chart_workers, append=args.append,
+            partitions=args.partitions, export=args.export,
+        )
+
+        print(f"\n== {scale} ({report['results'][scale]['rows']:,} linhas) ==")
+        print(f"{'etapa':<66} {'tempo (ms)':>12} {'pico (MB)':>10} {'payload (KB)':>13}")
+        for stage, metrics in report["results"][scale]["stages"].items():
+            payload = f"{metrics['payload_bytes'] / 1024:>13.1f}" if "payload_bytes" in metrics else f"{'':>13}"
+            print(f"{stage:<66} {metrics['seconds'] * 1000:>12.2f} {metrics['peak_bytes'] / 2**20:>10.1f} {payload}")
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"\nResultados gravados em {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} etapa(s) acima de {args.threshold:.2f}x o tempo anterior.")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
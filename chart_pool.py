@@ -0,0 +1,138 @@
+"""Construção paralela das figuras do dashboard num pool de processos ou de threads.
+
+No pool de processos cada worker abre o seu próprio Dashboard sobre o mesmo
+snapshot: as colunas são mapeadas em memória (np.memmap), então as páginas do
+dataset ficam no cache do sistema e são compartilhadas entre os processos, sem
+cópia. Uma tarefa recebe só o nome do gráfico e os filtros normalizados; o worker
+refaz os agregados (uma consulta ao cubo) e devolve o JSON da figura pronto.
+
+No pool de threads as tarefas usam o próprio Dashboard do processo e aproveitam
+apenas os trechos que liberam o GIL (NumPy, SQLite).
+"""
+import multiprocessing
+import sys
+import types
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+import plotly.io as pio
+
+
+# Tempo máximo (s) para todos os workers de processo subirem e carregarem o dataset
+WORKER_START_TIMEOUT = 300
+
+# Estado de cada processo worker: o Dashboard e os agregados dos últimos filtros
+_worker = {}
+
+
+def _init_worker(csv_path, backend, figures, template, started):
+    from dashboard import Dashboard
+
+    # Mesmo template padrão do processo principal (no Streamlit, o "streamlit"), que
+    # define as cores usadas pelas figuras
+    if template is not None:
+        name, layout = template
+        pio.templates[name] = layout
+        pio.templates.default = name
+    # O processo principal observa o CSV; o worker se atualiza quando recebe uma versão nova
+    dashboard = Dashboard(csv_path, backend=backend, figures=figures, chart_workers=0, watch_interval=0)
+    if backend == "memory":
+        # A grade da dispersão é construída sob demanda; o worker já sobe com ela pronta
+        dashboard.scatter_grid
+    _worker['dashboard'] = dashboard
+    _worker['filters'] = _worker['aggregates'] = None
+    # Nenhum worker fica livre antes de todos terem subido (ver ChartPool.__init__)
+    started.wait(timeout=WORKER_START_TIMEOUT)
+
+
+@contextmanager
+def _plain_main_module():
+    """Troca o módulo __main__ por um vazio enquanto os workers são criados.
+
+    Com spawn cada processo novo reimporta o __main__ do pai; dentro do Streamlit o
+    __main__ é o próprio script do app, que seria executado de novo em cada worker.
+    """
+    main = sys.modules['__main__']
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main
+
+
+def _default_template():
+    """(nome, template) padrão do Plotly neste processo, para repetir nos workers."""
+    name = pio.templates.default
+    return (name, pio.templates[name].to_plotly_json()) if name else None
+
+
+def _worker_ready():
+    return True
+
+
+def _build_figure(name, filters, version):
+    """JSON da figura `name` construída no worker (as tarefas de uma página chegam com os mesmos filtros).
+
+    version é a versão do dataset no processo principal; se o worker estiver numa anterior,
+    ele recarrega o snapshot já atualizado pelo principal antes de construir a figura.
+    """
+    dashboard = _worker['dashboard']
+    if dashboard.version != version and dashboard.refresh():
+        _worker['filters'] = None
+    if _worker['filters'] != filters:
+        _worker['aggregates'] = dashboard.aggregate(filters)
+        _worker['filters'] = filters
+    return dashboard.serialize_figure(dashboard.build_chart(name, filters, _worker['aggregates']))
+
+
+class ChartPool:
+    """Pool que constrói e serializa várias figuras ao mesmo tempo.
+
+    kind="process" usa processos (iniciados na criação, com o dataset já carregado);
+    kind="thread" usa threads do mesmo processo. map() devolve os JSON na ordem pedida.
+    """
+
+    def __init__(self, dashboard, workers, kind="process"):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Tipo de pool desconhecido: {kind}")
+        self.dashboard = dashboard
+        self.workers = workers
+        self.kind = kind
+        if kind == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chart-worker")
+        else:
+            # spawn: o processo principal (Streamlit, servidor HTTP) tem threads rodando
+            context = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=context, initializer=_init_worker,
+                initargs=(
+                    dashboard.csv_path, dashboard.backend, dashboard.figures, _default_template(),
+                    context.Barrier(workers),
+                ),
+            )
+            # O executor cria um processo a cada tarefa enviada sem worker livre. Como os
+            # workers esperam uns pelos outros na inicialização, estas `workers` tarefas
+            # criam todos os processos agora, com o __main__ trocado, e o pool já fica aquecido.
+            with _plain_main_module():
+                ready = [self._executor.submit(_worker_ready) for _ in range(workers)]
+            for future in ready:
+                future.result()
+
+    def map(self, names, filters, aggregates, rows=None):
+        """JSON das figuras `names` para os filtros normalizados, na mesma ordem de `names`.
+
+        aggregates e rows() só são usados pelo pool de threads; os processos os recalculam.
+        """
+        if self.kind == "process":
+            version = self.dashboard.version
+            return list(self._executor.map(_build_figure, names, [filters] * len(names), [version] * len(names)))
+
+        dashboard = self.dashboard
+
+        def build(name):
+            return dashboard.serialize_figure(dashboard.build_chart(name, filters, aggregates, rows))
+
+        return list(self._executor.map(build, names))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
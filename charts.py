@@ -0,0 +1,255 @@
+import numpy as np
+import plotly.express as px
+
+
+# Acima deste número de pontos a dispersão passa a ser desenhada agregada em grade
+SCATTER_POINT_LIMIT = 5000
+
+
+def plot_risk_distribution(agg):
+            # Conta os tipos de risco
+    risk_counts = agg.risk_counts()
+    num_riscos = risk_counts.size
+
+    if num_riscos > 1:
+        # Quando tem mais de um risco, mostra proporção
+        risk_dist = risk_counts.reset_index()
+        risk_dist.columns = ['Risco', 'Contagem']
+        risk_dist['Proporcao'] = (risk_dist['Contagem'] / risk_dist['Contagem'].sum()) * 100
+
+        fig = px.bar(
+            risk_dist,
+            x=["Distribuição de Risco"] * num_riscos,
+            y='Proporcao',
+            color='Risco',
+            text='Proporcao',
+            labels={'Proporcao': 'Proporção (%)'},
+            title='Distribuição Percentual de Risco de Crédito',
+        )
+
+        fig.update_layout(
+            barmode='stack',
+            yaxis=dict(range=[0, 100]),
+            xaxis_title='',
+            yaxis_title='Proporção (%)',
+            showlegend=True
+        )
+
+        fig.update_traces(
+            texttemplate='%{text:.1f}%',
+            textposition='inside'
+        )
+
+    else:
+        # Quando só tem um risco, mostra a contagem absoluta
+        risco = risk_counts.index[0]
+        contagem = risk_counts.iloc[0]
+
+        df_count = {'Risco': [risco], 'Contagem': [contagem]}
+        fig = px.bar(
+            df_count,
+            x='Risco',
+            y='Contagem',
+            text='Contagem',
+            labels={'Contagem': 'Quantidade'},
+            title='Quantidade de Solicitantes por Tipo de Risco',
+        )
+
+        fig.update_traces(
+            texttemplate='%{text}',
+            textposition='outside'
+        )
+        fig.update_layout(
+            yaxis=dict(range=[0, contagem * 1.2]),
+            showlegend=False
+        )
+    return fig
+
+
+def plot_risk_by_age(agg):
+    """Gera um gráfico de barras empilhadas de risco por faixa etária."""
+    # Contagens por faixa etária x risco vindas do cubo (faixas derivadas na carga do dataset)
+    risk_by_age = agg.crosstab('age_band')
+    if risk_by_age.empty:
+        return px.bar(title="Dados insuficientes para Risco por Faixa Etária")
+
+    single_risk_class = len(risk_by_age.columns) == 1
+    normalize = 'index' if not single_risk_class else False
+
+    if normalize:
+        risk_by_age = risk_by_age.div(risk_by_age.sum(axis=1), axis=0)
+    
+    # Adiciona colunas ausentes com 0s
+    all_risks = ['Good Risk', 'Bad Risk']
+    for r in all_risks:
+        if r not in risk_by_age.columns:
+            risk_by_age[r] = 0.0
+
+    risk_by_age = risk_by_age[all_risks]
+    risk_by_age_long = risk_by_age.reset_index().melt(id_vars='age_band', value_name='valor', var_name='risk')
+
+    y_label = 'Percentual (%)' if not single_risk_class else 'Contagem'
+
+    fig = px.bar(
+        risk_by_age_long,
+        x='age_band',
+        y='valor',
+        color='risk',
+        title="Distribuição de Risco por Faixa Etária" + (" (%)" if not single_risk_class else " (Contagem)"),
+        labels={'age_band': 'Faixa Etária', 'valor': y_label},
+        color_discrete_map={'Good Risk': '#2ecc71', 'Bad Risk': '#e74c3c'}
+    )
+    fig.update_layout(barmode='stack', font=dict(size=14), height=400)
+    return fig
+
+
+def plot_binned_histogram(edges, counts, title, xaxis_label, color):
+    """Desenha um histograma a partir das bordas e contagens já calculadas no servidor."""
+    fig = px.bar(
+        x=(edges[:-1] + edges[1:]) / 2, y=counts, title=title,
+        labels={'x': xaxis_label, 'y': 'Quantidade'},
+        color_discrete_sequence=[color]
+    )
+    fig.update_traces(
+        width=np.diff(edges),
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate=xaxis_label + ': %{customdata[0]:,.0f} a %{customdata[1]:,.0f}<br>Quantidade: %{y}<extra></extra>'
+    )
+    fig.update_layout(bargap=0, font=dict(size=14), height=400)
+    return fig
+
+def plot_age_distribution(agg):
+    """Gera um histograma da distribuição de idade."""
+    edges, counts = agg.histogram('age_in_years')
+    return plot_binned_histogram(edges, counts, "Distribuição de Idade dos Solicitantes", 'Idade', '#3498db')
+
+def plot_personal_status(agg):
+    """Gera um gráfico de barras do status pessoal e sexo."""
+    personal_status_counts = agg.value_counts('personal_status_sex')
+    fig = px.bar(
+        x=personal_status_counts.values, y=personal_status_counts.index, orientation='h',
+        title="Status Pessoal e Sexo", labels={'x': 'Quantidade', 'y': 'Status'},
+        color_discrete_sequence=['#9b59b6']
+    )
+    fig.update_layout(font=dict(size=14), height=400)
+    return fig
+
+def plot_credit_amount_distribution(agg):
+    """Gera um histograma da distribuição do valor do crédito."""
+    edges, counts = agg.histogram('credit_amount')
+    return plot_binned_histogram(edges, counts, "Distribuição do Valor do Crédito", 'Valor do Crédito (DM)', '#f39c12')
+
+def plot_credit_vs_duration(df, rows, grid):
+    """Gera um gráfico de dispersão de valor do crédito vs duração."""
+    if len(rows) > SCATTER_POINT_LIMIT:
+        return plot_credit_vs_duration_density(grid.cells_frame(rows), len(rows))
+    return plot_credit_vs_duration_points(df.take(rows))
+
+def plot_credit_vs_duration_sql(backend, n_rows, *filters):
+    """Mesma dispersão, com os pontos ou as células da grade vindos do banco (SQLiteBackend)
+    ou das partições (PartitionedSource).
+
+    n_rows é o total de linhas dentro dos filtros, já conhecido pelos Aggregates.
+    """
+    if n_rows > SCATTER_POINT_LIMIT:
+        return plot_credit_vs_duration_density(backend.scatter_cells(*filters), n_rows)
+    return plot_credit_vs_duration_points(backend.scatter_points(*filters))
+
+def plot_credit_vs_duration_points(points):
+    """Dispersão com um marcador por solicitante."""
+    fig = px.scatter(
+        points, x='credit_amount', y='duration_in_month', color='risk',
+        title="Valor do Crédito vs Duração",
+        labels={'credit_amount': 'Valor do Crédito (DM)', 'duration_in_month': 'Duração (meses)'},
+        color_discrete_map={'Good Risk': '#2ecc71', 'Bad Risk': '#e74c3c'}
+    )
+    fig.update_layout(font=dict(size=14), height=400)
+    return fig
+
+def plot_credit_vs_duration_density(cells, n_rows):
+    """Versão agregada da dispersão: um marcador por célula da grade, com tamanho pela contagem."""
+    fig = px.scatter(
+        cells, x='x', y='y', color='risk', size='count', size_max=18,
+        title=f"Valor do Crédito vs Duração (agregado em grade, {n_rows:,} solicitantes)",
+        labels={'x': 'Valor do Crédito (DM)', 'y': 'Duração (meses)', 'count': 'Solicitantes na célula'},
+        color_discrete_map={'Good Risk': '#2ecc71', 'Bad Risk': '#e74c3c'}
+    )
+    fig.update_traces(marker=dict(opacity=0.6, line=dict(width=0)))
+    fig.update_layout(font=dict(size=14), height=400)
+    return fig
+
+def plot_purpose_distribution(agg):
+    """Gera um gráfico de barras da distribuição do propósito do crédito."""
+    purpose_counts = agg.value_counts('purpose')
+    fig = px.bar(
+        x=purpose_counts.values, y=purpose_counts.index, orientation='h', title="Propósito do Crédito",
+        labels={'x': 'Quantidade', 'y': 'Propósito'},
+        color_discrete_sequence=['#1abc9c']
+    )
+    fig.update_layout(font=dict(size=14), height=500)
+    return fig
+
+def plot_housing_type_distribution(agg):
+    """Gera um gráfico de pizza da distribuição do tipo de habitação."""
+    housing_counts = agg.value_counts('housing_type')
+    fig = px.pie(
+        values=housing_counts.values, names=housing_counts.index, title="Tipo de Habitação",
+        color_discrete_sequence=['#ff6b6b', '#4ecdc4', '#45b7d1']
+    )
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    fig.update_layout(font=dict(size=14), height=400)
+    return fig
+
+def plot_risk_by_category(agg, column, title, xaxis_label):
+    """Gera gráfico de barras empilhadas para qualquer coluna categórica."""
+    if agg.empty or column not in agg.dimensions:
+        return px.bar(title=f"Dados insuficientes para {title}")
+
+    single_risk_class = (agg.counts > 0).sum() == 1
+    normalize = 'index' if not single_risk_class else False
+
+    risk_by_category = agg.crosstab(column, normalize=normalize)
+
+    all_risks = ['Good Risk', 'Bad Risk']
+    for r in all_risks:
+        if r not in risk_by_category.columns:
+            risk_by_category[r] = 0.0
+
+    risk_by_category = risk_by_category[all_risks]
+    risk_by_category_long = risk_by_category.reset_index().melt(id_vars=column, value_name='valor', var_name='risk')
+
+    y_label = 'Percentual (%)' if not single_risk_class else 'Contagem'
+
+    fig = px.bar(
+        risk_by_category_long,
+        x=column,
+        y='valor',
+        color='risk',
+        title=title + (" (%)" if not single_risk_class else " (Contagem)"),
+        labels={column: xaxis_label, 'valor': y_label},
+        color_discrete_map={'Good Risk': '#2ecc71', 'Bad Risk': '#e74c3c'}
+    )
+    fig.update_layout(barmode='stack', font=dict(size=14), height=400)
+    return fig
+
+def plot_crosstab(crosstab, normalize=False):
+    """Mapa de calor da tabela de contingência de duas colunas categóricas (aggregations.Crosstab).
+
+    normalize ('index', 'columns' ou 'all') mostra as proporções em % em vez das contagens.
+    """
+    title = f"{crosstab.rows} x {crosstab.columns}"
+    if crosstab.empty:
+        return px.bar(title=f"Dados insuficientes para {title}")
+
+    table = crosstab.table(normalize)
+    value_label = 'Percentual (%)' if normalize else 'Quantidade'
+    fig = px.imshow(
+        table * 100 if normalize else table,
+        text_auto='.1f' if normalize else True,
+        labels={'x': crosstab.columns, 'y': crosstab.rows, 'color': value_label},
+        color_continuous_scale='Blues',
+        aspect='auto',
+        title=title + (" (%)" if normalize else ""),
+    )
+    fig.update_layout(font=dict(size=14), height=max(400, 40 * len(table) + 160))
+    return fig
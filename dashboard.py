@@ -0,0 +1,548 @@
+"""Camada de cálculo do dashboard, independente do Streamlit.
+
+Carrega o dataset e as estruturas de consulta uma vez e responde, para um conjunto
+de filtros, as métricas principais e as figuras Plotly (montadas direto dos arrays
+por figure_specs.py ou, com figures="px", pelas funções plot_* de charts.py). É usada pelo stm.py e pela API JSON (api.py).
+"""
+import json
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+
+from aggregations import CreditCube, DensityGrid, PairCube
+from chart_pool import ChartPool
+from charts import (
+    plot_risk_distribution, plot_risk_by_age, plot_age_distribution, plot_personal_status,
+    plot_credit_amount_distribution, plot_credit_vs_duration, plot_credit_vs_duration_sql,
+    plot_purpose_distribution, plot_housing_type_distribution, plot_risk_by_category, plot_crosstab,
+)
+from data import load_dataset, load_snapshot, load_sorted_indexes, refresh_snapshot, snapshot_dir_for
+import figure_specs
+from figure_cache import FigureCache, normalize_filters
+from filters import FilterIndex
+from partitions import PartitionedSource
+from sampling import Estimate, StratifiedSample, refine
+from selection import IncrementalSelection
+from sql_backend import SQLiteBackend
+from watcher import SourceWatcher
+
+
+# CSV de origem; CREDIT_DATA_PATH permite apontar o dashboard para um dataset sintético
+DATA_PATH = os.environ.get("CREDIT_DATA_PATH", "german_credit_data_treated.csv")
+
+# Backend das consultas: "memory" (snapshot mapeado em memória + cubo, padrão) ou
+# "sqlite" (banco local; filtros e agregações resolvidos por consultas SQL) ou "partitioned"
+# (CREDIT_DATA_PATH é um diretório de CSVs particionado por risco e período; ver partitions.py)
+DATA_BACKEND = os.environ.get("CREDIT_BACKEND", "memory")
+
+# Histogramas de idade (20 faixas) e crédito (30 faixas) pré-calculados no cubo
+HISTOGRAM_BINS = {'age_in_years': 20, 'credit_amount': 30}
+
+# Construção das figuras: "fast" monta os dicts direto dos arrays (figure_specs.py);
+# "px" usa as funções plot_* de charts.py. As duas geram os mesmos gráficos.
+FIGURE_PATH = os.environ.get("CREDIT_FIGURES", "fast")
+
+# Figuras construídas em paralelo: CREDIT_CHART_WORKERS workers (0 = em sequência, no
+# thread do script) num pool de processos ("process") ou de threads ("thread")
+CHART_WORKERS = int(os.environ.get("CREDIT_CHART_WORKERS", "0"))
+CHART_POOL = os.environ.get("CREDIT_CHART_POOL", "process")
+
+# Modo aproximado (backend em memória): a partir de APPROX_MIN_ROWS linhas a primeira resposta
+# vem de uma amostra estratificada, refinada em segundo plano até os intervalos de 95% caberem
+# em APPROX_MAX_ERROR (relativo; nas proporções, em pontos percentuais / 100) ou até acabar o
+# orçamento de APPROX_TIME_BUDGET segundos
+APPROX_MIN_ROWS = int(os.environ.get("CREDIT_APPROX_MIN_ROWS", "5000000"))
+APPROX_MAX_ERROR = float(os.environ.get("CREDIT_APPROX_MAX_ERROR", "0.01"))
+APPROX_TIME_BUDGET = float(os.environ.get("CREDIT_APPROX_TIME_BUDGET", "2.0"))
+APPROX_SAMPLE_ROWS = 50_000
+
+# Intervalo (s) entre as verificações do CSV de origem; linhas acrescentadas ao fim do
+# arquivo são ingeridas sem reler o resto (0 = não observa o arquivo). Desligado por
+# padrão: só o stm.py e o api.py o repassam ao Dashboard, que sem ele não observa nada
+WATCH_INTERVAL = float(os.environ.get("CREDIT_WATCH_INTERVAL", "0"))
+
+# Grade da dispersão agregada: (x, y, faixas em x, faixas em y)
+SCATTER_GRID = ('credit_amount', 'duration_in_month', 40, 30)
+
+# Gráficos do dashboard, na ordem em que aparecem: {nome: plot_* que recebe os Aggregates}.
+# A dispersão (credit_vs_duration) precisa das linhas selecionadas e é tratada à parte.
+CHARTS = {
+    'risk_distribution': plot_risk_distribution,
+    'risk_by_age': plot_risk_by_age,
+    'age_distribution': plot_age_distribution,
+    'personal_status': plot_personal_status,
+    'credit_amount_distribution': plot_credit_amount_distribution,
+    'credit_vs_duration': None,
+    'purpose_distribution': plot_purpose_distribution,
+    'housing_type_distribution': plot_housing_type_distribution,
+    'risk_by_purpose': lambda agg: plot_risk_by_category(agg, 'purpose', 'Propósito', 'Propósito'),
+    'risk_by_employment_status': lambda agg: plot_risk_by_category(
+        agg, 'employment_status', 'Status de Emprego', 'Status de Emprego'
+    ),
+}
+
+# Mesmos gráficos pelo caminho rápido: {nome: *_spec que recebe os Aggregates}
+FAST_CHARTS = {
+    'risk_distribution': figure_specs.risk_distribution_spec,
+    'risk_by_age': figure_specs.risk_by_age_spec,
+    'age_distribution': figure_specs.age_distribution_spec,
+    'personal_status': figure_specs.personal_status_spec,
+    'credit_amount_distribution': figure_specs.credit_amount_distribution_spec,
+    'credit_vs_duration': None,
+    'purpose_distribution': figure_specs.purpose_distribution_spec,
+    'housing_type_distribution': figure_specs.housing_type_distribution_spec,
+    'risk_by_purpose': lambda agg: figure_specs.risk_by_category_spec(agg, 'purpose', 'Propósito', 'Propósito'),
+    'risk_by_employment_status': lambda agg: figure_specs.risk_by_category_spec(
+        agg, 'employment_status', 'Status de Emprego', 'Status de Emprego'
+    ),
+}
+
+
+def owned_nbytes(*objects):
+    """Bytes dos arrays NumPy alocados pelos objetos (atributos, dicts, listas e tuplas).
+
+    Views (colunas mapeadas do snapshot, fatias de outros arrays) não contam, e cada
+    array é contado uma vez, mesmo se referenciado por mais de um objeto.
+    """
+    seen, total = set(), 0
+    pending = list(objects)
+    while pending:
+        value = pending.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        if isinstance(value, np.ndarray):
+            total += value.nbytes if value.flags.owndata else 0
+        elif isinstance(value, dict):
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            pending.extend(value)
+        elif hasattr(value, '__dict__') and not isinstance(value, type):
+            pending.extend(vars(value).values())
+    return total
+
+
+def compute_metrics(aggregates):
+    """Valores dos cards de métricas principais."""
+    risk_counts = aggregates.risk_counts()
+    total = aggregates.total
+    return {
+        'total': total,
+        'risk_counts': {label: int(count) for label, count in risk_counts.items()},
+        'good_risk_pct': float(risk_counts.get('Good Risk', 0) / total * 100) if total else None,
+        'avg_age': float(aggregates.mean('age_in_years')) if total else None,
+        'avg_credit': float(aggregates.mean('credit_amount')) if total else None,
+    }
+
+
+class Dashboard:
+    """Dataset carregado e estruturas de consulta, compartilhados por sessões e requisições.
+
+    backend="memory" usa o snapshot mapeado em memória com o FilterIndex e o CreditCube;
+    backend="sqlite" responde tudo com consultas ao SQLiteBackend e backend="partitioned"
+    com o PartitionedSource de um diretório de CSVs (csv_path). As consultas apenas
+    leem essas estruturas, então podem ser feitas por várias threads ao mesmo tempo.
+    """
+
+    def __init__(self, csv_path=DATA_PATH, backend="memory", figure_cache=None, figures=FIGURE_PATH,
+                 chart_workers=CHART_WORKERS, chart_pool=CHART_POOL, approx_min_rows=APPROX_MIN_ROWS,
+                 max_error=APPROX_MAX_ERROR, time_budget=APPROX_TIME_BUDGET, watch_interval=0):
+        if backend not in ("memory", "sqlite", "partitioned"):
+            raise ValueError(f"Backend desconhecido: {backend}")
+        if figures not in ("fast", "px"):
+            raise ValueError(f"Caminho de figuras desconhecido: {figures}")
+        self.csv_path = csv_path
+        self.backend = backend
+        self.figures = figures
+        self.figure_cache = figure_cache if figure_cache is not None else FigureCache()
+        self.approx_min_rows = approx_min_rows
+        self.max_error = max_error
+        self.time_budget = time_budget
+        self._scatter_grid = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # Seleções das sessões abertas, só para o relatório de memória
+        self._selections = weakref.WeakSet()
+
+        self.sql_backend = self.partitions = None
+        if backend == "sqlite":
+            self.df = None
+            self.sample = None
+            self.sql_backend = SQLiteBackend.for_csv(csv_path, histogram_bins=HISTOGRAM_BINS)
+            self.summary = self.sql_backend.summary()
+        elif backend == "partitioned":
+            self.df = None
+            self.sample = None
+            self.partitions = PartitionedSource(csv_path, histogram_bins=HISTOGRAM_BINS, scatter=SCATTER_GRID)
+            self.summary = self.partitions.summary()
+        else:
+            self._load(load_dataset(csv_path))
+        self._refiner = ThreadPoolExecutor(max_workers=2, thread_name_prefix="refine") if backend == "memory" else None
+
+        # Criado depois do dataset: os workers de processo reabrem o snapshot já gravado
+        self.chart_pool = ChartPool(self, chart_workers, kind=chart_pool) if chart_workers else None
+        self.watcher = SourceWatcher(self, watch_interval) if watch_interval else None
+
+    def _load(self, df, extend=False):
+        """Monta índices, cubo, resumo e amostra de df e os coloca no lugar dos atuais.
+
+        extend=True indica que df é o dataset atual com linhas novas no fim: o cubo e a
+        grade da dispersão somam só essas linhas (se couberem nas faixas atuais).
+        """
+        # Os índices ordenados vêm prontos do snapshot; só o risco precisa de bitmaps
+        filter_index = FilterIndex(
+            df, range_columns=("age_in_years", "credit_amount"), bitmap_columns=("risk",),
+            presorted=load_sorted_indexes(df),
+        )
+        cube = self.cube.extended(df, filter_index) if extend else None
+        if cube is None:
+            cube = CreditCube(df, filter_index, histogram_bins=HISTOGRAM_BINS)
+        grid = self._scatter_grid.extended(df) if extend and self._scatter_grid is not None else None
+        summary = {
+            'rows': len(df),
+            'version': df.attrs['version'],
+            # Riscos na ordem em que aparecem, para o multiselect sempre ter todas as opções
+            # (linhas sem risco não são uma opção)
+            'risk_options': df['risk'].unique().dropna().tolist(),
+            'age_bounds': (int(df['age_in_years'].min()), int(df['age_in_years'].max())),
+            'credit_bounds': (int(df['credit_amount'].min()), int(df['credit_amount'].max())),
+        }
+        sample = None
+        if len(df) >= self.approx_min_rows:
+            sample = StratifiedSample(df, cube, first_rows=APPROX_SAMPLE_ROWS)
+            sample = sample if sample.levels else None
+
+        with self._lock:
+            self.df, self.filter_index, self.cube, self._scatter_grid = df, filter_index, cube, grid
+            self.pairs = PairCube(cube)
+            self.summary, self.sample = summary, sample
+
+    def refresh(self):
+        """Atualiza o dataset se o CSV de origem mudou; retorna True se a versão mudou.
+
+        Linhas acrescentadas ao fim do CSV são ingeridas sem reler o resto (ver
+        data.refresh_snapshot) e, no backend em memória, o cubo e a grade da dispersão
+        somam só as linhas novas; outras mudanças reconstroem tudo. As estruturas novas
+        são montadas à parte e trocadas no fim, sob uma nova versão: seleções e figuras
+        em cache da versão anterior deixam de ser usadas.
+        """
+        with self._refresh_lock:
+            if self.backend == "partitioned":
+                # Só as partições novas ou alteradas são relidas; as carregadas e iguais são mantidas
+                partitions = PartitionedSource(
+                    self.csv_path, histogram_bins=HISTOGRAM_BINS, scatter=SCATTER_GRID, previous=self.partitions
+                )
+                if partitions.version == self.version:
+                    return False
+                self.partitions, self.summary = partitions, partitions.summary()
+                return True
+
+            meta = refresh_snapshot(self.csv_path)
+            if meta["version"] == self.version:
+                return False
+            if self.backend == "sqlite":
+                # O banco é regravado a partir do snapshot atualizado, sem reler o CSV
+                sql_backend = SQLiteBackend.for_csv(self.csv_path, histogram_bins=HISTOGRAM_BINS)
+                self.sql_backend, self.summary = sql_backend, sql_backend.summary()
+            else:
+                parent = meta.get("parent")
+                extend = parent is not None and parent["version"] == self.version
+                self._load(load_snapshot(snapshot_dir_for(self.csv_path)), extend=extend)
+            return True
+
+    @property
+    def version(self):
+        return self.summary['version']
+
+    @property
+    def scatter_grid(self):
+        """Grade da dispersão agregada, construída na primeira vez que é usada."""
+        with self._lock:
+            if self._scatter_grid is None:
+                x, y, x_bins, y_bins = SCATTER_GRID
+                self._scatter_grid = DensityGrid(self.df, x, y, x_bins=x_bins, y_bins=y_bins)
+            return self._scatter_grid
+
+    def normalize(self, risk=None, age_range=None, credit_range=None, periods=None):
+        """Filtros na forma canônica (riscos ordenados, intervalos recortados); ausentes = sem filtro.
+
+        Numa fonte particionada por período os filtros ganham um quarto item, os períodos.
+        """
+        if 'periods' in self.summary and periods is None:
+            periods = self.summary['periods']
+        return normalize_filters(
+            self.summary['risk_options'] if risk is None else risk,
+            age_range or self.summary['age_bounds'],
+            credit_range or self.summary['credit_bounds'],
+            age_bounds=self.summary['age_bounds'],
+            credit_bounds=self.summary['credit_bounds'],
+            periods=periods if 'periods' in self.summary else None,
+        )
+
+    def new_selection(self):
+        """Seleção incremental para uma sessão (apenas no backend em memória)."""
+        if self.backend != "memory":
+            return None
+        selection = IncrementalSelection(self.filter_index, self.cube)
+        self._selections.add(selection)
+        return selection
+
+    def memory_report(self):
+        """Memória compartilhada entre as sessões e a memória própria das seleções abertas.
+
+        dataset_bytes é o tamanho das colunas do snapshot (mapeadas em memória, só as
+        páginas lidas ficam residentes); shared_bytes soma o que foi alocado para índices,
+        cubo (com as tabelas de contingência já montadas), grade e amostra. Cada sessão
+        guarda apenas a sua seleção (session_bytes).
+        """
+        selections = list(self._selections)
+        if self.backend == "sqlite":
+            dataset_bytes, shared_bytes = 0, 0
+        elif self.backend == "partitioned":
+            # Só as partições já carregadas ocupam memória
+            loaded = self.partitions.loaded()
+            dataset_bytes = int(sum(partition.df.memory_usage(index=False).sum() for partition in loaded))
+            shared_bytes = owned_nbytes([(partition.filter_index, partition.pairs) for partition in loaded])
+        else:
+            dataset_bytes = int(self.df.memory_usage(index=False).sum())
+            shared_bytes = owned_nbytes(self.filter_index, self.pairs, self._scatter_grid, self.sample)
+        return {
+            'dataset_bytes': dataset_bytes,
+            'shared_bytes': shared_bytes,
+            'figure_cache_bytes': self.figure_cache.stats()['size_bytes'],
+            'sessions': len(selections),
+            'session_bytes': [selection.nbytes for selection in selections],
+        }
+
+    def aggregate(self, filters):
+        """Aggregates das linhas dentro dos filtros normalizados."""
+        if self.backend == "partitioned":
+            return self.partitions.query(*filters)
+        risk, age_range, credit_range = filters
+        if self.backend == "sqlite":
+            return self.sql_backend.query(risk, age_range, credit_range)
+        return self.cube.query(risk=risk, age_range=age_range, credit_range=credit_range)
+
+    @property
+    def crosstab_columns(self):
+        """Colunas categóricas que podem ser cruzadas em crosstab (risco primeiro)."""
+        if self.backend == "memory":
+            return self.pairs.columns
+        return (self.sql_backend or self.partitions).crosstab_columns
+
+    def crosstab(self, filters, rows, columns):
+        """Crosstab (aggregations.Crosstab) de `rows` x `columns` das linhas dentro dos filtros normalizados."""
+        unknown = [column for column in (rows, columns) if column not in self.crosstab_columns]
+        if unknown:
+            raise ValueError(f"Colunas desconhecidas para crosstab: {', '.join(unknown)}")
+        if self.backend == "partitioned":
+            return self.partitions.crosstab(rows, columns, *filters)
+        risk, age_range, credit_range = filters
+        if self.backend == "sqlite":
+            return self.sql_backend.crosstab(rows, columns, risk, age_range, credit_range)
+        return self.pairs.query(rows, columns, risk=risk, age_range=age_range, credit_range=credit_range)
+
+    def crosstab_json(self, filters, rows, columns, normalize=False, crosstab=None):
+        """JSON do mapa de calor de crosstab(filters, rows, columns), pelo cache compartilhado de figuras.
+
+        crosstab, se informado, é a tabela já consultada para esses filtros.
+        """
+        def build():
+            table = crosstab if crosstab is not None else self.crosstab(filters, rows, columns)
+            return (figure_specs.crosstab_spec if self.figures == "fast" else plot_crosstab)(table, normalize)
+
+        key = self._figure_key(('crosstab', rows, columns, normalize), filters)
+        return self.figure_cache.get_or_build(key, build, self.serialize_figure)
+
+    def estimate(self, filters):
+        """Primeira resposta para os filtros: pelo menor nível da amostra no modo aproximado, senão exata.
+
+        Filtros estreitos em que nenhuma linha amostrada cai também são respondidos pela
+        consulta exata (a amostra não diria nada sobre eles).
+        """
+        start = time.perf_counter()
+        if self.sample is None:
+            return Estimate(self.version, filters, self.aggregate(filters))
+        aggregates, intervals, rows = self.sample.query(0, *filters)
+        if not intervals:
+            return Estimate(self.version, filters, self.aggregate(filters))
+        return Estimate(
+            self.version, filters, aggregates, intervals, level=0, sample_rows=rows,
+            deadline=start + self.time_budget, seconds=time.perf_counter() - start,
+        )
+
+    def refine_async(self, estimate):
+        """Refina a estimativa numa thread de fundo; None se ela já for final (exata ou dentro do erro)."""
+        if estimate.exact or estimate.within(self.max_error):
+            return None
+        return self._refiner.submit(refine, estimate, self.sample, lambda: self.aggregate(estimate.filters), self.max_error)
+
+    def selected_rows(self, filters):
+        """Posições das linhas dentro dos filtros (backend em memória)."""
+        risk, age_range, credit_range = filters
+        if not risk:
+            return self.filter_index.select(categories={'risk': []})
+        return self.filter_index.select(
+            categories={'risk': list(risk)}, ranges={'age_in_years': age_range, 'credit_amount': credit_range}
+        )
+
+    def build_chart(self, name, filters, aggregates, rows=None):
+        """Figura do gráfico `name`. rows() pode fornecer as linhas já selecionadas pela sessão.
+
+        No caminho "fast" a figura é um dict (figure_specs); no "px", um go.Figure.
+        """
+        fast = self.figures == "fast"
+        if name != 'credit_vs_duration':
+            return (FAST_CHARTS if fast else CHARTS)[name](aggregates)
+        if self.backend != "memory":
+            build = figure_specs.credit_vs_duration_sql_spec if fast else plot_credit_vs_duration_sql
+            return build(self.sql_backend or self.partitions, aggregates.total, *filters)
+        selected = rows() if rows else self.selected_rows(filters)
+        build = figure_specs.credit_vs_duration_spec if fast else plot_credit_vs_duration
+        return build(self.df, selected, self.scatter_grid)
+
+    def figure_json(self, name, filters, aggregates, rows=None, profiler=None, variant=None):
+        """JSON da figura `name`, pelo cache compartilhado de figuras.
+
+        profiler, se informado, cronometra construção e serialização (ver profiling.RerunProfiler).
+        variant separa no cache figuras que não são as exatas dos filtros (ex.: de uma amostra).
+        """
+        def stage(kind):
+            return profiler.stage(name, kind) if profiler else nullcontext()
+
+        def build():
+            with stage('compute'):
+                return self.build_chart(name, filters, aggregates, rows)
+
+        def serialize(figure):
+            with stage('serialize'):
+                return self.serialize_figure(figure)
+
+        return self.figure_cache.get_or_build(self._figure_key(name, filters, variant), build, serialize)
+
+    def _figure_key(self, name, filters, variant=None):
+        key = (self.version, filters, name)
+        return key if variant is None else key + (variant,)
+
+    def serialize_figure(self, figure):
+        """JSON de uma figura devolvida por build_chart."""
+        return figure_specs.to_json(figure) if self.figures == "fast" else figure.to_json()
+
+    def figures_json(self, names, filters, aggregates, rows=None, profiler=None, variant=None):
+        """JSON das figuras `names`, na ordem pedida.
+
+        Com um pool de gráficos (chart_workers > 0) as que faltam no cache são construídas
+        ao mesmo tempo nos workers; sem pool, uma a uma como em figure_json. Os workers
+        só calculam figuras exatas, então variantes são sempre construídas aqui.
+        """
+        if self.chart_pool is None or variant is not None:
+            return [self.figure_json(name, filters, aggregates, rows, profiler, variant) for name in names]
+
+        keys = [self._figure_key(name, filters) for name in names]
+        figures = [self.figure_cache.get(key) for key in keys]
+        missing = [i for i, figure_json in enumerate(figures) if figure_json is None]
+        if missing:
+            with profiler.stage('charts (pool)', 'compute') if profiler else nullcontext():
+                built = self.chart_pool.map([names[i] for i in missing], filters, aggregates, rows)
+            for i, figure_json in zip(missing, built):
+                self.figure_cache.put(keys[i], figure_json)
+                figures[i] = figure_json
+        return figures
+
+    def close(self):
+        """Encerra o watcher do CSV, o pool de gráficos e as threads de refinamento, se houver."""
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.chart_pool is not None:
+            self.chart_pool.close()
+        if self._refiner is not None:
+            self._refiner.shutdown(wait=False, cancel_futures=True)
+        if self.partitions is not None:
+            self.partitions.close()
+
+    def compute(self, filters, charts=None):
+        """Métricas e figuras (JSON) dos filtros normalizados; charts limita os gráficos gerados."""
+        aggregates = self.aggregate(filters)
+        names = list(CHARTS) if charts is None else [name for name in charts if name in CHARTS]
+        return {
+            'version': self.version,
+            'filters': describe_filters(filters),
+            'metrics': compute_metrics(aggregates),
+            'figures': {} if aggregates.empty else dict(zip(names, self.figures_json(names, filters, aggregates))),
+        }
+
+
+def describe_filters(filters):
+    """Filtros normalizados como dict (o formato aceito por compute_dashboard)."""
+    risk, age_range, credit_range, *periods = filters
+    described = {'risk': list(risk), 'age_range': list(age_range), 'credit_range': list(credit_range)}
+    if periods:
+        described['periods'] = list(periods[0])
+    return described
+
+
+_default_dashboard = None
+_default_lock = threading.Lock()
+
+
+def get_dashboard(csv_path=DATA_PATH, backend="memory"):
+    """Instância compartilhada do Dashboard no processo (criada na primeira chamada)."""
+    global _default_dashboard
+    with _default_lock:
+        if _default_dashboard is None:
+            _default_dashboard = Dashboard(csv_path, backend=backend)
+        return _default_dashboard
+
+
+def compute_dashboard(filters=None, charts=None, dashboard=None):
+    """Métricas principais e especificações das figuras para os filtros da sidebar.
+
+    filters: {'risk': [...], 'age_range': [min, max], 'credit_range': [min, max]} e, numa
+    fonte particionada por período, 'periods': [...]; chaves ausentes não filtram.
+    As figuras vêm como JSON do Plotly (pio.from_json as reconstrói).
+    """
+    dashboard = dashboard or get_dashboard()
+    filters = filters or {}
+    normalized = dashboard.normalize(
+        filters.get('risk'), filters.get('age_range'), filters.get('credit_range'), filters.get('periods')
+    )
+    return dashboard.compute(normalized, charts)
+
+
+def compute_crosstab(rows, columns, filters=None, normalize=False, dashboard=None):
+    """Tabela de contingência de duas colunas categóricas para os filtros da sidebar.
+
+    filters como em compute_dashboard; normalize: False, 'index', 'columns' ou 'all'.
+    A tabela vem como {'index': [...], 'columns': [...], 'values': [[...]]}, sem linhas
+    e colunas vazias.
+    """
+    dashboard = dashboard or get_dashboard()
+    filters = filters or {}
+    normalized = dashboard.normalize(
+        filters.get('risk'), filters.get('age_range'), filters.get('credit_range'), filters.get('periods')
+    )
+    table = dashboard.crosstab(normalized, rows, columns).table(normalize)
+    return {
+        'version': dashboard.version,
+        'filters': describe_filters(normalized),
+        'rows': rows,
+        'columns': columns,
+        'normalize': normalize,
+        'table': {
+            'index': table.index.tolist(),
+            'columns': table.columns.tolist(),
+            'values': table.to_numpy().tolist(),
+        },
+    }
+
+
+def to_json(result):
+    """Serializa o resultado de compute_dashboard, inserindo as figuras já em JSON sem reprocessá-las."""
+    head = {key: value for key, value in result.items() if key != 'figures'}
+    figures = ", ".join(f"{json.dumps(name)}: {figure}" for name, figure in result['figures'].items())
+    return json.dumps(head, ensure_ascii=False)[:-1] + f', "figures": {{{figures}}}}}'
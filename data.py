@@ -0,0 +1,640 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+from derived import DEFAULT_BANDS, bands_signature
+
+
+SNAPSHOT_DIRNAME = ".snapshot"
+SNAPSHOT_FORMAT = 4
+
+# Limite padrão de memória (MB) usado para dimensionar os blocos lidos do CSV
+DEFAULT_MEMORY_MB = int(os.environ.get("CREDIT_INGEST_MEMORY_MB", "256"))
+
+# Colunas numéricas que ganham um índice ordenado gravado junto com o snapshot
+INDEX_COLUMNS = ("age_in_years", "credit_amount")
+
+# Acima desta amplitude de valores o índice ordenado usa argsort em vez de counting sort
+COUNTING_SORT_MAX_RANGE = 1 << 24
+
+
+def snapshot_dir_for(csv_path):
+    """Retorna o diretório do snapshot colunar associado a um CSV."""
+    base_dir, filename = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(base_dir, SNAPSHOT_DIRNAME, os.path.splitext(filename)[0])
+
+
+def source_signature(csv_path):
+    """Identifica a versão do arquivo de origem pelo tamanho, data de modificação e sha1 do conteúdo."""
+    stat = os.stat(csv_path)
+    checksum, = prefix_checksums(csv_path, [stat.st_size])
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "checksum": checksum}
+
+
+def prefix_checksums(csv_path, sizes, block_bytes=1 << 20):
+    """sha1 dos primeiros n bytes do arquivo para cada n de sizes (crescentes), numa única leitura."""
+    digest = hashlib.sha1()
+    checksums = []
+    position = 0
+    with open(csv_path, "rb") as f:
+        for size in sizes:
+            while position < size:
+                block = f.read(min(block_bytes, size - position))
+                if not block:
+                    break
+                digest.update(block)
+                position += len(block)
+            checksums.append(digest.hexdigest())
+    return checksums
+
+
+def source_change(csv_path, source):
+    """Classifica a mudança do CSV em relação à assinatura `source` do snapshot, pelo os.stat.
+
+    "unchanged": mesmo tamanho e data; "touched": mesmo tamanho e outra data (o conteúdo
+    ainda precisa ser comparado pelo checksum); "appended": o arquivo cresceu e os bytes
+    já ingeridos terminavam numa quebra de linha (append_snapshot confirma pelo checksum
+    que eles não mudaram); "changed": qualquer outro caso.
+    """
+    stat = os.stat(csv_path)
+    size = source["size"]
+    if stat.st_size == size:
+        return "unchanged" if stat.st_mtime_ns == source["mtime_ns"] else "touched"
+    if stat.st_size < size or size == 0:
+        return "changed"
+    with open(csv_path, "rb") as f:
+        f.seek(size - 1)
+        return "appended" if f.read(1) == b"\n" else "changed"
+
+
+class _ByteRange(io.RawIOBase):
+    """Bytes [start, stop) de um arquivo, para o parser do CSV não ler além de stop."""
+
+    def __init__(self, path, start, stop):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = stop - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._file.read(min(len(buffer), self._remaining))
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def open_byte_range(path, start, stop):
+    """Arquivo binário com apenas os bytes [start, stop) de path."""
+    return io.BufferedReader(_ByteRange(path, start, stop))
+
+
+def last_line_end(csv_path, start, stop, block_bytes=1 << 16):
+    """Posição logo depois da última quebra de linha em [start, stop), ou start se não houver."""
+    with open(csv_path, "rb") as f:
+        end = stop
+        while end > start:
+            begin = max(start, end - block_bytes)
+            f.seek(begin)
+            newline = f.read(end - begin).rfind(b"\n")
+            if newline >= 0:
+                return begin + newline + 1
+            end = begin
+    return start
+
+
+def version_for(source, derived=None):
+    """Versão curta do dataset derivada da assinatura do arquivo de origem e das faixas derivadas."""
+    payload = json.dumps([SNAPSHOT_FORMAT, source, derived], sort_keys=True).encode()
+    return hashlib.sha1(payload).hexdigest()[:12]
+
+
+def integer_dtype_for(low, high):
+    """Menor dtype inteiro com sinal que comporta o intervalo [low, high]."""
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def chunk_rows_for(csv_path, max_memory_mb, sample_rows=1000):
+    """Estima quantas linhas do CSV cabem por bloco dentro do limite de memória."""
+    sample = pd.read_csv(csv_path, nrows=sample_rows)
+    bytes_per_row = max(sample.memory_usage(deep=True).sum() / max(len(sample), 1), 1)
+    # Margem para o texto bruto do bloco e as cópias intermediárias do parser
+    return max(int(max_memory_mb * 1024 * 1024 / (bytes_per_row * 4)) // 8 * 8, 1024)
+
+
+class SnapshotWriter:
+    """Monta um snapshot colunar a partir de blocos de DataFrame, sem manter o dataset em memória.
+
+    Cada bloco é codificado (texto vira código de categoria) e anexado a arquivos
+    brutos temporários; finish() converte cada coluna para o menor dtype possível,
+    grava os índices ordenados e troca o snapshot de uma vez.
+    """
+
+    def __init__(self, snapshot_dir, chunk_rows):
+        self.snapshot_dir = snapshot_dir
+        self.chunk_rows = chunk_rows
+        self.tmp_dir = snapshot_dir + ".tmp"
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+        self.rows = 0
+        self.columns = None
+        self.categories = {}
+        self.integer = {}
+        self.bounds = {}
+        self._raw = {}
+
+    def append(self, chunk):
+        """Codifica e anexa um bloco de linhas."""
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            for name in self.columns:
+                if pd.api.types.is_numeric_dtype(chunk[name]):
+                    self.integer[name] = True
+                    self.bounds[name] = [np.inf, -np.inf]
+                else:
+                    self.categories[name] = {}
+                self._raw[name] = open(os.path.join(self.tmp_dir, f"{name}.raw"), "wb")
+
+        for name in self.columns:
+            series = chunk[name]
+            if name in self.categories:
+                mapping = self.categories[name]
+                for label in pd.unique(series.dropna()):
+                    mapping.setdefault(label, len(mapping))
+                values = series.map(mapping).fillna(-1).to_numpy(dtype=np.int32)
+            else:
+                self.integer[name] &= pd.api.types.is_integer_dtype(series)
+                values = series.to_numpy(dtype=np.float64)
+                if len(values):
+                    self.bounds[name][0] = min(self.bounds[name][0], np.nanmin(values))
+                    self.bounds[name][1] = max(self.bounds[name][1], np.nanmax(values))
+            values.tofile(self._raw[name])
+        self.rows += len(chunk)
+
+    def finish(self, source=None, index_columns=INDEX_COLUMNS, bands=DEFAULT_BANDS):
+        """Finaliza as colunas, os índices e as colunas derivadas e publica o snapshot."""
+        columns = []
+        for name in self.columns:
+            self._raw[name].close()
+            raw_path = os.path.join(self.tmp_dir, f"{name}.raw")
+            if name in self.categories:
+                columns.append(self._finish_category(name, raw_path))
+            else:
+                columns.append(self._finish_numeric(name, raw_path))
+            os.remove(raw_path)
+
+        indexes = [name for name in index_columns if self.integer.get(name)]
+        for name in indexes:
+            self._write_sorted_index(name)
+
+        columns += write_derived_columns(self.tmp_dir, self.rows, bands, self.chunk_rows)
+        derived = bands_signature(bands)
+        meta = {
+            "format": SNAPSHOT_FORMAT,
+            "rows": self.rows,
+            "version": version_for(source, derived),
+            "source": source,
+            "derived": derived,
+            "columns": columns,
+            "indexes": indexes,
+        }
+        return self._publish(meta)
+
+    def _publish(self, meta):
+        write_snapshot_meta(self.tmp_dir, meta)
+
+        # Troca o snapshot antigo pelo novo de uma vez para que outros processos
+        # nunca leiam um diretório pela metade.
+        shutil.rmtree(self.snapshot_dir, ignore_errors=True)
+        os.replace(self.tmp_dir, self.snapshot_dir)
+        return meta
+
+    def _chunks(self):
+        for start in range(0, self.rows, self.chunk_rows):
+            yield slice(start, min(start + self.chunk_rows, self.rows))
+
+    def _open_raw(self, raw_path, dtype):
+        if not self.rows:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(raw_path, dtype=dtype, mode="r", shape=(self.rows,))
+
+    def _open_output(self, name, dtype):
+        path = os.path.join(self.tmp_dir, f"{name}.npy")
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(self.rows,))
+
+    def _finish_category(self, name, raw_path):
+        raw = self._open_raw(raw_path, np.int32)
+        labels = list(self.categories[name])
+        # Categorias em ordem alfabética, como no astype("category") do pandas
+        sorted_labels = sorted(labels, key=str)
+        remap = np.full(len(labels) + 1, -1, dtype=np.int64)
+        remap[[self.categories[name][label] for label in sorted_labels]] = np.arange(len(labels))
+        dtype = integer_dtype_for(-1, len(labels))
+        out = self._open_output(name, dtype)
+        for chunk in self._chunks():
+            out[chunk] = remap[raw[chunk]]
+        out.flush()
+        return {
+            "name": name,
+            "kind": "category",
+            "dtype": dtype.str,
+            "categories": [label.item() if isinstance(label, np.generic) else label for label in sorted_labels],
+        }
+
+    def _finish_numeric(self, name, raw_path):
+        raw = self._open_raw(raw_path, np.float64)
+        if not self.integer[name]:
+            dtype = np.dtype(np.float64)
+        elif self.rows:
+            dtype = integer_dtype_for(*self.bounds[name])
+        else:
+            dtype = np.dtype(np.int8)
+        out = self._open_output(name, dtype)
+        for chunk in self._chunks():
+            out[chunk] = raw[chunk]
+        out.flush()
+        return {"name": name, "kind": "numeric", "dtype": dtype.str}
+
+    def _write_sorted_index(self, name):
+        """Grava a ordenação estável da coluna (<coluna>.order.npy) e os valores ordenados (<coluna>.sorted.npy)."""
+        values = np.load(os.path.join(self.tmp_dir, f"{name}.npy"), mmap_mode="r")
+        order_dtype = np.int32 if self.rows < np.iinfo(np.int32).max else np.int64
+        order = self._open_output(f"{name}.order", order_dtype)
+        sorted_values = self._open_output(f"{name}.sorted", values.dtype)
+        low, high = self.bounds[name]
+
+        if self.rows and high - low < COUNTING_SORT_MAX_RANGE:
+            # Counting sort em duas passadas por blocos: a memória fica limitada ao
+            # tamanho do bloco mais um contador por valor possível.
+            low = int(low)
+            n_values = int(high) - low + 1
+            counts = np.zeros(n_values, dtype=np.int64)
+            for chunk in self._chunks():
+                counts += np.bincount(values[chunk].astype(np.int64) - low, minlength=n_values)
+            next_position = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            for chunk in self._chunks():
+                local = values[chunk].astype(np.int64) - low
+                local_order = np.argsort(local, kind="stable")
+                local_sorted = local[local_order]
+                local_counts = np.bincount(local, minlength=n_values)
+                group_start = np.concatenate([[0], np.cumsum(local_counts)[:-1]])
+                positions = next_position[local_sorted] + np.arange(len(local)) - group_start[local_sorted]
+                order[positions] = local_order + chunk.start
+                sorted_values[positions] = local_sorted + low
+                next_position += local_counts
+        elif self.rows:
+            order[:] = np.argsort(values, kind="stable")
+            sorted_values[:] = values[order]
+
+        order.flush()
+        sorted_values.flush()
+
+
+class SnapshotAppender(SnapshotWriter):
+    """Acrescenta a um snapshot existente as linhas novas do fim do CSV.
+
+    Os blocos do trecho novo são codificados como no SnapshotWriter; finish() grava num
+    diretório temporário cada coluna antiga seguida das linhas novas (recodificando as
+    categorias se surgirem rótulos novos e aumentando o dtype se preciso), intercala as
+    linhas novas nos índices ordenados e publica o snapshot com uma nova versão.
+    """
+
+    def __init__(self, snapshot_dir, chunk_rows, meta):
+        super().__init__(snapshot_dir, chunk_rows)
+        self.meta = meta
+        self.base_rows = meta["rows"]
+
+    def finish(self, source=None, bands=DEFAULT_BANDS):
+        """Publica o snapshot com as linhas novas, ou retorna None se elas não couberem nele.
+
+        Não cabem se uma coluna numérica recebeu texto ou se uma coluna inteira recebeu
+        valores fracionários ou ausentes; nesse caso o snapshot precisa ser reconstruído.
+        """
+        for raw in self._raw.values():
+            raw.close()
+        columns = []
+        for column in self.meta["columns"]:
+            if "derived_from" in column:
+                continue
+            name = column["name"]
+            raw_path = os.path.join(self.tmp_dir, f"{name}.raw")
+            if column["kind"] == "category" and name in self.categories:
+                columns.append(self._append_category(column, raw_path))
+            elif column["kind"] == "numeric" and name in self.integer:
+                columns.append(self._append_numeric(column, raw_path))
+            else:
+                columns.append(None)
+            if columns[-1] is None:
+                shutil.rmtree(self.tmp_dir, ignore_errors=True)
+                return None
+            os.remove(raw_path)
+
+        for name in self.meta["indexes"]:
+            self._merge_sorted_index(name)
+
+        rows = self.base_rows + self.rows
+        columns += write_derived_columns(self.tmp_dir, rows, bands, self.chunk_rows)
+        derived = bands_signature(bands)
+        return self._publish({
+            "format": SNAPSHOT_FORMAT,
+            "rows": rows,
+            "version": version_for(source, derived),
+            "source": source,
+            "derived": derived,
+            "columns": columns,
+            "indexes": self.meta["indexes"],
+            # Versão da qual este snapshot é uma extensão: as linhas dela são as primeiras deste
+            "parent": {"version": self.meta["version"], "rows": self.base_rows},
+        })
+
+    def _write_column(self, name, dtype, tail, old_remap=None, tail_remap=None):
+        """Grava a coluna antiga seguida das linhas novas, traduzindo os códigos pelos remaps."""
+        old = np.load(os.path.join(self.snapshot_dir, f"{name}.npy"), mmap_mode="r")
+        path = os.path.join(self.tmp_dir, f"{name}.npy")
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(self.base_rows + self.rows,))
+        for start in range(0, self.base_rows, self.chunk_rows):
+            values = old[start:start + self.chunk_rows]
+            out[start:start + len(values)] = values if old_remap is None else old_remap[values]
+        for chunk in self._chunks():
+            values = tail[chunk]
+            out[self.base_rows + chunk.start:self.base_rows + chunk.stop] = (
+                values if tail_remap is None else tail_remap[values]
+            )
+        out.flush()
+
+    def _append_category(self, column, raw_path):
+        name = column["name"]
+        old_labels = column["categories"]
+        mapping = self.categories[name]
+        labels = sorted(set(old_labels) | set(mapping), key=str)
+        position = {label: code for code, label in enumerate(labels)}
+        # Os remaps têm uma posição extra no fim para o código -1 (valor ausente)
+        old_remap = None
+        if labels != old_labels:
+            old_remap = np.append([position[label] for label in old_labels], -1).astype(np.int64)
+        tail_remap = np.full(len(mapping) + 1, -1, dtype=np.int64)
+        tail_remap[list(mapping.values())] = [position[label] for label in mapping]
+        dtype = integer_dtype_for(-1, len(labels))
+        self._write_column(name, dtype, self._open_raw(raw_path, np.int32), old_remap, tail_remap)
+        return {
+            "name": name,
+            "kind": "category",
+            "dtype": dtype.str,
+            "categories": [label.item() if isinstance(label, np.generic) else label for label in labels],
+        }
+
+    def _append_numeric(self, column, raw_path):
+        name = column["name"]
+        dtype = np.dtype(column["dtype"])
+        if dtype.kind != "f":
+            if not self.integer[name]:
+                return None
+            dtype = np.promote_types(dtype, integer_dtype_for(*self.bounds[name]))
+        self._write_column(name, dtype, self._open_raw(raw_path, np.float64))
+        return {"name": name, "kind": "numeric", "dtype": dtype.str}
+
+    def _merge_sorted_index(self, name):
+        """Intercala as linhas novas no índice ordenado antigo, mantendo a ordem estável.
+
+        Uma linha nova entra depois de todas as antigas de valor menor ou igual; cada
+        linha antiga avança tantas posições quantas linhas novas entrarem antes dela.
+        """
+        old_order = np.load(os.path.join(self.snapshot_dir, f"{name}.order.npy"), mmap_mode="r")
+        old_sorted = np.load(os.path.join(self.snapshot_dir, f"{name}.sorted.npy"), mmap_mode="r")
+        values = np.load(os.path.join(self.tmp_dir, f"{name}.npy"), mmap_mode="r")[self.base_rows:]
+        tail_order = np.argsort(values, kind="stable")
+        tail_sorted = values[tail_order]
+        inserted = np.searchsorted(old_sorted, tail_sorted, side="right")
+
+        rows = self.base_rows + self.rows
+        order_dtype = np.int32 if rows < np.iinfo(np.int32).max else np.int64
+        order = np.lib.format.open_memmap(
+            os.path.join(self.tmp_dir, f"{name}.order.npy"), mode="w+", dtype=order_dtype, shape=(rows,)
+        )
+        sorted_values = np.lib.format.open_memmap(
+            os.path.join(self.tmp_dir, f"{name}.sorted.npy"), mode="w+", dtype=values.dtype, shape=(rows,)
+        )
+        for start in range(0, self.base_rows, self.chunk_rows):
+            stop = min(start + self.chunk_rows, self.base_rows)
+            old = np.arange(start, stop)
+            positions = old + np.searchsorted(inserted, old, side="right")
+            order[positions] = old_order[start:stop]
+            sorted_values[positions] = old_sorted[start:stop]
+        positions = inserted + np.arange(self.rows)
+        order[positions] = tail_order + self.base_rows
+        sorted_values[positions] = tail_sorted
+        order.flush()
+        sorted_values.flush()
+
+
+def write_derived_columns(directory, n_rows, bands, chunk_rows=1 << 20):
+    """Grava em directory o código de faixa de cada coluna derivada e retorna suas descrições.
+
+    Cada coluna é escrita num arquivo temporário e trocada de uma vez, então processos
+    que já mapearam a versão anterior continuam lendo um arquivo completo.
+    """
+    columns = []
+    for name, band in bands.items():
+        values = np.load(os.path.join(directory, f"{band.column}.npy"), mmap_mode="r")
+        dtype = integer_dtype_for(-1, len(band.labels))
+        tmp_path = os.path.join(directory, f"{name}.npy.tmp")
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=(n_rows,))
+        for start in range(0, n_rows, chunk_rows):
+            out[start:start + chunk_rows] = band.codes(values[start:start + chunk_rows])
+        out.flush()
+        del out
+        os.replace(tmp_path, os.path.join(directory, f"{name}.npy"))
+        columns.append({
+            "name": name,
+            "kind": "category",
+            "dtype": dtype.str,
+            "categories": band.labels,
+            "derived_from": band.column,
+        })
+    return columns
+
+
+def write_snapshot_meta(snapshot_dir, meta):
+    """Grava o meta.json de uma vez (arquivo temporário + os.replace)."""
+    tmp_path = os.path.join(snapshot_dir, "meta.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, os.path.join(snapshot_dir, "meta.json"))
+
+
+def derive_columns(snapshot_dir, bands=DEFAULT_BANDS):
+    """Regrava as colunas derivadas de um snapshot existente após mudança nas definições."""
+    meta = read_snapshot_meta(snapshot_dir)
+    stale = [column for column in meta["columns"] if "derived_from" in column]
+    columns = [column for column in meta["columns"] if "derived_from" not in column]
+    columns += write_derived_columns(snapshot_dir, meta["rows"], bands)
+    for column in stale:
+        if column["name"] not in bands:
+            os.remove(os.path.join(snapshot_dir, f"{column['name']}.npy"))
+
+    derived = bands_signature(bands)
+    meta.update(columns=columns, derived=derived, version=version_for(meta["source"], derived))
+    write_snapshot_meta(snapshot_dir, meta)
+    return meta
+
+
+def read_snapshot_meta(snapshot_dir):
+    """Lê o meta.json de um snapshot, ou None se ele não existir."""
+    try:
+        with open(os.path.join(snapshot_dir, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def load_snapshot(snapshot_dir, mmap=True):
+    """Monta um DataFrame a partir do snapshot, mapeando as colunas em memória."""
+    meta = read_snapshot_meta(snapshot_dir)
+    if meta is None:
+        raise FileNotFoundError(f"Snapshot não encontrado em {snapshot_dir}")
+
+    mmap_mode = "r" if mmap else None
+    data = {}
+    for column in meta["columns"]:
+        values = np.load(os.path.join(snapshot_dir, f"{column['name']}.npy"), mmap_mode=mmap_mode)
+        if column["kind"] == "category":
+            data[column["name"]] = pd.Categorical.from_codes(values, categories=column["categories"], validate=False)
+        else:
+            data[column["name"]] = values
+    df = pd.DataFrame(data, copy=False)
+    df.attrs["snapshot"] = {"dir": snapshot_dir, "source": meta["source"], "indexes": meta["indexes"]}
+    df.attrs["version"] = meta["version"]
+    return df
+
+
+def load_sorted_indexes(df, mmap=True):
+    """Índices ordenados gravados no snapshot do DataFrame: {coluna: (ordem, valores ordenados)}."""
+    snapshot = df.attrs.get("snapshot")
+    if not snapshot:
+        return {}
+    mmap_mode = "r" if mmap else None
+    return {
+        name: (
+            np.load(os.path.join(snapshot["dir"], f"{name}.order.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(snapshot["dir"], f"{name}.sorted.npy"), mmap_mode=mmap_mode),
+        )
+        for name in snapshot["indexes"]
+    }
+
+
+def build_snapshot(csv_path, snapshot_dir=None, max_memory_mb=DEFAULT_MEMORY_MB, bands=DEFAULT_BANDS):
+    """Lê o CSV em blocos limitados por max_memory_mb e grava o snapshot colunar correspondente."""
+    snapshot_dir = snapshot_dir or snapshot_dir_for(csv_path)
+    source = source_signature(csv_path)
+    chunk_rows = chunk_rows_for(csv_path, max_memory_mb)
+    os.makedirs(os.path.dirname(snapshot_dir), exist_ok=True)
+
+    writer = SnapshotWriter(snapshot_dir, chunk_rows)
+    # Só os bytes cobertos pela assinatura: o que for acrescentado durante a leitura fica para o próximo append
+    with open_byte_range(csv_path, 0, source["size"]) as f:
+        for chunk in pd.read_csv(f, chunksize=chunk_rows):
+            writer.append(chunk)
+    return writer.finish(source=source, bands=bands)
+
+
+def append_snapshot(csv_path, snapshot_dir=None, max_memory_mb=DEFAULT_MEMORY_MB, bands=DEFAULT_BANDS):
+    """Ingere só as linhas acrescentadas ao fim do CSV desde o snapshot (ver source_change).
+
+    Lê os bytes depois dos já ingeridos até a última linha completa (uma linha ainda
+    sendo escrita fica para a próxima vez). Retorna o meta do snapshot atualizado, ou
+    None se o trecho já ingerido mudou ou se as linhas novas não couberem no snapshot;
+    nesses casos ele precisa ser reconstruído.
+    """
+    snapshot_dir = snapshot_dir or snapshot_dir_for(csv_path)
+    meta = read_snapshot_meta(snapshot_dir)
+    start = meta["source"]["size"]
+    stat = os.stat(csv_path)
+    stop = last_line_end(csv_path, start, stat.st_size)
+    if stop == start:
+        return meta
+    old_checksum, checksum = prefix_checksums(csv_path, [start, stop])
+    if old_checksum != meta["source"]["checksum"]:
+        return None
+    source = {"size": stop, "mtime_ns": stat.st_mtime_ns, "checksum": checksum}
+
+    base_columns = [column for column in meta["columns"] if "derived_from" not in column]
+    chunk_rows = chunk_rows_for(csv_path, max_memory_mb)
+    appender = SnapshotAppender(snapshot_dir, chunk_rows, meta)
+    with open_byte_range(csv_path, start, stop) as f:
+        chunks = pd.read_csv(
+            f, header=None, names=[column["name"] for column in base_columns], chunksize=chunk_rows,
+            # Rótulos como texto, como no CSV inteiro, mesmo se as linhas novas só tiverem números
+            dtype={column["name"]: str for column in base_columns if column["kind"] == "category"},
+        )
+        for chunk in chunks:
+            appender.append(chunk)
+    if not appender.rows:
+        # Só linhas em branco: nada a acrescentar, mas o trecho lido não precisa ser relido
+        shutil.rmtree(appender.tmp_dir, ignore_errors=True)
+        meta["source"] = source
+        write_snapshot_meta(snapshot_dir, meta)
+        return meta
+    return appender.finish(source=source, bands=bands)
+
+
+# Serializa as atualizações de um mesmo snapshot feitas por threads do processo (ex.: o
+# watcher); snapshots diferentes (partições) podem ser atualizados ao mesmo tempo
+_refresh_locks = {}
+_refresh_locks_guard = threading.Lock()
+
+
+def refresh_snapshot(csv_path, snapshot_dir=None, max_memory_mb=DEFAULT_MEMORY_MB, bands=DEFAULT_BANDS):
+    """Deixa o snapshot de acordo com o CSV e retorna o seu meta.
+
+    Linhas acrescentadas ao fim do CSV são ingeridas por append_snapshot; se o conteúdo
+    já ingerido mudou, o snapshot é reconstruído. Se só as definições de faixas (bands)
+    mudaram, apenas as colunas derivadas são regravadas.
+    """
+    snapshot_dir = snapshot_dir or snapshot_dir_for(csv_path)
+    with _refresh_locks_guard:
+        lock = _refresh_locks.setdefault(os.path.abspath(snapshot_dir), threading.Lock())
+    with lock:
+        meta = read_snapshot_meta(snapshot_dir)
+        if meta is None or meta.get("format") != SNAPSHOT_FORMAT:
+            return build_snapshot(csv_path, snapshot_dir, max_memory_mb=max_memory_mb, bands=bands)
+
+        change = source_change(csv_path, meta["source"])
+        if change == "appended":
+            meta = append_snapshot(csv_path, snapshot_dir, max_memory_mb=max_memory_mb, bands=bands)
+        elif change == "touched":
+            # Mesmo tamanho com outra data de modificação: só reconstrói se o conteúdo mudou
+            if prefix_checksums(csv_path, [meta["source"]["size"]])[0] == meta["source"]["checksum"]:
+                meta["source"]["mtime_ns"] = os.stat(csv_path).st_mtime_ns
+                write_snapshot_meta(snapshot_dir, meta)
+            else:
+                meta = None
+        elif change == "changed":
+            meta = None
+        if meta is None:
+            return build_snapshot(csv_path, snapshot_dir, max_memory_mb=max_memory_mb, bands=bands)
+
+        if meta.get("derived") != bands_signature(bands):
+            meta = derive_columns(snapshot_dir, bands)
+        return meta
+
+
+def load_dataset(csv_path, snapshot_dir=None, max_memory_mb=DEFAULT_MEMORY_MB, bands=DEFAULT_BANDS):
+    """Carrega o dataset pelo snapshot, atualizando-o antes se o CSV tiver mudado (ver refresh_snapshot)."""
+    snapshot_dir = snapshot_dir or snapshot_dir_for(csv_path)
+    refresh_snapshot(csv_path, snapshot_dir, max_memory_mb=max_memory_mb, bands=bands)
+    return load_snapshot(snapshot_dir)
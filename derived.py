@@ -0,0 +1,44 @@
+import hashlib
+import json
+
+import numpy as np
+
+
+class Bands:
+    """Faixas [edges[i], edges[i+1]) de uma coluna numérica, com a última aberta ("61+").
+
+    Valores abaixo da primeira borda entram na primeira faixa, de forma que toda
+    linha recebe um código válido.
+    """
+
+    def __init__(self, column, edges, labels=None):
+        self.column = column
+        self.edges = [int(edge) for edge in edges]
+        if labels is None:
+            labels = [f'{low}-{high - 1}' for low, high in zip(self.edges, self.edges[1:])] + [f'{self.edges[-1]}+']
+        if len(labels) != len(self.edges):
+            raise ValueError(f"{column}: {len(self.edges)} bordas exigem {len(self.edges)} rótulos")
+        self.labels = list(labels)
+
+    def codes(self, values):
+        """Código da faixa de cada valor."""
+        codes = np.searchsorted(np.asarray(self.edges[1:]), values, side='right')
+        return codes.astype(np.int8 if len(self.labels) < 128 else np.int16)
+
+    def spec(self):
+        return {'column': self.column, 'edges': self.edges, 'labels': self.labels}
+
+
+# Colunas derivadas gravadas no snapshot: {nome: Bands}. Alterar uma definição apenas
+# regrava as colunas derivadas na próxima carga, sem reler o CSV.
+DEFAULT_BANDS = {
+    'age_band': Bands('age_in_years', [18, 31, 41, 51, 61]),
+    'credit_band': Bands('credit_amount', [0, 1000, 2500, 5000, 10000]),
+    'duration_band': Bands('duration_in_month', [0, 12, 24, 36, 48]),
+}
+
+
+def bands_signature(bands):
+    """Identificador curto de um conjunto de definições de faixas."""
+    payload = json.dumps({name: band.spec() for name, band in bands.items()}, sort_keys=True).encode()
+    return hashlib.sha1(payload).hexdigest()[:12]
@@ -0,0 +1,253 @@
+"""Exportação das linhas dentro dos filtros, em CSV ou Parquet, gerada em blocos.
+
+As linhas saem direto das colunas compartilhadas (o snapshot mapeado em memória, as
+partições ou o banco SQLite), bloco a bloco: a memória usada depende do tamanho do
+bloco, não do número de linhas exportadas. Só as colunas do CSV de origem são
+exportadas (as faixas derivadas ficam de fora).
+
+Cada arquivo leva a versão do dataset e a descrição dos filtros, para os números
+poderem ser reproduzidos: no CSV, em linhas de comentário no início
+(pd.read_csv(path, comment='#') as ignora); no Parquet, nos metadados do esquema
+(chave "credit_dashboard.export").
+"""
+import hashlib
+import json
+import os
+import tempfile
+from urllib.parse import urlencode
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dashboard import describe_filters
+from data import load_snapshot, snapshot_dir_for
+from derived import DEFAULT_BANDS
+
+
+# Linhas por bloco lido das colunas compartilhadas (e por row group no Parquet)
+EXPORT_CHUNK_ROWS = int(os.environ.get("CREDIT_EXPORT_CHUNK_ROWS", "100000"))
+
+# Arquivos gerados para download na interface; o nome vem da versão e dos filtros,
+# então sessões que pedem a mesma exportação reaproveitam o mesmo arquivo
+EXPORT_DIR = os.environ.get("CREDIT_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "credit_dashboard_exports"))
+
+# Endereço do api.py (ex.: http://127.0.0.1:8502) que serve as exportações da interface
+# por streaming (GET /export); deve usar o mesmo dataset do dashboard
+EXPORT_API_URL = os.environ.get("CREDIT_EXPORT_API_URL")
+
+# Maior arquivo entregue pelo st.download_button, que copia o arquivo inteiro para a
+# memória do servidor do Streamlit; acima disso só pelo api.py
+EXPORT_DOWNLOAD_MAX_BYTES = int(os.environ.get("CREDIT_EXPORT_DOWNLOAD_MAX_MB", "50")) * 2**20
+
+# {formato: (tipo MIME, extensão)}
+FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+
+METADATA_KEY = b"credit_dashboard.export"
+
+
+def export_metadata(dashboard, filters):
+    """Versão do dataset, filtros (como em compute_dashboard), número de linhas e colunas exportadas."""
+    return {
+        "dataset_version": dashboard.version,
+        "filters": describe_filters(filters),
+        "rows": dashboard.aggregate(filters).total,
+        "columns": source_columns(dashboard),
+    }
+
+
+def source_columns(dashboard):
+    """Colunas do CSV de origem, na ordem do arquivo (sem as faixas derivadas)."""
+    if dashboard.backend == "sqlite":
+        columns = dashboard.sql_backend.columns
+    elif dashboard.backend == "partitioned":
+        columns = list(dashboard.partitions.columns)
+    else:
+        columns = list(dashboard.df.columns)
+    return [column for column in columns if column not in DEFAULT_BANDS]
+
+
+def frame_chunks(df, columns, risk, age_range, credit_range, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Blocos (DataFrames) das linhas de df dentro dos filtros, na ordem do dataset.
+
+    Cada bloco de chunk_rows linhas do dataset é filtrado à parte, então só as colunas
+    desse bloco são lidas do snapshot de cada vez.
+    """
+    risk_mask = np.isin(df["risk"].cat.categories, list(risk))
+    risk_codes = df["risk"].cat.codes.to_numpy()
+    ages, credit = df["age_in_years"].to_numpy(), df["credit_amount"].to_numpy()
+    for start in range(0, len(df), chunk_rows):
+        block = slice(start, start + chunk_rows)
+        codes = risk_codes[block]
+        keep = (
+            (codes >= 0) & risk_mask[codes]
+            & (ages[block] >= age_range[0]) & (ages[block] <= age_range[1])
+            & (credit[block] >= credit_range[0]) & (credit[block] <= credit_range[1])
+        )
+        rows = start + np.flatnonzero(keep)
+        if rows.size:
+            yield take_rows(df, columns, rows)
+
+
+def take_rows(df, columns, rows):
+    """DataFrame com as linhas `rows` das colunas de df (categorias mantidas como Categorical)."""
+    return pd.DataFrame({
+        column: df[column].to_numpy()[rows] if df[column].dtype != "category"
+        else pd.Categorical.from_codes(
+            df[column].cat.codes.to_numpy()[rows], categories=df[column].cat.categories, validate=False
+        )
+        for column in columns
+    })
+
+
+def row_chunks(dashboard, filters, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Blocos das linhas dentro dos filtros normalizados, em qualquer backend do Dashboard.
+
+    Gera ao menos um bloco: sem linhas dentro dos filtros, um vazio com os tipos das colunas.
+    """
+    columns = source_columns(dashboard)
+    if dashboard.backend == "sqlite":
+        yield from dashboard.sql_backend.row_chunks(columns, *filters, chunk_rows=chunk_rows)
+        return
+
+    if dashboard.backend == "partitioned":
+        risk, age_range, credit_range, *periods = filters
+        # Partições ainda não carregadas são só mapeadas, sem montar índice e cubo
+        frames = [
+            partition.df if partition.loaded else load_snapshot(snapshot_dir_for(partition.csv_path))
+            for partition in dashboard.partitions.prune(*filters) or dashboard.partitions.partitions[:1]
+        ]
+    else:
+        risk, age_range, credit_range = filters
+        frames = [dashboard.df]
+    empty = True
+    for df in frames:
+        for chunk in frame_chunks(df, columns, risk, age_range, credit_range, chunk_rows):
+            empty = False
+            yield chunk
+    if empty:
+        yield take_rows(frames[0], columns, np.empty(0, dtype=np.int64))
+
+
+def csv_stream(chunks, metadata):
+    """Bytes do CSV: o cabeçalho de comentários com os metadados e um pedaço por bloco."""
+    yield (
+        f"# dataset_version: {metadata['dataset_version']}\n"
+        f"# filters: {json.dumps(metadata['filters'], ensure_ascii=False)}\n"
+        f"# rows: {metadata['rows']}\n"
+    ).encode()
+    yield (",".join(metadata["columns"]) + "\n").encode()
+    for chunk in chunks:
+        yield chunk.to_csv(header=False, index=False).encode()
+
+
+class _StreamSink:
+    """Destino de escrita do ParquetWriter que entrega o que já foi escrito a cada bloco.
+
+    tell() conta todos os bytes escritos (o Parquet grava posições absolutas no rodapé),
+    mas só os ainda não entregues ficam em memória.
+    """
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def parquet_schema(columns, sample):
+    """Esquema Arrow das colunas: categorias como texto (o Parquet as codifica em dicionário)."""
+    return pa.schema([
+        pa.field(column, pa.string() if sample[column].dtype == "category" else pa.from_numpy_dtype(sample[column].dtype))
+        for column in columns
+    ])
+
+
+def parquet_stream(chunks, metadata):
+    """Bytes do Parquet, um row group por bloco, com os metadados no esquema.
+
+    O esquema vem do primeiro bloco (row_chunks sempre gera ao menos um).
+    """
+    sink = _StreamSink()
+    writer = None
+    for chunk in chunks:
+        if writer is None:
+            schema = parquet_schema(metadata["columns"], chunk).with_metadata(
+                {METADATA_KEY: json.dumps(metadata, ensure_ascii=False).encode()}
+            )
+            writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+        arrays = [
+            pa.array(chunk[field.name].astype(object) if pa.types.is_string(field.type) else chunk[field.name].to_numpy(),
+                     type=field.type, from_pandas=True)
+            for field in schema
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def stream_export(dashboard, filters, fmt="csv", chunk_rows=EXPORT_CHUNK_ROWS):
+    """Metadados e gerador com os bytes da exportação dos filtros normalizados no formato `fmt`."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato de exportação desconhecido: {fmt}")
+    metadata = export_metadata(dashboard, filters)
+    chunks = row_chunks(dashboard, filters, chunk_rows)
+    return metadata, (csv_stream if fmt == "csv" else parquet_stream)(chunks, metadata)
+
+
+def export_filename(metadata, fmt):
+    """Nome do arquivo da exportação: versão do dataset e um resumo dos filtros."""
+    digest = hashlib.sha1(json.dumps(metadata["filters"], sort_keys=True).encode()).hexdigest()[:8]
+    return f"german_credit_{metadata['dataset_version']}_{digest}{FORMATS[fmt][1]}"
+
+
+def export_url(base_url, filters, fmt="csv"):
+    """URL do GET /export do api.py em `base_url` para os filtros normalizados."""
+    described = describe_filters(filters)
+    params = [("format", fmt)]
+    # Sem nenhum risco o parâmetro vai vazio (ausente, o api.py não filtraria)
+    params += [("risk", risk) for risk in described["risk"]] or [("risk", "")]
+    params += [(name, ",".join(str(int(value)) for value in described[name])) for name in ("age_range", "credit_range")]
+    if "periods" in described:
+        params += [("periods", period) for period in described["periods"]] or [("periods", "")]
+    return f"{base_url.rstrip('/')}/export?{urlencode(params)}"
+
+
+def write_export(dashboard, filters, fmt="csv", directory=EXPORT_DIR, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Grava a exportação em `directory` (se ainda não existir) e retorna (caminho, metadados)."""
+    metadata, stream = stream_export(dashboard, filters, fmt, chunk_rows)
+    path = os.path.join(directory, export_filename(metadata, fmt))
+    if os.path.exists(path):
+        stream.close()
+        return path, metadata
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            for data in stream:
+                f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path, metadata
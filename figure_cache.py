@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+
+
+def normalize_filters(risk, age_range, credit_range, age_bounds, credit_bounds, periods=None):
+    """Forma canônica dos filtros da sidebar, usada como parte da chave do cache.
+
+    A ordem dos riscos escolhidos não importa e os intervalos são recortados aos
+    limites do dataset, então seleções equivalentes caem na mesma entrada. periods
+    (fonte particionada por período) entra como um quarto item, também ordenado.
+    """
+    def clamp(value_range, bounds):
+        low, high = value_range
+        return max(int(low), int(bounds[0])), min(int(high), int(bounds[1]))
+
+    filters = tuple(sorted(set(risk))), clamp(age_range, age_bounds), clamp(credit_range, credit_bounds)
+    return filters if periods is None else filters + (tuple(sorted(set(periods))),)
+
+
+class FigureCache:
+    """Cache LRU de figuras Plotly já serializadas em JSON, compartilhado entre sessões.
+
+    O limite é dado em bytes de JSON guardado; ao ultrapassá-lo as entradas usadas
+    há mais tempo são descartadas. hits e misses contam as consultas desde a criação.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_build(self, key, build, serialize=None):
+        """Retorna o JSON da figura em `key`, chamando build() para criá-la se necessário.
+
+        serialize(figura) substitui o figura.to_json() padrão (ex.: para cronometrá-lo).
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # A figura é construída fora do lock para não bloquear as outras sessões
+        figure = build()
+        figure_json = serialize(figure) if serialize else figure.to_json()
+        self.put(key, figure_json)
+        return figure_json
+
+    def get(self, key):
+        """JSON guardado em `key`, ou None (contando o acerto ou a falta)."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, figure_json):
+        """Guarda o JSON de uma figura construída fora do cache (ex.: num pool de workers)."""
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = figure_json
+                self.size_bytes += len(figure_json)
+            while self.size_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self.size_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
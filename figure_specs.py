@@ -0,0 +1,403 @@
+"""Caminho rápido das figuras: especificações Plotly montadas direto dos arrays agregados.
+
+Cada função *_spec gera o mesmo gráfico que a plot_* correspondente de charts.py,
+mas como um dict {"data": [...], "layout": {...}} construído a partir dos arrays
+NumPy dos Aggregates, sem DataFrames intermediários nem a resolução de colunas do
+plotly.express. to_json serializa os arrays numéricos como typed arrays em base64
+(o formato {"dtype", "bdata"} do plotly.js, o mesmo usado pelo fig.to_json()).
+
+As especificações não levam layout.template: go.Figure e st.plotly_chart aplicam o
+template padrão ao receber o dict, sem validar outra vez o template inteiro.
+"""
+import base64
+import json
+
+import numpy as np
+import pandas as pd
+import plotly.colors
+import plotly.io as pio
+
+from charts import SCATTER_POINT_LIMIT
+
+
+RISK_COLORS = {'Good Risk': '#2ecc71', 'Bad Risk': '#e74c3c'}
+RISK_ORDER = ['Good Risk', 'Bad Risk']
+
+# Sequência de cores usada quando o template padrão não define uma (a mesma do px)
+FALLBACK_COLORS = ['#1F77B4', '#FF7F0E', '#2CA02C']
+
+# Tipos do plotly.js para typed arrays; inteiros de 64 bits são reduzidos como no Plotly
+_TYPED_ARRAY_DTYPES = {
+    'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+    'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8',
+}
+
+
+def default_colors():
+    """Sequência de cores do template padrão ativo, como o px faz quando não há mapa de cores.
+
+    Dentro do Streamlit o template padrão é o "streamlit", cujas cores são marcadores
+    trocados pelo navegador conforme o tema.
+    """
+    colorway = pio.templates[pio.templates.default or 'plotly'].layout.colorway
+    return list(colorway) if colorway else FALLBACK_COLORS
+
+
+def _typed_array(values):
+    if values.dtype == np.int64 or values.dtype == np.uint64:
+        for dtype in (np.int8, np.int16, np.int32) if values.dtype == np.int64 else (np.uint8, np.uint16, np.uint32):
+            info = np.iinfo(dtype)
+            if values.min() >= info.min and values.max() <= info.max:
+                values = values.astype(dtype)
+                break
+    code = _TYPED_ARRAY_DTYPES.get(str(values.dtype))
+    if code is None:
+        return values.tolist()
+    spec = {'dtype': code, 'bdata': base64.b64encode(np.ascontiguousarray(values)).decode('ascii')}
+    if values.ndim > 1:
+        spec['shape'] = str(values.shape)[1:-1]
+    return spec
+
+
+def _encode(value):
+    if isinstance(value, np.ndarray):
+        return _typed_array(value) if value.size and value.dtype.kind in 'iuf' else value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+def to_json(spec):
+    """JSON da especificação, com os arrays NumPy como typed arrays em base64."""
+    return json.dumps(spec, default=_encode, ensure_ascii=False, separators=(',', ':'))
+
+
+def _axes(x_title=None, y_title=None, **yaxis):
+    xaxis = {'anchor': 'y', 'domain': [0.0, 1.0]}
+    if x_title is not None:
+        xaxis['title'] = {'text': x_title}
+    yaxis = {'anchor': 'x', 'domain': [0.0, 1.0], **({'title': {'text': y_title}} if y_title is not None else {}), **yaxis}
+    return {'xaxis': xaxis, 'yaxis': yaxis}
+
+
+def _bar(x, y, hovertemplate, color, name='', orientation='v', **extra):
+    """Trace de barras com os mesmos atributos que o px.bar preenche."""
+    trace = {
+        'hovertemplate': hovertemplate,
+        'legendgroup': name,
+        'marker': {'color': color, 'pattern': {'shape': ''}},
+        'name': name,
+        'orientation': orientation,
+        'showlegend': bool(name),
+        'textposition': 'auto',
+        'x': x,
+        'xaxis': 'x',
+        'y': y,
+        'yaxis': 'y',
+        'type': 'bar',
+    }
+    trace.update(extra)
+    return trace
+
+
+def _legend(title=None, **extra):
+    return {**({'title': {'text': title}} if title is not None else {}), 'tracegroupgap': 0, **extra}
+
+
+def _value_counts(labels, counts):
+    """Rótulos e contagens não nulas em ordem decrescente, como o value_counts."""
+    order = np.argsort(-counts, kind='stable')
+    order = order[counts[order] > 0]
+    return [labels[i] for i in order], counts[order]
+
+
+def insufficient_data_spec(title):
+    """Figura vazia com título, equivalente a px.bar(title=...)."""
+    trace = _bar(None, None, '<extra></extra>', default_colors()[0])
+    del trace['x'], trace['y']
+    return {
+        'data': [trace],
+        'layout': {**_axes(), 'legend': _legend(), 'title': {'text': title}, 'barmode': 'relative'},
+    }
+
+
+def risk_distribution_spec(agg):
+    labels, counts = _value_counts(agg.risk_labels, agg.counts)
+
+    if len(labels) > 1:
+        shares = counts / counts.sum() * 100
+        colors = default_colors()
+        data = [
+            _bar(
+                ['Distribuição de Risco'], shares[i:i + 1],
+                f'Risco={label}<br>x=%{{x}}<br>Proporção (%)=%{{text}}<extra></extra>', colors[i],
+                name=label, text=shares[i:i + 1], textposition='inside', texttemplate='%{text:.1f}%',
+            )
+            for i, label in enumerate(labels)
+        ]
+        layout = {
+            **_axes('', 'Proporção (%)', range=[0, 100]),
+            'legend': _legend('Risco'),
+            'title': {'text': 'Distribuição Percentual de Risco de Crédito'},
+            'barmode': 'stack',
+            'showlegend': True,
+        }
+    else:
+        count = counts[0]
+        data = [_bar(
+            labels, counts, 'Risco=%{x}<br>Quantidade=%{text}<extra></extra>', default_colors()[0],
+            text=counts.astype(float), textposition='outside', texttemplate='%{text}',
+        )]
+        layout = {
+            **_axes('Risco', 'Quantidade', range=[0, count * 1.2]),
+            'legend': _legend(),
+            'title': {'text': 'Quantidade de Solicitantes por Tipo de Risco'},
+            'barmode': 'relative',
+            'showlegend': False,
+        }
+    return {'data': data, 'layout': layout}
+
+
+def _risk_stack_spec(agg, column, title, xaxis_label):
+    """Barras empilhadas de risco por categoria de `column`, em % ou contagem (um só risco)."""
+    labels, matrix = agg.dimensions[column]
+    rows = matrix.sum(axis=1) > 0
+    risk_present = matrix.sum(axis=0) > 0
+    matrix = matrix[rows]
+    single_risk_class = risk_present.sum() == 1
+    values = matrix / matrix.sum(axis=1, keepdims=True) if not single_risk_class else matrix.astype(float)
+
+    x = [label for label, keep in zip(labels, rows) if keep]
+    y_label = 'Percentual (%)' if not single_risk_class else 'Contagem'
+    data = []
+    for risk in RISK_ORDER:
+        j = agg.risk_labels.index(risk)
+        y = values[:, j] if risk_present[j] else np.zeros(len(x))
+        data.append(_bar(
+            x, y, f'risk={risk}<br>{xaxis_label}=%{{x}}<br>{y_label}=%{{y}}<extra></extra>', RISK_COLORS[risk],
+            name=risk,
+        ))
+    return {
+        'data': data,
+        'layout': {
+            **_axes(xaxis_label, y_label),
+            'legend': _legend('risk'),
+            'title': {'text': title + (" (%)" if not single_risk_class else " (Contagem)")},
+            'barmode': 'stack',
+            'font': {'size': 14},
+            'height': 400,
+        },
+    }
+
+
+def risk_by_age_spec(agg):
+    if agg.empty:
+        return insufficient_data_spec("Dados insuficientes para Risco por Faixa Etária")
+    return _risk_stack_spec(agg, 'age_band', "Distribuição de Risco por Faixa Etária", 'Faixa Etária')
+
+
+def risk_by_category_spec(agg, column, title, xaxis_label):
+    if agg.empty or column not in agg.dimensions:
+        return insufficient_data_spec(f"Dados insuficientes para {title}")
+    return _risk_stack_spec(agg, column, title, xaxis_label)
+
+
+def binned_histogram_spec(edges, counts, title, xaxis_label, color):
+    data = [_bar(
+        (edges[:-1] + edges[1:]) / 2, counts,
+        xaxis_label + ': %{customdata[0]:,.0f} a %{customdata[1]:,.0f}<br>Quantidade: %{y}<extra></extra>', color,
+        customdata=np.column_stack([edges[:-1], edges[1:]]), width=np.diff(edges),
+    )]
+    layout = {
+        **_axes(xaxis_label, 'Quantidade'),
+        'legend': _legend(),
+        'title': {'text': title},
+        'barmode': 'relative',
+        'font': {'size': 14},
+        'bargap': 0,
+        'height': 400,
+    }
+    return {'data': data, 'layout': layout}
+
+
+def age_distribution_spec(agg):
+    edges, counts = agg.histogram('age_in_years')
+    return binned_histogram_spec(edges, counts, "Distribuição de Idade dos Solicitantes", 'Idade', '#3498db')
+
+
+def credit_amount_distribution_spec(agg):
+    edges, counts = agg.histogram('credit_amount')
+    return binned_histogram_spec(edges, counts, "Distribuição do Valor do Crédito", 'Valor do Crédito (DM)', '#f39c12')
+
+
+def _horizontal_counts_spec(agg, column, title, yaxis_label, color, height):
+    labels, counts = agg.dimensions[column]
+    labels, counts = _value_counts(labels, counts.sum(axis=1))
+    data = [_bar(counts, labels, f'Quantidade=%{{x}}<br>{yaxis_label}=%{{y}}<extra></extra>', color, orientation='h')]
+    layout = {
+        **_axes('Quantidade', yaxis_label),
+        'legend': _legend(),
+        'title': {'text': title},
+        'barmode': 'relative',
+        'font': {'size': 14},
+        'height': height,
+    }
+    return {'data': data, 'layout': layout}
+
+
+def personal_status_spec(agg):
+    return _horizontal_counts_spec(agg, 'personal_status_sex', "Status Pessoal e Sexo", 'Status', '#9b59b6', 400)
+
+
+def purpose_distribution_spec(agg):
+    return _horizontal_counts_spec(agg, 'purpose', "Propósito do Crédito", 'Propósito', '#1abc9c', 500)
+
+
+def housing_type_distribution_spec(agg):
+    labels, counts = agg.dimensions['housing_type']
+    labels, counts = _value_counts(labels, counts.sum(axis=1))
+    data = [{
+        'domain': {'x': [0.0, 1.0], 'y': [0.0, 1.0]},
+        'hovertemplate': 'label=%{label}<br>value=%{value}<extra></extra>',
+        'labels': labels,
+        'legendgroup': '',
+        'name': '',
+        'showlegend': True,
+        'values': counts,
+        'type': 'pie',
+        'textinfo': 'percent+label',
+        'textposition': 'inside',
+    }]
+    layout = {
+        'legend': _legend(),
+        'title': {'text': "Tipo de Habitação"},
+        'piecolorway': ['#ff6b6b', '#4ecdc4', '#45b7d1'],
+        'font': {'size': 14},
+        'height': 400,
+    }
+    return {'data': data, 'layout': layout}
+
+
+def _scatter_spec(risk, x, y, title, size=None, legend_extra=None):
+    """Um trace por risco, na ordem em que os riscos aparecem, como o px.scatter com color='risk'.
+
+    Como o px (render_mode='auto'), acima de 1000 pontos os traces passam a ser scattergl.
+    """
+    codes, uniques = pd.factorize(risk)
+    webgl = len(risk) > 1000
+    hover = 'risk={risk}<br>Valor do Crédito (DM)=%{{x}}<br>Duração (meses)=%{{y}}'
+    if size is not None:
+        hover += '<br>Solicitantes na célula=%{{marker.size}}'
+    data = []
+    for code, label in enumerate(uniques):
+        keep = codes == code
+        marker = {'color': RISK_COLORS[label], 'symbol': 'circle'}
+        if size is not None:
+            marker = {
+                'color': RISK_COLORS[label], 'size': size[keep], 'sizemode': 'area',
+                'sizeref': float(size.max()) / 18 ** 2, 'symbol': 'circle',
+                'line': {'width': 0}, 'opacity': 0.6,
+            }
+        trace = {
+            'hovertemplate': hover.format(risk=label) + '<extra></extra>',
+            'legendgroup': label,
+            'marker': marker,
+            'mode': 'markers',
+            'name': label,
+            'orientation': 'v',
+            'showlegend': True,
+            'x': x[keep],
+            'xaxis': 'x',
+            'y': y[keep],
+            'yaxis': 'y',
+            'type': 'scattergl' if webgl else 'scatter',
+        }
+        if webgl:
+            del trace['orientation']
+        data.append(trace)
+    layout = {
+        **_axes('Valor do Crédito (DM)', 'Duração (meses)'),
+        'legend': _legend('risk', **(legend_extra or {})),
+        'title': {'text': title},
+        'font': {'size': 14},
+        'height': 400,
+    }
+    return {'data': data, 'layout': layout}
+
+
+def credit_vs_duration_points_spec(risk, credit, duration):
+    return _scatter_spec(np.asarray(risk, dtype=object), np.asarray(credit), np.asarray(duration), "Valor do Crédito vs Duração")
+
+
+def credit_vs_duration_density_spec(risk, x, y, count, n_rows):
+    return _scatter_spec(
+        np.asarray(risk, dtype=object), np.asarray(x), np.asarray(y),
+        f"Valor do Crédito vs Duração (agregado em grade, {n_rows:,} solicitantes)",
+        size=np.asarray(count), legend_extra={'itemsizing': 'constant'},
+    )
+
+
+def credit_vs_duration_spec(df, rows, grid):
+    """Dispersão das linhas selecionadas: pontos individuais ou células da grade acima do limite."""
+    if len(rows) > SCATTER_POINT_LIMIT:
+        counts = grid.counts(rows)
+        risk_idx, x_idx, y_idx = np.nonzero(counts)
+        x_centers = (grid.x_edges[:-1] + grid.x_edges[1:]) / 2
+        y_centers = (grid.y_edges[:-1] + grid.y_edges[1:]) / 2
+        return credit_vs_duration_density_spec(
+            np.asarray(grid.risk_labels, dtype=object)[risk_idx], x_centers[x_idx], y_centers[y_idx],
+            counts[risk_idx, x_idx, y_idx], len(rows),
+        )
+    risk = df['risk']
+    return credit_vs_duration_points_spec(
+        np.asarray(risk.cat.categories, dtype=object)[risk.cat.codes.to_numpy()[rows]],
+        df['credit_amount'].to_numpy()[rows], df['duration_in_month'].to_numpy()[rows],
+    )
+
+
+def credit_vs_duration_sql_spec(backend, n_rows, *filters):
+    """Mesma dispersão com os pontos ou as células vindos do SQLiteBackend (ou do PartitionedSource)."""
+    if n_rows > SCATTER_POINT_LIMIT:
+        cells = backend.scatter_cells(*filters)
+        return credit_vs_duration_density_spec(
+            cells['risk'].to_numpy(), cells['x'].to_numpy(), cells['y'].to_numpy(), cells['count'].to_numpy(), n_rows
+        )
+    points = backend.scatter_points(*filters)
+    return credit_vs_duration_points_spec(
+        points['risk'].to_numpy(), points['credit_amount'].to_numpy(), points['duration_in_month'].to_numpy()
+    )
+
+
+def crosstab_spec(crosstab, normalize=False):
+    """Mapa de calor da tabela de contingência (aggregations.Crosstab), como o px.imshow de plot_crosstab."""
+    title = f"{crosstab.rows} x {crosstab.columns}"
+    if crosstab.empty:
+        return insufficient_data_spec(f"Dados insuficientes para {title}")
+
+    table = crosstab.table(normalize)
+    value_label = 'Percentual (%)' if normalize else 'Quantidade'
+    values = table.to_numpy() * 100 if normalize else table.to_numpy()
+    blues = plotly.colors.sequential.Blues
+    data = [{
+        'coloraxis': 'coloraxis',
+        'name': '0',
+        'texttemplate': '%{z:.1f}' if normalize else '%{z}',
+        'x': table.columns.to_numpy(dtype=object),
+        'y': table.index.to_numpy(dtype=object),
+        'z': values,
+        'type': 'heatmap',
+        'xaxis': 'x',
+        'yaxis': 'y',
+        'hovertemplate': f'{crosstab.columns}: %{{x}}<br>{crosstab.rows}: %{{y}}<br>{value_label}: %{{z}}<extra></extra>',
+    }]
+    layout = {
+        **_axes(crosstab.columns, crosstab.rows, autorange='reversed'),
+        'coloraxis': {
+            'colorbar': {'title': {'text': value_label}},
+            'colorscale': [[i / (len(blues) - 1), color] for i, color in enumerate(blues)],
+        },
+        'title': {'text': title + (" (%)" if normalize else "")},
+        'font': {'size': 14},
+        'height': max(400, 40 * len(table) + 160),
+    }
+    return {'data': data, 'layout': layout}
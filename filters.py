@@ -0,0 +1,99 @@
+import numpy as np
+
+
+def _row_dtype(n_rows):
+    """Menor dtype inteiro capaz de endereçar todas as linhas."""
+    return np.int32 if n_rows < np.iinfo(np.int32).max else np.int64
+
+
+class FilterIndex:
+    """Índices montados uma vez no carregamento para resolver os filtros da sidebar.
+
+    Colunas categóricas ganham um bitmap compactado (np.packbits) por categoria e
+    colunas numéricas ganham um índice ordenado, de forma que um intervalo é
+    resolvido com busca binária. As consultas devolvem posições de linha em vez de
+    um DataFrame copiado.
+    """
+
+    def __init__(self, df, range_columns=("age_in_years", "credit_amount"), bitmap_columns=None,
+                 presorted=None, chunk_rows=1 << 22):
+        self.n_rows = len(df)
+        self.row_dtype = _row_dtype(self.n_rows)
+
+        # Bitmaps montados por blocos (múltiplos de 8 linhas) para limitar a memória temporária
+        if bitmap_columns is None:
+            bitmap_columns = df.select_dtypes("category").columns
+        chunk_rows -= chunk_rows % 8
+        self.bitmaps = {}
+        for column in bitmap_columns:
+            codes = df[column].cat.codes.to_numpy()
+            bitmaps = {
+                category: np.empty((self.n_rows + 7) // 8, dtype=np.uint8)
+                for category in df[column].cat.categories
+            }
+            for start in range(0, self.n_rows, chunk_rows):
+                chunk = codes[start:start + chunk_rows]
+                for code, bitmap in enumerate(bitmaps.values()):
+                    bitmap[start // 8:(start + len(chunk) + 7) // 8] = np.packbits(chunk == code)
+            self.bitmaps[column] = bitmaps
+
+        # Índices ordenados já gravados no snapshot são reaproveitados (mapeados em memória)
+        presorted = presorted or {}
+        self.sorted_indexes = {}
+        for column in range_columns:
+            values = df[column].to_numpy()
+            if column in presorted:
+                order, sorted_values = presorted[column]
+            else:
+                order = np.argsort(values, kind="stable").astype(self.row_dtype)
+                sorted_values = values[order]
+            self.sorted_indexes[column] = (order, sorted_values, values)
+
+    def category_bitmap(self, column, categories):
+        """União compactada dos bitmaps das categorias escolhidas, ou None se todas forem aceitas."""
+        bitmaps = self.bitmaps[column]
+        wanted = [bitmaps[c] for c in categories if c in bitmaps]
+        if len(wanted) == len(bitmaps):
+            return None
+        if not wanted:
+            return np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        return np.bitwise_or.reduce(wanted)
+
+    def range_bounds(self, column, low, high):
+        """Fatia [start, stop) do índice ordenado que contém os valores entre low e high (inclusive)."""
+        _, sorted_values, _ = self.sorted_indexes[column]
+        start = np.searchsorted(sorted_values, low, side="left")
+        stop = np.searchsorted(sorted_values, high, side="right")
+        return int(start), int(stop)
+
+    def select(self, categories=None, ranges=None):
+        """Retorna as posições (ordenadas) das linhas que atendem a todos os filtros.
+
+        categories: {coluna: valores aceitos}; uma lista vazia não aceita nenhuma linha.
+        ranges: {coluna: (mínimo, máximo)}, com ambos os limites inclusive.
+        """
+        bitmaps = [
+            bitmap for bitmap in (
+                self.category_bitmap(column, values) for column, values in (categories or {}).items()
+            )
+            if bitmap is not None
+        ]
+        bounds = {column: self.range_bounds(column, *limits) for column, limits in (ranges or {}).items()}
+
+        if bounds:
+            # Parte do intervalo mais seletivo e confere os demais filtros só nessas linhas
+            narrowest = min(bounds, key=lambda column: bounds[column][1] - bounds[column][0])
+            start, stop = bounds.pop(narrowest)
+            rows = self.sorted_indexes[narrowest][0][start:stop]
+            for column, (low, high) in ranges.items():
+                if column in bounds:
+                    values = self.sorted_indexes[column][2][rows]
+                    rows = rows[(values >= low) & (values <= high)]
+            for bitmap in bitmaps:
+                rows = rows[(bitmap[rows >> 3] >> (7 - (rows & 7))) & 1 == 1]
+            return np.sort(rows)
+
+        if bitmaps:
+            mask = np.unpackbits(np.bitwise_and.reduce(bitmaps), count=self.n_rows)
+            return np.flatnonzero(mask).astype(self.row_dtype)
+        return np.arange(self.n_rows, dtype=self.row_dtype)
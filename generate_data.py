@@ -0,0 +1,116 @@
+"""Gera versões sintéticas maiores do German Credit Data com o mesmo esquema.
+
+Uso:
+    python generate_data.py --rows 1m --output .bench_data/german_credit_1m.csv
+    python generate_data.py --rows 1m --partitions 12 --output .bench_data/german_credit_1m_parts
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+
+SOURCE_PATH = "german_credit_data_treated.csv"
+
+# Escalas usadas pelo benchmark
+SCALES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+
+def parse_rows(value):
+    """Aceita um número de linhas ou uma das escalas nomeadas (10k, 1m, 10m)."""
+    return SCALES.get(value.lower()) or int(value.replace("_", ""))
+
+
+class CreditDataGenerator:
+    """Amostra linhas sintéticas preservando as frequências condicionadas ao risco.
+
+    Cada linha parte de uma linha real sorteada dentro da mesma classe de risco
+    (mantendo as correlações entre colunas). Cada coluna categórica é então
+    reamostrada, com probabilidade `resample_prob`, da sua distribuição dado o
+    risco, o que preserva as frequências por risco e diversifica as combinações.
+    Idade e valor do crédito recebem um pequeno ruído e ficam dentro dos limites
+    originais.
+    """
+
+    def __init__(self, source, seed=None, resample_prob=0.2):
+        self.source = source
+        self.rng = np.random.default_rng(seed)
+        self.resample_prob = resample_prob
+        self.risk_share = source["risk"].value_counts(normalize=True)
+        self.rows_by_risk = {risk: group.reset_index(drop=True) for risk, group in source.groupby("risk")}
+        self.categorical = source.select_dtypes("object").columns.drop("risk")
+
+    def sample(self, n_rows):
+        """Gera um DataFrame com n_rows linhas sintéticas."""
+        risks = self.rng.choice(self.risk_share.index.to_numpy(), size=n_rows, p=self.risk_share.to_numpy())
+        parts = []
+        for risk, rows in self.rows_by_risk.items():
+            n_risk = int((risks == risk).sum())
+            if n_risk == 0:
+                continue
+            part = rows.iloc[self.rng.integers(0, len(rows), n_risk)].reset_index(drop=True)
+            for column in self.categorical:
+                resample = self.rng.random(n_risk) < self.resample_prob
+                values = rows[column].to_numpy()
+                part.loc[resample, column] = values[self.rng.integers(0, len(values), int(resample.sum()))]
+            parts.append(part)
+        df = pd.concat(parts, ignore_index=True)
+        df = df.iloc[self.rng.permutation(len(df))].reset_index(drop=True)
+
+        ages = df["age_in_years"] + self.rng.integers(-2, 3, len(df))
+        df["age_in_years"] = ages.clip(self.source["age_in_years"].min(), self.source["age_in_years"].max())
+        credit = np.rint(df["credit_amount"] * self.rng.lognormal(0, 0.1, len(df))).astype(np.int64)
+        df["credit_amount"] = np.clip(credit, self.source["credit_amount"].min(), self.source["credit_amount"].max())
+        return df[self.source.columns]
+
+    def write_csv(self, path, n_rows, chunk_rows=500_000):
+        """Grava n_rows linhas em path, gerando em blocos para limitar a memória."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", newline="") as f:
+            for start in range(0, n_rows, chunk_rows):
+                chunk = self.sample(min(chunk_rows, n_rows - start))
+                chunk.to_csv(f, header=start == 0, index=False)
+
+    def write_partitions(self, directory, n_rows, periods, chunk_rows=500_000):
+        """Grava n_rows linhas num diretório particionado por risco e período (ver partitions.py).
+
+        Cada linha recebe um período sorteado de `periods`; os arquivos ficam em
+        risk=<risco>/period=<período>/part.csv.
+        """
+        written = set()
+        for start in range(0, n_rows, chunk_rows):
+            chunk = self.sample(min(chunk_rows, n_rows - start))
+            chunk_periods = self.rng.choice(np.asarray(periods), size=len(chunk))
+            for (risk, period), part in chunk.groupby([chunk["risk"], chunk_periods], sort=True):
+                path = os.path.join(directory, f"risk={risk}", f"period={period}", "part.csv")
+                first = path not in written
+                if first:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    written.add(path)
+                part.to_csv(path, mode="w" if first else "a", header=first, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=parse_rows, required=True, help="número de linhas ou escala (10k, 1m, 10m)")
+    parser.add_argument("--output", required=True, help="CSV de saída (diretório, com --partitions)")
+    parser.add_argument("--partitions", type=int, default=0,
+                        help="divide as linhas em N períodos mensais a partir de 2024-01, um diretório por risco e período")
+    parser.add_argument("--source", default=SOURCE_PATH, help="CSV original usado como referência")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generator = CreditDataGenerator(pd.read_csv(args.source), seed=args.seed)
+    if args.partitions:
+        periods = pd.period_range("2024-01", periods=args.partitions, freq="M").astype(str)
+        generator.write_partitions(args.output, args.rows, periods)
+    else:
+        generator.write_csv(args.output, args.rows)
+    print(f"{args.rows:,} linhas gravadas em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
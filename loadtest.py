@@ -0,0 +1,368 @@
+"""Teste de carga do dashboard com várias sessões simultâneas num único servidor do stm.py.
+
+Para cada nível de concorrência o teste sobe um `streamlit run stm.py` e conecta a
+ele N sessões pelo mesmo websocket do navegador (/_stcore/stream), enviando as
+mensagens de reexecução com o estado dos widgets como o frontend faz. Todas as
+sessões dividem o mesmo processo: o Dashboard do st.cache_resource, os locks e o
+cache de figuras, e disputam as reexecuções no mesmo interpretador.
+
+As sessões repetem interações de um analista: trocar os riscos do multiselect,
+arrastar os sliders de idade e de crédito e clicar em "Alternar Tema". São
+registrados os percentis da latência das reexecuções (do envio até o fim do script
+no servidor), a vazão, a memória residente do servidor (com o dataset carregado e
+sem sessões, no fim e o pico do nível) e a memória própria de cada sessão (a
+seleção guardada no session_state, lida dos logs de desempenho do servidor).
+O cliente roda noutro processo; numa máquina com poucos núcleos ele disputa a CPU
+com o servidor.
+
+    python loadtest.py --sessions 1 2 4 8 --actions 20
+    CREDIT_DATA_PATH=.bench_data/german_credit_1m.csv python loadtest.py --sessions 1 4 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.websocket import websocket_connect
+
+from benchmark import RESULTS_DIR
+from dashboard import DATA_BACKEND, DATA_PATH, Dashboard
+from profiling import PROFILE_LOG_PATH
+
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stm.py")
+
+RISK_CHOICES = [["Good Risk", "Bad Risk"], ["Good Risk"], ["Bad Risk"]]
+
+# Rótulos dos widgets da sidebar do stm.py usados pelo roteiro
+RISK_LABEL = "Selecione o tipo de risco:"
+SLIDER_LABELS = ["Faixa etária:", "Valor do crédito (DM):"]
+THEME_LABEL = "Alternar Tema"
+
+# Peso de cada interação no roteiro das sessões; um arrasto gera DRAG_STEPS reexecuções
+ACTION_WEIGHTS = {"risco": 0.25, "idade": 0.3, "crédito": 0.3, "tema": 0.15}
+DRAG_STEPS = 3
+
+
+def server_memory(pid):
+    """Memória residente atual e o pico do processo `pid`, em bytes (None fora do Linux)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+    except OSError:
+        return None, None
+    return int(fields["VmRSS"].split()[0]) * 1024, int(fields["VmHWM"].split()[0]) * 1024
+
+
+class BrowserSession:
+    """Uma sessão do navegador: o websocket do frontend do Streamlit e o estado dos seus widgets.
+
+    Cada reexecução envia o estado de todos os widgets já alterados (como o frontend)
+    e espera o fim do script. Os widgets são localizados pelo rótulo nos elementos recebidos.
+    """
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.widgets = {}
+        self.states = {}
+        self.values = {}
+
+    async def connect(self):
+        self.connection = await websocket_connect(self.url, subprotocols=["streamlit"])
+
+    def close(self):
+        self.connection.close()
+
+    async def rerun(self, trigger=None):
+        """Reexecuta o script com os widgets atuais (e o botão `trigger` clicado); retorna (segundos, erros)."""
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        msg.rerun_script.widget_states.widgets.extend(self.states.values())
+        if trigger is not None:
+            msg.rerun_script.widget_states.widgets.add(id=self.widgets[trigger].id, trigger_value=True)
+        start = time.perf_counter()
+        await self.connection.write_message(msg.SerializeToString(), binary=True)
+        errors = 0
+        while True:
+            payload = await asyncio.wait_for(self.connection.read_message(), self.timeout)
+            if payload is None:
+                raise ConnectionError("o servidor fechou o websocket")
+            forward = ForwardMsg()
+            forward.ParseFromString(payload)
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                proto = getattr(element, element.WhichOneof("type"))
+                if element.WhichOneof("type") == "exception":
+                    errors += 1
+                elif getattr(proto, "id", None) and getattr(proto, "label", None):
+                    self.widgets[proto.label] = proto
+            elif kind == "script_finished" and forward.script_finished in (
+                ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_WITH_COMPILE_ERROR
+            ):
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    errors += 1
+                return time.perf_counter() - start, errors
+
+    def set_risk(self, risks):
+        self.values[RISK_LABEL] = risks
+        state = WidgetState(id=self.widgets[RISK_LABEL].id)
+        state.string_array_value.data.extend(risks)
+        self.states[RISK_LABEL] = state
+
+    def risk(self):
+        widget = self.widgets[RISK_LABEL]
+        return self.values.get(RISK_LABEL, [widget.options[i] for i in widget.default])
+
+    def set_slider(self, label, value):
+        self.values[label] = value
+        state = WidgetState(id=self.widgets[label].id)
+        state.double_array_value.data.extend(value)
+        self.states[label] = state
+
+    def slider(self, label):
+        """(valor atual, mínimo, máximo) do slider `label`."""
+        widget = self.widgets[label]
+        return self.values.get(label, list(widget.default)), widget.min, widget.max
+
+
+def set_risk(rng):
+    def apply(session):
+        current = session.risk()
+        session.set_risk(rng.choice([c for c in RISK_CHOICES if c != current]))
+    return apply
+
+
+def drag_slider(index, handle, share):
+    """Passo de arrasto da alça `handle` do slider, de `share` da sua amplitude."""
+    def apply(session):
+        label = SLIDER_LABELS[index]
+        value, low, high = session.slider(label)
+        value = list(value)
+        value[handle] += round(share * (high - low))
+        value[handle] = min(max(value[handle], low), high)
+        session.set_slider(label, [min(value), max(value)])
+    return apply
+
+
+def toggle_theme(session):
+    return THEME_LABEL
+
+
+def interaction_trace(rng, n_actions):
+    """Roteiro de interações de uma sessão: lista de (tipo, função que altera a sessão).
+
+    A função devolve o rótulo do botão clicado, se houver.
+    """
+    trace = []
+    while len(trace) < n_actions:
+        kind = rng.choices(list(ACTION_WEIGHTS), weights=list(ACTION_WEIGHTS.values()))[0]
+        if kind == "risco":
+            trace.append((kind, set_risk(rng)))
+        elif kind == "tema":
+            trace.append((kind, toggle_theme))
+        else:
+            # Um arrasto move a mesma alça na mesma direção em passos de até 8% da amplitude
+            index, handle, direction = 0 if kind == "idade" else 1, rng.randrange(2), rng.choice([-1, 1])
+            trace.extend(
+                (kind, drag_slider(index, handle, direction * rng.uniform(0.01, 0.08))) for _ in range(DRAG_STEPS)
+            )
+    return trace[:n_actions]
+
+
+async def run_session(session, trace, result):
+    """Executa o roteiro numa sessão já aberta, registrando a latência de cada reexecução."""
+    result["started"] = time.time()
+    for kind, apply in trace:
+        seconds, errors = await session.rerun(apply(session))
+        result["latencies"].append((kind, seconds))
+        result["errors"] += errors
+    result["finished"] = time.time()
+
+
+def megabytes(value):
+    return "-" if value is None else f"{value / 2**20:.1f}"
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, profile_log, timeout):
+    """Sobe o `streamlit run stm.py` na porta e espera o health check responder."""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", SCRIPT_PATH, "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false", "--server.fileWatcherType", "none"],
+        env={**os.environ, "CREDIT_PROFILE_LOG": profile_log},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"o servidor do streamlit terminou com código {server.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.read() == b"ok":
+                    return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise TimeoutError("o servidor do streamlit não respondeu ao health check")
+
+
+def session_bytes(profile_log, offset):
+    """Média, entre as sessões, da seleção guardada no session_state ao fim da última execução de cada uma."""
+    last = {}
+    with open(profile_log, encoding="utf-8") as f:
+        f.seek(offset)
+        for line in f:
+            record = json.loads(line)
+            if record.get("scope") == "script" and "session_bytes" in record:
+                last[record["session"]] = record["session_bytes"]
+    return float(np.mean(list(last.values()))) if last else None
+
+
+async def drive_sessions(url, n_sessions, n_actions, seed, timeout, pid, profile_log):
+    """Abre as sessões (cada uma com sua primeira execução) e só então roda os roteiros juntas.
+
+    Retorna também a posição no log de desempenho a partir da qual estão só as sessões medidas.
+    """
+    # Uma sessão de aquecimento carrega o Dashboard do cache_resource antes de medir a memória ociosa
+    warmup = BrowserSession(url, timeout)
+    await warmup.connect()
+    await warmup.rerun()
+    warmup.close()
+    await asyncio.sleep(1)
+    rss_idle, _ = server_memory(pid)
+    offset = os.path.getsize(profile_log) if os.path.exists(profile_log) else 0
+
+    sessions, opened = [BrowserSession(url, timeout) for _ in range(n_sessions)], []
+    for session in sessions:
+        await session.connect()
+    for seconds, _ in await asyncio.gather(*(session.rerun() for session in sessions)):
+        opened.append(seconds)
+
+    results = [{"latencies": [], "errors": 0} for _ in sessions]
+    traces = [interaction_trace(random.Random(seed * 1000 + i), n_actions) for i in range(n_sessions)]
+    await asyncio.gather(*(run_session(*args) for args in zip(sessions, traces, results)))
+    rss_end, rss_peak = server_memory(pid)
+    for session in sessions:
+        session.close()
+    return results, opened, rss_idle, rss_end, rss_peak, offset
+
+
+def run_level(n_sessions, n_actions, seed, timeout, profile_log):
+    """Roda n_sessions sessões simultâneas num servidor novo do stm.py e resume as métricas.
+
+    As memórias são do processo do servidor: ociosa (dataset carregado, sem sessões abertas),
+    ao fim das interações e o pico do nível; o crescimento por sessão é a diferença entre a
+    final e a ociosa dividida pelas sessões.
+    """
+    port = free_port()
+    server = start_server(port, profile_log, timeout)
+    try:
+        sessions, opened, rss_idle, rss_end, rss_peak, offset = asyncio.run(drive_sessions(
+            f"ws://127.0.0.1:{port}/_stcore/stream", n_sessions, n_actions, seed, timeout, server.pid, profile_log
+        ))
+    finally:
+        server.terminate()
+        server.wait()
+
+    wall = max(session["finished"] for session in sessions) - min(session["started"] for session in sessions)
+    latencies = [seconds for session in sessions for _, seconds in session["latencies"]]
+    by_kind = {}
+    for session in sessions:
+        for kind, seconds in session["latencies"]:
+            by_kind.setdefault(kind, []).append(seconds)
+    return {
+        "sessions": n_sessions,
+        "reruns": len(latencies),
+        "errors": sum(session["errors"] for session in sessions),
+        "wall_seconds": wall,
+        "throughput": len(latencies) / wall if wall else None,
+        "latency": percentiles(latencies),
+        "latency_by_action": {kind: percentiles(values) for kind, values in by_kind.items()},
+        "open": percentiles(opened),
+        "server_rss_bytes_idle": rss_idle,
+        "server_rss_bytes_end": rss_end,
+        "server_peak_rss_bytes": rss_peak,
+        "server_rss_bytes_per_session": (rss_end - rss_idle) / n_sessions if rss_idle is not None else None,
+        "session_bytes": session_bytes(profile_log, offset),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", nargs="+", type=int, default=[1, 2, 4, 8], help="níveis de concorrência")
+    parser.add_argument("--actions", type=int, default=20, help="interações por sessão")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=120, help="tempo máximo de uma reexecução (s)")
+    parser.add_argument("--profile-log", default=PROFILE_LOG_PATH,
+                        help="arquivo para os logs de desempenho do servidor (padrão: CREDIT_PROFILE_LOG; sem ele, um temporário)")
+    parser.add_argument("--output", help="arquivo JSON de saída (padrão: benchmark_results/loadtest-<data>.json)")
+    args = parser.parse_args()
+
+    # Gera o snapshot (e o banco SQLite) antes, para o primeiro servidor não o construir durante a medição
+    print("Preparando o dataset...", file=sys.stderr)
+    Dashboard(DATA_PATH, backend=DATA_BACKEND).close()
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "data_path": DATA_PATH,
+        "backend": DATA_BACKEND,
+        "actions": args.actions,
+        "levels": [],
+    }
+
+    with tempfile.TemporaryDirectory() as scratch:
+        profile_log = args.profile_log if args.profile_log and args.profile_log != "-" else os.path.join(scratch, "profile.jsonl")
+        print(f"\n{'sessões':>8} {'reexec.':>8} {'erros':>6} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10} "
+              f"{'reexec./s':>10} {'RSS ocioso (MB)':>16} {'RSS final (MB)':>15} {'pico (MB)':>10} "
+              f"{'MB/sessão':>10} {'sessão (KB)':>12}")
+        for n_sessions in args.sessions:
+            level = run_level(n_sessions, args.actions, args.seed, args.timeout, profile_log)
+            report["levels"].append(level)
+            latency = level["latency"]
+            print(f"{n_sessions:>8} {level['reruns']:>8} {level['errors']:>6} {latency['p50'] * 1000:>10.1f} "
+                  f"{latency['p95'] * 1000:>10.1f} {latency['p99'] * 1000:>10.1f} {level['throughput']:>10.1f} "
+                  f"{megabytes(level['server_rss_bytes_idle']):>16} {megabytes(level['server_rss_bytes_end']):>15} "
+                  f"{megabytes(level['server_peak_rss_bytes']):>10} {megabytes(level['server_rss_bytes_per_session']):>10} "
+                  f"{(level['session_bytes'] or 0) / 1024:>12.1f}")
+    print("\nMemória do processo do servidor (único para todas as sessões do nível); "
+          "o cliente dos testes roda à parte e divide a CPU com ele.")
+
+    output = args.output or os.path.join(RESULTS_DIR, "loadtest-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"\nResultados gravados em {output}")
+
+
+if __name__ == "__main__":
+    main()
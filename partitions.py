@@ -0,0 +1,337 @@
+"""Fonte de dados particionada: um diretório de CSVs com o mesmo esquema.
+
+Os arquivos ficam em subdiretórios no formato chave=valor, por risco e por período
+(os extratos mensais), por exemplo:
+
+    dados/risk=Good Risk/period=2024-01/part.csv
+
+Cada arquivo é uma partição com o seu próprio snapshot colunar (data.refresh_snapshot,
+que também ingere só as linhas acrescentadas). Um manifesto (.snapshot/manifest.json
+no diretório) guarda as estatísticas de cada partição: linhas, riscos presentes,
+categorias e mínimo/máximo de cada coluna numérica. Uma consulta descarta pelo
+manifesto as partições que não podem ter linhas dentro dos filtros, carrega as
+restantes em paralelo (índice e cubo de cada uma, só na primeira vez) e soma os
+Aggregates delas. Os cubos usam os mesmos eixos (categorias, idades e bordas dos
+histogramas do diretório inteiro), então o resultado é o mesmo do dataset num único
+arquivo.
+"""
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from aggregations import Aggregates, CreditCube, Crosstab, PairCube
+from data import SNAPSHOT_DIRNAME, load_snapshot, load_sorted_indexes, refresh_snapshot, snapshot_dir_for
+from filters import FilterIndex
+
+
+MANIFEST_FORMAT = 2
+
+# Partições ingeridas ou carregadas ao mesmo tempo
+PARTITION_WORKERS = int(os.environ.get("CREDIT_PARTITION_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+
+def manifest_path_for(directory):
+    return os.path.join(directory, SNAPSHOT_DIRNAME, "manifest.json")
+
+
+def find_partitions(directory):
+    """Caminhos relativos (ordenados) dos CSVs do diretório, ignorando diretórios ocultos (.snapshot)."""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        paths += [os.path.relpath(os.path.join(root, name), directory) for name in files if name.endswith(".csv")]
+    return sorted(paths)
+
+
+def partition_keys(path):
+    """Chaves dos diretórios de uma partição: {'risk': 'Good Risk', 'period': '2024-01'}."""
+    return dict(part.split("=", 1) for part in os.path.dirname(path).split(os.sep) if "=" in part)
+
+
+def partition_stats(csv_path):
+    """Atualiza o snapshot de uma partição e retorna a sua entrada no manifesto."""
+    meta = refresh_snapshot(csv_path)
+    df = load_snapshot(snapshot_dir_for(csv_path))
+    bounds = {}
+    for column in df.columns:
+        if len(df) and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            values = df[column].to_numpy()
+            bounds[column] = [np.nanmin(values).item(), np.nanmax(values).item()]
+    return {
+        "source": {"size": meta["source"]["size"], "mtime_ns": meta["source"]["mtime_ns"]},
+        "version": meta["version"],
+        "rows": meta["rows"],
+        "columns": df.columns.tolist(),
+        # Riscos na ordem em que aparecem, como as opções do multiselect
+        "risk": df["risk"].unique().tolist(),
+        "categories": {column["name"]: column["categories"] for column in meta["columns"] if column["kind"] == "category"},
+        "bounds": bounds,
+    }
+
+
+def update_manifest(directory, workers=PARTITION_WORKERS):
+    """Manifesto do diretório, atualizando (em paralelo) as entradas de partições novas ou alteradas."""
+    path = manifest_path_for(directory)
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = None
+    old = manifest["partitions"] if manifest and manifest.get("format") == MANIFEST_FORMAT else {}
+
+    paths = find_partitions(directory)
+    stale = []
+    for relative in paths:
+        stat = os.stat(os.path.join(directory, relative))
+        source = old.get(relative, {}).get("source")
+        if source != {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}:
+            stale.append(relative)
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="partition-stats") as executor:
+        updated = dict(zip(stale, executor.map(lambda relative: partition_stats(os.path.join(directory, relative)), stale)))
+
+    manifest = {"format": MANIFEST_FORMAT, "partitions": {relative: updated.get(relative) or old[relative] for relative in paths}}
+    if updated or set(old) != set(paths):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(path + ".tmp", path)
+    return manifest
+
+
+class Partition:
+    """Uma partição do diretório: a entrada do manifesto e, depois de carregada, o índice, o cubo
+    e as tabelas de contingência (PairCube)."""
+
+    def __init__(self, directory, path, entry):
+        self.path = path
+        self.csv_path = os.path.join(directory, path)
+        self.period = partition_keys(path).get("period")
+        self.entry = entry
+        self.df = self.filter_index = self.cube = self.pairs = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.cube is not None
+
+    def may_match(self, risk, age_range, credit_range, periods=None):
+        """Se a partição pode ter linhas dentro dos filtros, só pelas estatísticas do manifesto."""
+        bounds = self.entry["bounds"]
+        return (
+            self.entry["rows"] > 0
+            and (periods is None or self.period is None or self.period in periods)
+            and any(label in risk for label in self.entry["risk"])
+            and bounds["age_in_years"][0] <= age_range[1] and age_range[0] <= bounds["age_in_years"][1]
+            and bounds["credit_amount"][0] <= credit_range[1] and credit_range[0] <= bounds["credit_amount"][1]
+        )
+
+    def load(self, source):
+        """Mapeia o snapshot e monta o índice e o cubo com os eixos comuns de `source`."""
+        with self._lock:
+            if self.loaded:
+                return self
+            df = load_snapshot(snapshot_dir_for(self.csv_path))
+            # Mesmas categorias em todas as partições, para os Aggregates poderem ser somados
+            for column, labels in source.categories.items():
+                if df[column].cat.categories.tolist() != labels:
+                    df[column] = df[column].cat.set_categories(labels)
+            filter_index = FilterIndex(
+                df, range_columns=("age_in_years", "credit_amount"), bitmap_columns=("risk",),
+                presorted=load_sorted_indexes(df),
+            )
+            cube = CreditCube(df, filter_index, histogram_bins=source.bin_edges, age_bounds=source.age_bounds)
+            self.df, self.filter_index, self.pairs = df, filter_index, PairCube(cube)
+            self.cube = cube
+        return self
+
+    def select(self, risk, age_range, credit_range):
+        """Posições das linhas da partição dentro dos filtros."""
+        return self.filter_index.select(
+            categories={'risk': list(risk)}, ranges={'age_in_years': age_range, 'credit_amount': credit_range}
+        )
+
+
+class PartitionedSource:
+    """Responde os filtros e agregações do dashboard a partir de um diretório particionado.
+
+    Tem a mesma interface do SQLiteBackend (summary, query, crosstab, scatter_points,
+    scatter_cells), com o filtro opcional de períodos. previous é a fonte anterior do
+    mesmo diretório: as partições já carregadas e não alteradas são reaproveitadas.
+    """
+
+    def __init__(self, directory, histogram_bins=None, scatter=("credit_amount", "duration_in_month", 40, 30),
+                 workers=PARTITION_WORKERS, previous=None):
+        self.directory = directory
+        manifest = update_manifest(directory, workers)
+        self.partitions = [Partition(directory, path, entry) for path, entry in manifest["partitions"].items()]
+        if not self.partitions:
+            raise FileNotFoundError(f"Nenhum CSV encontrado em {directory}")
+        entries = [partition.entry for partition in self.partitions]
+        self.columns = entries[0]["columns"]
+
+        # Eixos comuns: categorias (em ordem alfabética) e limites de todo o diretório
+        self.categories = {}
+        for entry in entries:
+            for column, labels in entry["categories"].items():
+                self.categories.setdefault(column, set()).update(labels)
+        self.categories = {column: sorted(labels, key=str) for column, labels in self.categories.items()}
+        self.risk_labels = self.categories["risk"]
+        bounds = {}
+        for entry in entries:
+            for column, (low, high) in entry["bounds"].items():
+                current = bounds.setdefault(column, [low, high])
+                current[0], current[1] = min(current[0], low), max(current[1], high)
+        self.bounds = bounds
+        self.age_bounds = tuple(bounds["age_in_years"])
+        self.age_values = np.arange(self.age_bounds[0], self.age_bounds[1] + 1)
+        # As bordas dependem só do mínimo e do máximo, como no np.histogram_bin_edges do dataset inteiro
+        self.bin_edges = {
+            column: np.histogram_bin_edges(np.asarray(bounds[column]), bins=n_bins)
+            for column, n_bins in (histogram_bins or {}).items()
+        }
+        x, y, x_bins, y_bins = scatter
+        self.scatter_columns = (x, y)
+        self.x_edges = np.histogram_bin_edges(np.asarray(bounds[x]), bins=x_bins)
+        self.y_edges = np.histogram_bin_edges(np.asarray(bounds[y]), bins=y_bins)
+
+        self.version = hashlib.sha1(
+            json.dumps([[partition.path, partition.entry["version"]] for partition in self.partitions]).encode()
+        ).hexdigest()[:12]
+
+        if previous is not None and self._same_axes(previous):
+            loaded = {partition.path: partition for partition in previous.partitions if partition.loaded}
+            for i, partition in enumerate(self.partitions):
+                old = loaded.get(partition.path)
+                if old is not None and old.entry["version"] == partition.entry["version"]:
+                    self.partitions[i] = old
+        self._executor = previous._executor if previous is not None else ThreadPoolExecutor(
+            max_workers=max(workers, 1), thread_name_prefix="partition"
+        )
+
+    def _same_axes(self, other):
+        return (
+            self.categories == other.categories
+            and self.age_bounds == other.age_bounds
+            and self.bin_edges.keys() == other.bin_edges.keys()
+            and all(np.array_equal(edges, other.bin_edges[column]) for column, edges in self.bin_edges.items())
+        )
+
+    def summary(self):
+        """Opções e limites dos filtros da sidebar (periods só se as partições tiverem período)."""
+        risk_options = []
+        for partition in self.partitions:
+            risk_options += [label for label in partition.entry["risk"] if label not in risk_options]
+        summary = {
+            "rows": sum(partition.entry["rows"] for partition in self.partitions),
+            "version": self.version,
+            "risk_options": risk_options,
+            "age_bounds": self.age_bounds,
+            "credit_bounds": tuple(self.bounds["credit_amount"]),
+        }
+        periods = sorted({partition.period for partition in self.partitions if partition.period is not None})
+        if periods:
+            summary["periods"] = periods
+        return summary
+
+    def prune(self, risk, age_range, credit_range, periods=None):
+        """Partições que podem ter linhas dentro dos filtros (sem ler nenhuma linha)."""
+        return [
+            partition for partition in self.partitions
+            if partition.may_match(risk, age_range, credit_range, periods)
+        ]
+
+    def load(self, partitions):
+        """Carrega em paralelo as partições que ainda não estão em memória."""
+        pending = [partition for partition in partitions if not partition.loaded]
+        list(self._executor.map(lambda partition: partition.load(self), pending))
+        return partitions
+
+    def loaded(self):
+        return [partition for partition in self.partitions if partition.loaded]
+
+    def query(self, risk, age_range, credit_range, periods=None):
+        """Agrega as linhas dentro dos filtros, somando os cubos das partições que restam."""
+        result = None
+        for partition in self.load(self.prune(risk, age_range, credit_range, periods)):
+            aggregates = partition.cube.query(risk=risk, age_range=age_range, credit_range=credit_range)
+            result = aggregates if result is None else result + aggregates
+        return result if result is not None else self._empty()
+
+    @property
+    def crosstab_columns(self):
+        """Colunas categóricas que podem ser cruzadas em crosstab (risco primeiro)."""
+        return ['risk'] + [column for column in self.categories if column != 'risk']
+
+    def crosstab(self, rows, columns, risk, age_range, credit_range, periods=None):
+        """Crosstab de `rows` x `columns` das linhas dentro dos filtros, somando as das partições que restam."""
+        result = Crosstab(
+            rows, self.categories[rows], columns, self.categories[columns],
+            np.zeros((len(self.categories[rows]), len(self.categories[columns])), dtype=np.int64),
+        )
+        for partition in self.load(self.prune(risk, age_range, credit_range, periods)):
+            result = result + partition.pairs.query(rows, columns, risk, age_range, credit_range)
+        return result
+
+    def _empty(self):
+        """Aggregates zerados com os eixos comuns (nenhuma partição dentro dos filtros)."""
+        n_risk = len(self.risk_labels)
+        dimensions = {'age_in_years': (self.age_values.tolist(), np.zeros((len(self.age_values), n_risk), dtype=np.int64))}
+        dimensions.update({
+            column: (labels, np.zeros((len(labels), n_risk), dtype=np.int64))
+            for column, labels in self.categories.items() if column != 'risk'
+        })
+        dimensions.update({
+            f'{column}_bins': (edges[:-1].tolist(), np.zeros((len(edges) - 1, n_risk), dtype=np.int64))
+            for column, edges in self.bin_edges.items()
+        })
+        return Aggregates(
+            self.risk_labels, np.zeros(n_risk, dtype=np.int64),
+            {'age_in_years': np.zeros(n_risk, dtype=np.int64), 'credit_amount': np.zeros(n_risk)},
+            dimensions, self.bin_edges,
+        )
+
+    def _selected(self, risk, age_range, credit_range, periods):
+        for partition in self.load(self.prune(risk, age_range, credit_range, periods)):
+            yield partition, partition.select(risk, age_range, credit_range)
+
+    def scatter_points(self, risk, age_range, credit_range, periods=None):
+        """Pontos da dispersão (x, y e risco) das linhas dentro dos filtros, partição por partição."""
+        x, y = self.scatter_columns
+        parts = [
+            pd.DataFrame({
+                x: partition.df[x].to_numpy()[rows],
+                y: partition.df[y].to_numpy()[rows],
+                "risk": np.asarray(self.risk_labels, dtype=object)[partition.df["risk"].cat.codes.to_numpy()[rows]],
+            })
+            for partition, rows in self._selected(risk, age_range, credit_range, periods)
+        ]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame({x: [], y: [], "risk": []})
+
+    def scatter_cells(self, risk, age_range, credit_range, periods=None):
+        """Células não vazias da grade da dispersão, no formato de DensityGrid.cells_frame."""
+        x, y = self.scatter_columns
+        shape = (len(self.risk_labels), len(self.x_edges) - 1, len(self.y_edges) - 1)
+        counts = np.zeros(int(np.prod(shape)), dtype=np.int64)
+        for partition, rows in self._selected(risk, age_range, credit_range, periods):
+            x_codes = np.clip(np.searchsorted(self.x_edges, partition.df[x].to_numpy()[rows], side='right') - 1, 0, shape[1] - 1)
+            y_codes = np.clip(np.searchsorted(self.y_edges, partition.df[y].to_numpy()[rows], side='right') - 1, 0, shape[2] - 1)
+            risk_codes = partition.df["risk"].cat.codes.to_numpy()[rows]
+            counts += np.bincount(np.ravel_multi_index((risk_codes, x_codes, y_codes), shape), minlength=counts.size)
+        counts = counts.reshape(shape)
+        risk_idx, x_idx, y_idx = np.nonzero(counts)
+        x_centers = (self.x_edges[:-1] + self.x_edges[1:]) / 2
+        y_centers = (self.y_edges[:-1] + self.y_edges[1:]) / 2
+        return pd.DataFrame({
+            "risk": np.asarray(self.risk_labels, dtype=object)[risk_idx],
+            "x": x_centers[x_idx],
+            "y": y_centers[y_idx],
+            "count": counts[risk_idx, x_idx, y_idx],
+        })
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,119 @@
+import cProfile
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+# Destino dos logs JSON de desempenho: um arquivo, ou "-" para o stderr; sem a variável
+# as execuções não são registradas
+PROFILE_LOG_PATH = os.environ.get("CREDIT_PROFILE_LOG")
+
+logger = logging.getLogger("credit_dashboard.profiling")
+
+
+def configure_logging(path=PROFILE_LOG_PATH):
+    """Direciona o logger de desempenho (uma linha JSON por execução) para path ("-" = stderr).
+
+    Sem path o logger fica desligado.
+    """
+    if logger.handlers:
+        return logger
+    if not path:
+        handler, level = logging.NullHandler(), logging.WARNING
+    else:
+        handler = logging.StreamHandler() if path == "-" else logging.FileHandler(path, encoding="utf-8")
+        level = logging.INFO
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+
+class RerunProfiler:
+    """Cronometra as etapas de uma execução do script (ou de um fragmento).
+
+    Cada etapa é registrada com um tipo: "compute" para o cálculo, "serialize"
+    para a conversão da figura em JSON e "render" para o envio ao navegador.
+    Com cprofile=True a execução inteira também é capturada pelo cProfile.
+    """
+
+    def __init__(self, scope="script", cprofile=False):
+        self.scope = scope
+        self.started_at = datetime.now(timezone.utc)
+        self.stages = []
+        self.total_seconds = None
+        self.cprofile_error = None
+        self._start = time.perf_counter()
+        self._profile = None
+        if cprofile:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                self._profile = profile
+            except ValueError as error:
+                # Só um profiler pode estar ativo por vez (ex.: outra sessão perfilando)
+                self.cprofile_error = str(error)
+
+    @property
+    def finished(self):
+        return self.total_seconds is not None
+
+    @contextmanager
+    def stage(self, name, kind="compute"):
+        """Registra o tempo gasto dentro do bloco como a etapa `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append({"stage": name, "kind": kind, "seconds": time.perf_counter() - start})
+
+    def finish(self):
+        """Encerra a medição (e o cProfile, se ativo) e retorna o relatório."""
+        if not self.finished:
+            self.total_seconds = time.perf_counter() - self._start
+            if self._profile is not None:
+                self._profile.disable()
+        return self.report()
+
+    def totals_by_kind(self):
+        totals = {}
+        for record in self.stages:
+            totals[record["kind"]] = totals.get(record["kind"], 0.0) + record["seconds"]
+        return totals
+
+    def report(self):
+        return {
+            "event": "rerun_profile",
+            "scope": self.scope,
+            "started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "total_seconds": self.total_seconds,
+            "by_kind": self.totals_by_kind(),
+            "stages": self.stages,
+        }
+
+    def log(self, **context):
+        """Grava o relatório como uma linha JSON, acrescido dos campos de contexto (se os logs estiverem ligados)."""
+        if configure_logging().isEnabledFor(logging.INFO):
+            logger.info(json.dumps({**self.report(), **context}, ensure_ascii=False, default=str))
+
+    @property
+    def has_cprofile(self):
+        return self._profile is not None
+
+    def cprofile_text(self, limit=40, sort="cumulative"):
+        """Funções mais custosas da execução perfilada, no formato do pstats."""
+        stream = io.StringIO()
+        pstats.Stats(self._profile, stream=stream).strip_dirs().sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def cprofile_dump(self):
+        """Estatísticas no formato binário do pstats (o mesmo de Profile.dump_stats)."""
+        self._profile.create_stats()
+        return marshal.dumps(self._profile.stats)
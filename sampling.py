@@ -0,0 +1,230 @@
+"""Estimativas aproximadas dos filtros a partir de uma amostra estratificada do dataset.
+
+A amostra é sorteada uma vez por estrato (risco x faixa etária), com alocação
+proporcional, e guardada como uma sequência de níveis encaixados: cada nível é
+`growth` vezes maior que o anterior e contém o anterior. Uma consulta num nível
+agrega só as linhas amostradas dentro dos filtros, com o peso do seu estrato, e
+devolve os mesmos Aggregates do cubo (contagens arredondadas) e os intervalos de
+confiança de 95% das métricas principais, pela variância do estimador
+estratificado (linearizada para as razões).
+"""
+import time
+
+import numpy as np
+
+from aggregations import Aggregates
+
+
+# Quantil da normal para intervalos de 95%
+Z_95 = 1.959963984540054
+
+
+class Estimate:
+    """Aggregates de um conjunto de filtros, exatos ou estimados por um nível da amostra.
+
+    intervals: {métrica: (valor, mínimo, máximo)} para total, good_risk_pct, bad_risk_pct,
+    avg_age e avg_credit (vazio quando exato). level é o nível da amostra (None se exato)
+    e sample_rows o número de linhas amostradas; seconds é o tempo gasto na consulta e
+    deadline o fim do orçamento de tempo para refiná-la (time.perf_counter()).
+    """
+
+    def __init__(self, version, filters, aggregates, intervals=None, level=None, sample_rows=0, deadline=None,
+                 seconds=0.0):
+        self.version = version
+        self.filters = filters
+        self.aggregates = aggregates
+        self.intervals = intervals or {}
+        self.level = level
+        self.sample_rows = sample_rows
+        self.deadline = deadline
+        self.seconds = seconds
+
+    @property
+    def exact(self):
+        return self.level is None
+
+    def margin(self, metric):
+        """Semi-amplitude do intervalo de `metric` (0 se exato ou indisponível)."""
+        if metric not in self.intervals:
+            return 0.0
+        _, low, high = self.intervals[metric]
+        return (high - low) / 2
+
+    def within(self, max_error):
+        """Se todos os intervalos cabem no erro máximo.
+
+        Para total e médias o erro é relativo ao valor; para as proporções (em %)
+        é absoluto, em fração: max_error=0.01 aceita ±1 ponto percentual. Uma estimativa
+        sem nenhuma linha amostrada dentro dos filtros não tem intervalos e nunca cabe.
+        """
+        if not self.exact and not self.intervals:
+            return False
+        for metric, (value, low, high) in self.intervals.items():
+            half_width = (high - low) / 2
+            if metric.endswith('_pct'):
+                if half_width > max_error * 100:
+                    return False
+            elif not np.isfinite(half_width) or half_width > max_error * abs(value):
+                return False
+        return True
+
+
+class StratifiedSample:
+    """Amostra estratificada em níveis encaixados, consultada pelos mesmos filtros do cubo.
+
+    first_rows é o tamanho do primeiro nível; os níveis crescem `growth` vezes enquanto
+    continuam ao menos `growth` vezes menores que o dataset (acima disso a consulta
+    exata ao cubo sai mais barata).
+    """
+
+    def __init__(self, df, cube, first_rows=50_000, growth=4, strata_columns=('risk', 'age_band'), seed=0):
+        self.cube = cube
+        n_rows = len(df)
+        strata = np.zeros(n_rows, dtype=np.int64)
+        for column in strata_columns:
+            codes = df[column].cat.codes.to_numpy()
+            strata = strata * len(df[column].cat.categories) + codes
+        _, strata = np.unique(strata, return_inverse=True)
+        self.stratum_sizes = np.bincount(strata)
+
+        self.levels = []
+        size = first_rows
+        while size * growth <= n_rows:
+            self.levels.append(size)
+            size *= growth
+
+        # Linhas de cada estrato em ordem aleatória; cada nível usa um prefixo de cada uma
+        rng = np.random.default_rng(seed)
+        shuffled = rng.permutation(n_rows)
+        by_stratum = shuffled[np.argsort(strata[shuffled], kind='stable')]
+        starts = np.concatenate([[0], np.cumsum(self.stratum_sizes)])
+        largest = self._allocation(self.levels[-1]) if self.levels else np.zeros_like(self.stratum_sizes)
+        # Cópias: fatias manteriam viva a permutação inteira (uma posição por linha do dataset)
+        self.stratum_rows = [by_stratum[start:start + n].copy() for start, n in zip(starts[:-1], largest)]
+
+        self.ages = df['age_in_years'].to_numpy()
+        self.credit = df['credit_amount'].to_numpy()
+
+    def _allocation(self, size):
+        """Linhas de cada estrato num nível de `size` linhas (proporcional, ao menos 2 por estrato)."""
+        total = self.stratum_sizes.sum()
+        wanted = np.ceil(size * self.stratum_sizes / total).astype(np.int64)
+        return np.minimum(np.maximum(wanted, 2), self.stratum_sizes)
+
+    def query(self, level, risk, age_range, credit_range):
+        """Aggregates estimados e intervalos de 95% das linhas dentro dos filtros, no nível `level`."""
+        risk_labels = self.cube.risk_labels
+        risk_mask = np.isin(risk_labels, list(risk))
+        bad_code = risk_labels.index('Bad Risk') if 'Bad Risk' in risk_labels else -1
+        age_low, age_high = age_range
+        credit_low, credit_high = credit_range
+
+        allocation = self._allocation(self.levels[level])
+        parts, columns = [], {name: [] for name in ('stratum', 'keep', 'bad', 'age', 'credit')}
+        for stratum, (rows, n) in enumerate(zip(self.stratum_rows, allocation)):
+            rows = rows[:n]
+            ages, credit = self.ages[rows], self.credit[rows]
+            keep = (
+                risk_mask[self.cube.risk_codes[rows]]
+                & (ages >= age_low) & (ages <= age_high)
+                & (credit >= credit_low) & (credit <= credit_high)
+            )
+            weight = self.stratum_sizes[stratum] / n
+            if keep.any():
+                parts.append((weight, self.cube.aggregate_rows(rows[keep])))
+            columns['stratum'].append(np.full(n, stratum))
+            columns['keep'].append(keep)
+            columns['bad'].append(self.cube.risk_codes[rows] == bad_code)
+            columns['age'].append(ages.astype(float))
+            columns['credit'].append(credit.astype(float))
+
+        aggregates = _weighted_sum(parts, self.cube)
+        data = {name: np.concatenate(values) for name, values in columns.items()}
+        intervals = self._intervals(data, allocation) if data['keep'].any() else {}
+        return aggregates, intervals, int(allocation.sum())
+
+    def rows(self, level, risk, age_range, credit_range):
+        """Posições (ordenadas) das linhas amostradas no nível `level` que estão dentro dos filtros."""
+        allocation = self._allocation(self.levels[level])
+        rows = np.concatenate([rows[:n] for rows, n in zip(self.stratum_rows, allocation)])
+        ages, credit = self.ages[rows], self.credit[rows]
+        keep = (
+            np.isin(self.cube.risk_labels, list(risk))[self.cube.risk_codes[rows]]
+            & (ages >= age_range[0]) & (ages <= age_range[1])
+            & (credit >= credit_range[0]) & (credit <= credit_range[1])
+        )
+        return np.sort(rows[keep])
+
+    def _intervals(self, data, allocation):
+        strata, keep = data['stratum'], data['keep'].astype(float)
+        sizes = self.stratum_sizes.astype(float)
+        n = allocation.astype(float)
+        weights = (sizes / n)[strata]
+
+        def variance(values):
+            """Variância do total estimado de `values` (estratificada, com correção de população finita)."""
+            sums = np.bincount(strata, weights=values, minlength=len(n))
+            squares = np.bincount(strata, weights=values * values, minlength=len(n))
+            within = (squares - sums * sums / n) / np.maximum(n - 1, 1)
+            return float(np.sum(sizes * sizes * (1 - n / sizes) * np.maximum(within, 0) / n))
+
+        def ratio(numerator):
+            """Razão Σw·y / Σw·d (média ou proporção no domínio) e seu intervalo linearizado."""
+            total = np.sum(weights * keep)
+            value = np.sum(weights * numerator) / total
+            half_width = Z_95 * np.sqrt(variance((numerator - value * keep) / total))
+            return float(value), float(value - half_width), float(value + half_width)
+
+        total = float(np.sum(weights * keep))
+        total_half = float(Z_95 * np.sqrt(variance(keep)))
+        bad = ratio(data['bad'] * keep)
+        return {
+            'total': (total, total - total_half, total + total_half),
+            'bad_risk_pct': tuple(100 * v for v in bad),
+            'good_risk_pct': (100 * (1 - bad[0]), 100 * (1 - bad[2]), 100 * (1 - bad[1])),
+            'avg_age': ratio(data['age'] * keep),
+            'avg_credit': ratio(data['credit'] * keep),
+        }
+
+
+def _weighted_sum(parts, cube):
+    """Soma ponderada de Aggregates por estrato, com as contagens arredondadas para inteiros."""
+    n_risk = len(cube.risk_labels)
+    if not parts:
+        return cube.aggregate_rows(np.empty(0, dtype=np.int64))
+    counts = sum(weight * agg.counts for weight, agg in parts)
+    sums = {measure: sum(weight * agg.sums[measure] for weight, agg in parts) for measure in parts[0][1].sums}
+    dimensions = {
+        name: (labels, np.rint(sum(weight * agg.dimensions[name][1] for weight, agg in parts)).astype(np.int64))
+        for name, (labels, _) in parts[0][1].dimensions.items()
+    }
+    return Aggregates(
+        cube.risk_labels, np.rint(counts).astype(np.int64).reshape(n_risk), sums, dimensions, cube.bin_edges
+    )
+
+
+def refine(estimate, sample, exact, max_error):
+    """Refina `estimate` pelos níveis seguintes da amostra e, por fim, pela consulta exata.
+
+    Para quando os intervalos cabem em max_error ou quando o próximo passo não caberia
+    no tempo restante até estimate.deadline. O custo de cada passo é previsto pelo
+    anterior, proporcional ao número de linhas (para a consulta exata ao cubo a
+    previsão é pessimista). exact() devolve os Aggregates exatos.
+    """
+    n_rows = int(sample.stratum_sizes.sum())
+    while not estimate.exact and not estimate.within(max_error):
+        seconds_per_row = estimate.seconds / max(estimate.sample_rows, 1)
+        next_level = estimate.level + 1 if estimate.level + 1 < len(sample.levels) else None
+        next_rows = n_rows if next_level is None else sample.levels[next_level]
+        if estimate.deadline is not None and time.perf_counter() + seconds_per_row * next_rows > estimate.deadline:
+            break
+        start = time.perf_counter()
+        if next_level is None:
+            aggregates, intervals, rows = exact(), None, 0
+        else:
+            aggregates, intervals, rows = sample.query(next_level, *estimate.filters)
+        estimate = Estimate(
+            estimate.version, estimate.filters, aggregates, intervals, next_level, rows, estimate.deadline,
+            seconds=time.perf_counter() - start,
+        )
+    return estimate
@@ -0,0 +1,113 @@
+import numpy as np
+
+
+RANGE_COLUMNS = ("age_in_years", "credit_amount")
+
+
+def _bit_masks(rows):
+    """Máscara de cada linha dentro do seu byte, na ordem de bits do np.packbits."""
+    return np.uint8(128) >> (rows & 7).astype(np.uint8)
+
+
+class IncrementalSelection:
+    """Seleção dos filtros da sidebar mantida por sessão e atualizada por diferenças.
+
+    Quando só um dos intervalos muda (arrastar um slider), apenas as linhas das
+    faixas que entraram ou saíram do intervalo são localizadas pelo índice ordenado,
+    e as contagens e somas são ajustadas por essa diferença. Mudanças de risco,
+    intervalos disjuntos ou faixas com mais de max_delta_rows linhas recalculam a
+    seleção pelo cubo, que nesses casos sai mais barato.
+
+    A sessão guarda apenas um bitmap compactado (um bit por linha do dataset) e os
+    Aggregates; o dataset, os índices e o cubo são os mesmos para todas as sessões.
+    As posições das linhas só são geradas quando `rows` é lido e não ficam guardadas.
+    """
+
+    def __init__(self, filter_index, cube, max_delta_rows=None):
+        self.filter_index = filter_index
+        self.cube = cube
+        # A consulta ao cubo varre no máximo duas faixas de crédito (~2/32 das linhas)
+        self.max_delta_rows = max_delta_rows if max_delta_rows is not None else max(filter_index.n_rows // 16, 1)
+        self.risk = None
+        self.ranges = None
+        self.aggregates = None
+        self.bitmap = None
+        self.last_update = None
+
+    def update(self, risk, age_range, credit_range):
+        """Aplica os filtros atuais e retorna os Aggregates da seleção."""
+        risk = frozenset(risk)
+        ranges = {
+            "age_in_years": (int(age_range[0]), int(age_range[1])),
+            "credit_amount": (int(credit_range[0]), int(credit_range[1])),
+        }
+        if risk == self.risk and ranges == self.ranges:
+            self.last_update = "unchanged"
+        elif self._apply_delta(risk, ranges):
+            self.last_update = "delta"
+        else:
+            self._recompute(risk, ranges)
+            self.last_update = "full"
+        self.risk, self.ranges = risk, ranges
+        return self.aggregates
+
+    @property
+    def rows(self):
+        """Posições (ordenadas) das linhas selecionadas."""
+        mask = np.unpackbits(self.bitmap, count=self.filter_index.n_rows)
+        return np.flatnonzero(mask).astype(self.filter_index.row_dtype)
+
+    @property
+    def nbytes(self):
+        """Memória própria da sessão: o bitmap da seleção e os Aggregates."""
+        return (self.bitmap.nbytes if self.bitmap is not None else 0) + (
+            self.aggregates.nbytes if self.aggregates is not None else 0
+        )
+
+    def _recompute(self, risk, ranges):
+        if risk:
+            rows = self.filter_index.select(categories={"risk": list(risk)}, ranges=ranges)
+        else:
+            rows = np.empty(0, dtype=self.filter_index.row_dtype)
+        self.aggregates = self.cube.query(
+            risk=list(risk), age_range=ranges["age_in_years"], credit_range=ranges["credit_amount"]
+        )
+        mask = np.zeros(self.filter_index.n_rows, dtype=bool)
+        mask[rows] = True
+        self.bitmap = np.packbits(mask)
+
+    def _apply_delta(self, risk, ranges):
+        """Ajusta a seleção anterior pelas faixas que entraram e saíram; False se não for possível."""
+        if self.ranges is None or risk != self.risk or not risk:
+            return False
+        changed = [column for column in RANGE_COLUMNS if ranges[column] != self.ranges[column]]
+        if len(changed) != 1:
+            return False
+        column = changed[0]
+        (old_low, old_high), (low, high) = self.ranges[column], ranges[column]
+        if low > old_high or high < old_low:
+            return False
+
+        added = [(low, old_low - 1)] * (low < old_low) + [(old_high + 1, high)] * (high > old_high)
+        removed = [(old_low, low - 1)] * (low > old_low) + [(high + 1, old_high)] * (high < old_high)
+        band_rows = sum(
+            stop - start for start, stop in (self.filter_index.range_bounds(column, *band) for band in added + removed)
+        )
+        if band_rows > self.max_delta_rows:
+            return False
+
+        added_rows = self._band_rows(risk, ranges, column, added)
+        removed_rows = self._band_rows(risk, ranges, column, removed)
+        self.aggregates = self.aggregates + self.cube.aggregate_rows(added_rows) - self.cube.aggregate_rows(removed_rows)
+
+        np.bitwise_or.at(self.bitmap, added_rows >> 3, _bit_masks(added_rows))
+        np.bitwise_and.at(self.bitmap, removed_rows >> 3, ~_bit_masks(removed_rows))
+        return True
+
+    def _band_rows(self, risk, ranges, column, bands):
+        """Linhas com `column` dentro de alguma das faixas e que atendem aos demais filtros."""
+        parts = [
+            self.filter_index.select(categories={"risk": list(risk)}, ranges={**ranges, column: band})
+            for band in bands
+        ]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=self.filter_index.row_dtype)
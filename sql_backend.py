@@ -0,0 +1,389 @@
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from aggregations import Aggregates, CreditCube, Crosstab
+from data import load_dataset, load_sorted_indexes, snapshot_dir_for
+from filters import FilterIndex
+
+
+TABLE = "credit"
+DATABASE_FORMAT = 1
+
+# Colunas com índice no banco: o filtro de risco e os dois intervalos da sidebar
+INDEXED_COLUMNS = ("risk", "age_in_years", "credit_amount")
+
+
+def database_path_for(csv_path):
+    """Arquivo SQLite associado a um CSV, ao lado do snapshot colunar."""
+    return snapshot_dir_for(csv_path) + ".sqlite"
+
+
+def build_database(csv_path, db_path=None, credit_buckets=128, histogram_bins=None, chunk_rows=1 << 18):
+    """Grava o dataset num banco SQLite, com as categorias como códigos inteiros.
+
+    Além da tabela de linhas, o banco guarda o cubo risco x idade x faixa de crédito
+    como somas acumuladas (tabela prefix): cada linha (idade, faixa) contém, num BLOB,
+    as contagens de todas as dimensões até aquela idade e faixa. Os dados vêm do
+    snapshot colunar, bloco a bloco; o banco é trocado de uma vez no final.
+    """
+    db_path = db_path or database_path_for(csv_path)
+    df = load_dataset(csv_path)
+    categorical = df.select_dtypes("category").columns
+    filter_index = FilterIndex(
+        df, range_columns=("credit_amount",), bitmap_columns=(), presorted=load_sorted_indexes(df)
+    )
+    cube = CreditCube(df, filter_index, credit_buckets=credit_buckets, histogram_bins=histogram_bins)
+
+    # Idade entra como mais uma dimensão (rótulos = idades) para sair das mesmas somas
+    n_risk, n_ages, n_buckets = cube.shape
+    age_counts = np.zeros((n_ages, n_risk, n_ages, n_buckets))
+    age_counts[np.arange(n_ages), :, np.arange(n_ages), :] = cube.counts.transpose(1, 0, 2)
+    blocks = [age_counts] + [cube.dimension_counts[column] for column in cube.dimension_codes]
+    layout = [["age_in_years", cube.age_values.tolist()]] + [
+        [column, labels] for column, (labels, _) in cube.dimension_codes.items()
+    ]
+    cells = np.concatenate([block.reshape(-1, n_ages, n_buckets) for block in blocks] + [cube.credit_sums])
+    prefix = cells.cumsum(axis=1).cumsum(axis=2)
+
+    meta = {
+        "format": DATABASE_FORMAT,
+        "version": df.attrs["version"],
+        "rows": len(df),
+        "categories": {column: df[column].cat.categories.tolist() for column in categorical},
+        # Ordem de aparição dos riscos, a mesma do multiselect com o DataFrame em memória
+        "risk_options": df["risk"].unique().tolist(),
+        "bounds": {
+            column: [df[column].min().item(), df[column].max().item()]
+            for column in df.columns if column not in categorical
+        },
+        "credit_buckets": credit_buckets,
+        "histogram_bins": histogram_bins or {},
+        "bin_edges": {column: edges.tolist() for column, edges in cube.bin_edges.items()},
+        "bucket_min": cube.bucket_min.tolist(),
+        "bucket_max": cube.bucket_max.tolist(),
+        "layout": layout,
+    }
+
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    try:
+        definitions = ", ".join(
+            f'"{column}" INTEGER' if column in categorical or pd.api.types.is_integer_dtype(df[column])
+            else f'"{column}" REAL'
+            for column in df.columns
+        )
+        connection.execute(f"CREATE TABLE {TABLE} ({definitions})")
+        insert = f"INSERT INTO {TABLE} VALUES ({', '.join('?' * len(df.columns))})"
+        for start in range(0, len(df), chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows]
+            columns = [
+                chunk[column].cat.codes.to_numpy().tolist() if column in categorical else chunk[column].to_numpy().tolist()
+                for column in df.columns
+            ]
+            connection.executemany(insert, zip(*columns))
+        for column in INDEXED_COLUMNS:
+            connection.execute(f'CREATE INDEX idx_{column} ON {TABLE} ("{column}")')
+
+        connection.execute("CREATE TABLE prefix (age_idx INTEGER, bucket INTEGER, vector BLOB, PRIMARY KEY (age_idx, bucket))")
+        connection.executemany(
+            "INSERT INTO prefix VALUES (?, ?, ?)",
+            ((a, b, prefix[:, a, b].tobytes()) for a in range(n_ages) for b in range(n_buckets)),
+        )
+        connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        connection.executemany("INSERT INTO meta VALUES (?, ?)", [(key, json.dumps(value)) for key, value in meta.items()])
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(tmp_path, db_path)
+    return meta
+
+
+def read_database_meta(db_path):
+    """Lê a tabela meta do banco, ou None se ele não existir."""
+    if not os.path.exists(db_path):
+        return None
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return {key: json.loads(value) for key, value in connection.execute("SELECT key, value FROM meta")}
+    except sqlite3.DatabaseError:
+        return None
+    finally:
+        connection.close()
+
+
+def _bin_case(column, edges):
+    """Expressão SQL com o código da faixa de `column` (mesma regra do searchsorted do cubo)."""
+    whens = " ".join(f'WHEN "{column}" < {float(edge)!r} THEN {i}' for i, edge in enumerate(edges[1:-1]))
+    return f"CASE {whens} ELSE {len(edges) - 2} END"
+
+
+class SQLiteBackend:
+    """Responde os filtros e agregações do dashboard com consultas ao SQLite.
+
+    O retângulo idade x faixas de crédito inteiras sai de quatro linhas da tabela
+    prefix (somas acumuladas); as no máximo duas faixas cortadas pelo slider de
+    crédito são completadas com GROUP BY sobre as linhas delas, pelo índice de
+    credit_amount. Cada consulta devolve só resultados pequenos, então o processo
+    não precisa carregar o dataset em memória. Conexões somente leitura, uma por thread.
+    """
+
+    def __init__(self, db_path, scatter=("credit_amount", "duration_in_month", 40, 30)):
+        self.db_path = db_path
+        self.meta = read_database_meta(db_path)
+        if self.meta is None:
+            raise FileNotFoundError(f"Banco não encontrado em {db_path}")
+        self.version = self.meta["version"]
+        self.risk_labels = self.meta["categories"]["risk"]
+        self.bin_edges = {column: np.asarray(edges) for column, edges in self.meta["bin_edges"].items()}
+        self.bucket_min = np.asarray(self.meta["bucket_min"])
+        self.bucket_max = np.asarray(self.meta["bucket_max"])
+
+        # Posição de cada dimensão no vetor da tabela prefix: {nome: (rótulos, início, expressão SQL)}
+        n_risk = len(self.risk_labels)
+        self.layout = {}
+        offset = 0
+        for name, labels in self.meta["layout"]:
+            if name.endswith("_bins") and name[:-5] in self.bin_edges:
+                expression = _bin_case(name[:-5], self.bin_edges[name[:-5]])
+            else:
+                expression = f'"{name}"'
+            self.layout[name] = (labels, offset, expression)
+            offset += len(labels) * n_risk
+        self.credit_offset = offset
+        self.vector_size = offset + n_risk
+        self.age_values = np.asarray(self.layout["age_in_years"][0])
+
+        x, y, x_bins, y_bins = scatter
+        self.scatter_columns = (x, y)
+        self.x_edges = np.histogram_bin_edges(self.meta["bounds"][x], bins=x_bins)
+        self.y_edges = np.histogram_bin_edges(self.meta["bounds"][y], bins=y_bins)
+        self._local = threading.local()
+
+    @classmethod
+    def for_csv(cls, csv_path, credit_buckets=128, histogram_bins=None, **kwargs):
+        """Abre o banco do CSV, (re)construindo-o se o dataset ou a configuração do cubo mudarem."""
+        db_path = database_path_for(csv_path)
+        meta = read_database_meta(db_path)
+        if (
+            meta is None
+            or meta.get("format") != DATABASE_FORMAT
+            or meta["version"] != load_dataset(csv_path).attrs["version"]
+            or meta["credit_buckets"] != credit_buckets
+            or meta["histogram_bins"] != (histogram_bins or {})
+        ):
+            build_database(csv_path, db_path, credit_buckets=credit_buckets, histogram_bins=histogram_bins)
+        return cls(db_path, **kwargs)
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.connection = connection
+        return connection
+
+    def summary(self):
+        """Opções e limites dos filtros da sidebar."""
+        return {
+            "rows": self.meta["rows"],
+            "version": self.version,
+            "risk_options": self.meta["risk_options"],
+            "age_bounds": tuple(self.meta["bounds"]["age_in_years"]),
+            "credit_bounds": tuple(self.meta["bounds"]["credit_amount"]),
+        }
+
+    def _where(self, risk, age_range, credit_range):
+        codes = [self.risk_labels.index(label) for label in risk if label in self.risk_labels]
+        clause = (
+            f"risk IN ({', '.join('?' * len(codes))}) AND age_in_years BETWEEN ? AND ? "
+            "AND credit_amount BETWEEN ? AND ?"
+        )
+        return clause, [*codes, int(age_range[0]), int(age_range[1]), int(credit_range[0]), int(credit_range[1])]
+
+    def query(self, risk, age_range, credit_range):
+        """Agrega as linhas com risco em `risk` e idade/crédito dentro dos intervalos (inclusive)."""
+        risk_mask = np.isin(self.risk_labels, list(risk))
+        age_low, age_high = max(int(age_range[0]), self.age_values[0]), min(int(age_range[1]), self.age_values[-1])
+        credit_low, credit_high = int(credit_range[0]), int(credit_range[1])
+        vector = np.zeros(self.vector_size)
+
+        overlapping = np.flatnonzero((self.bucket_max >= credit_low) & (self.bucket_min <= credit_high))
+        if risk_mask.any() and age_low <= age_high and overlapping.size:
+            # Faixas cortadas: soma só as linhas dentro do filtro ou, se forem menos,
+            # inclui a faixa inteira no retângulo e subtrai as linhas de fora.
+            first, last = overlapping[0], overlapping[-1]
+            rect_first, rect_last = first, last
+            added, removed = [], []
+            for bucket in {first, last}:
+                low, high = int(self.bucket_min[bucket]), int(self.bucket_max[bucket])
+                if credit_low <= low and high <= credit_high:
+                    continue
+                inside = [(max(credit_low, low), min(credit_high, high))]
+                outside = [(low, credit_low - 1)] * (credit_low > low) + [(credit_high + 1, high)] * (credit_high < high)
+                if self._count_credit(inside) <= self._count_credit(outside):
+                    added += inside
+                    rect_first += bucket == first
+                    rect_last -= bucket == last
+                else:
+                    removed += outside
+
+            if rect_first <= rect_last:
+                vector += self._rectangle(age_low - self.age_values[0], age_high - self.age_values[0], rect_first, rect_last)
+            for credit_band in added:
+                vector += self._aggregate_rows(risk, (age_low, age_high), credit_band)
+            for credit_band in removed:
+                vector -= self._aggregate_rows(risk, (age_low, age_high), credit_band)
+        return self._build(vector, risk_mask)
+
+    def _count_credit(self, credit_bands):
+        return sum(
+            self.connection.execute(
+                f"SELECT COUNT(*) FROM {TABLE} INDEXED BY idx_credit_amount WHERE credit_amount BETWEEN ? AND ?",
+                (int(low), int(high)),
+            ).fetchone()[0]
+            for low, high in credit_bands
+        )
+
+    def _rectangle(self, age_first, age_last, bucket_first, bucket_last):
+        """Soma das células idade x faixa no retângulo, por inclusão-exclusão das somas acumuladas."""
+        corners = {
+            (age_last, bucket_last): 1,
+            (age_first - 1, bucket_last): -1,
+            (age_last, bucket_first - 1): -1,
+            (age_first - 1, bucket_first - 1): 1,
+        }
+        corners = {corner: sign for corner, sign in corners.items() if min(corner) >= 0}
+        condition = " OR ".join(["(age_idx = ? AND bucket = ?)"] * len(corners))
+        params = [int(value) for corner in corners for value in corner]
+        vector = np.zeros(self.vector_size)
+        for age_idx, bucket, blob in self.connection.execute(
+            f"SELECT age_idx, bucket, vector FROM prefix WHERE {condition}", params
+        ):
+            vector += corners[(age_idx, bucket)] * np.frombuffer(blob, dtype=np.float64)
+        return vector
+
+    def _aggregate_rows(self, risk, age_range, credit_range):
+        """Contagens de todas as dimensões (e somas de crédito) das linhas dentro dos filtros, via GROUP BY."""
+        where, params = self._where(risk, age_range, credit_range)
+        table = f"{TABLE} INDEXED BY idx_credit_amount"
+        parts = [
+            f"SELECT {offset}, {expression}, risk, COUNT(*) FROM {table} WHERE {where} GROUP BY 2, 3"
+            for _, offset, expression in self.layout.values()
+        ]
+        parts.append(f"SELECT {self.credit_offset}, 0, risk, SUM(credit_amount) FROM {table} WHERE {where} GROUP BY 3")
+        n_risk = len(self.risk_labels)
+        vector = np.zeros(self.vector_size)
+        for offset, value, code, total in self.connection.execute(" UNION ALL ".join(parts), params * len(parts)):
+            if offset == self.layout["age_in_years"][1]:
+                value -= self.age_values[0]
+            vector[offset + value * n_risk + code] = total
+        return vector
+
+    def _build(self, vector, risk_mask):
+        n_risk = len(self.risk_labels)
+        counts = np.rint(vector[:self.credit_offset]).astype(np.int64)
+        dimensions = {}
+        for name, (labels, offset, _) in self.layout.items():
+            matrix = counts[offset:offset + len(labels) * n_risk].reshape(len(labels), n_risk)
+            matrix[:, ~risk_mask] = 0
+            dimensions[name] = (labels, matrix)
+        credit_sums = np.where(risk_mask, vector[self.credit_offset:], 0.0)
+        age_counts = dimensions["age_in_years"][1]
+        return Aggregates(
+            self.risk_labels,
+            age_counts.sum(axis=0),
+            {"age_in_years": self.age_values @ age_counts, "credit_amount": credit_sums},
+            dimensions,
+            self.bin_edges,
+        )
+
+    @property
+    def crosstab_columns(self):
+        """Colunas categóricas que podem ser cruzadas em crosstab (risco primeiro)."""
+        return ["risk"] + [column for column in self.meta["categories"] if column != "risk"]
+
+    def crosstab(self, rows, columns, risk, age_range, credit_range):
+        """Crosstab de `rows` x `columns` das linhas dentro dos filtros, via GROUP BY."""
+        row_labels, column_labels = self.meta["categories"][rows], self.meta["categories"][columns]
+        counts = np.zeros((len(row_labels), len(column_labels)), dtype=np.int64)
+        where, params = self._where(risk, age_range, credit_range)
+        for row, column, total in self.connection.execute(
+            f'SELECT "{rows}", "{columns}", COUNT(*) FROM {TABLE} WHERE {where} GROUP BY 1, 2', params
+        ):
+            # Código -1: valor ausente, que o pandas também deixa fora das tabelas
+            if row >= 0 and column >= 0:
+                counts[row, column] = total
+        return Crosstab(rows, row_labels, columns, column_labels, counts)
+
+    @property
+    def columns(self):
+        """Colunas da tabela, na ordem do dataset."""
+        return [row[1] for row in self.connection.execute(f"PRAGMA table_info({TABLE})")]
+
+    def row_chunks(self, columns, risk, age_range, credit_range, chunk_rows=1 << 16):
+        """Blocos (DataFrames) das linhas dentro dos filtros, na ordem do dataset, com os rótulos das categorias.
+
+        Sempre gera ao menos um bloco (vazio, com os tipos das colunas, se nenhuma linha passar).
+        """
+        where, params = self._where(risk, age_range, credit_range)
+        types = {row[1]: row[2] for row in self.connection.execute(f"PRAGMA table_info({TABLE})")}
+        selected = ", ".join(f'"{column}"' for column in columns)
+        cursor = self.connection.execute(f"SELECT {selected} FROM {TABLE} WHERE {where} ORDER BY rowid", params)
+        first = True
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows and not first:
+                return
+            first = False
+            values = list(zip(*rows)) if rows else [()] * len(columns)
+            data = {}
+            for column, column_values in zip(columns, values):
+                dtype = np.int64 if types[column] == "INTEGER" else np.float64
+                column_values = np.asarray(column_values, dtype=dtype)
+                if column in self.meta["categories"]:
+                    column_values = pd.Categorical.from_codes(
+                        column_values, categories=self.meta["categories"][column], validate=False
+                    )
+                data[column] = column_values
+            yield pd.DataFrame(data)
+            if len(rows) < chunk_rows:
+                return
+
+    def scatter_points(self, risk, age_range, credit_range):
+        """Pontos da dispersão (x, y e risco) das linhas dentro dos filtros."""
+        x, y = self.scatter_columns
+        where, params = self._where(risk, age_range, credit_range)
+        points = pd.DataFrame(
+            self.connection.execute(f'SELECT "{x}", "{y}", risk FROM {TABLE} WHERE {where} ORDER BY rowid', params).fetchall(),
+            columns=[x, y, "risk"],
+        )
+        points["risk"] = np.asarray(self.risk_labels, dtype=object)[points["risk"].to_numpy(dtype=int)]
+        return points
+
+    def scatter_cells(self, risk, age_range, credit_range):
+        """Células não vazias da grade da dispersão, no formato de DensityGrid.cells_frame."""
+        x, y = self.scatter_columns
+        where, params = self._where(risk, age_range, credit_range)
+        cells = np.asarray(
+            self.connection.execute(
+                f"SELECT risk, {_bin_case(x, self.x_edges)}, {_bin_case(y, self.y_edges)}, COUNT(*) "
+                f"FROM {TABLE} WHERE {where} GROUP BY 1, 2, 3 ORDER BY 1, 2, 3",
+                params,
+            ).fetchall(),
+            dtype=np.int64,
+        ).reshape(-1, 4)
+        x_centers = (self.x_edges[:-1] + self.x_edges[1:]) / 2
+        y_centers = (self.y_edges[:-1] + self.y_edges[1:]) / 2
+        return pd.DataFrame({
+            "risk": np.asarray(self.risk_labels, dtype=object)[cells[:, 0]],
+            "x": x_centers[cells[:, 1]],
+            "y": y_centers[cells[:, 2]],
+            "count": cells[:, 3],
+        })
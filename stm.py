@@ -1,6 +1,14 @@
+import functools
+import json
+import os
+import uuid
+from contextlib import contextmanager
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
+
+import export
+from dashboard import DATA_BACKEND, DATA_PATH, WATCH_INTERVAL, Dashboard, compute_metrics
+from profiling import RerunProfiler
 
 st.set_page_config(
     page_title="German Credit Data Dashboard",
@@ -8,6 +16,11 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# --- Instrumentação de desempenho ---
+# Um profiler por execução; o botão do painel de desempenho liga o cProfile só na execução seguinte
+profiler = RerunProfiler(cprofile=st.session_state.pop('cprofile_next_run', False))
+st.session_state['profiler'] = profiler
+session_id = st.session_state.setdefault('session_id', uuid.uuid4().hex[:12])
 
 
 # --- Nova Paleta de Cores ---
@@ -175,229 +188,18 @@ if theme == 'dark':
         unsafe_allow_html=True,
     )
 
-@st.cache_data
-def load_data():
-    """Carrega o dataset German Credit Data."""
-    df = pd.read_csv("german_credit_data_treated.csv")
-    return df
-
-@st.cache_data
-def get_age_bins(df_age_in_years):
-    """Cria faixas etárias para a coluna 'age_in_years'."""
-    # Define os rótulos das faixas etárias de forma mais flexível
-    bins = [18, 31, 41, 51, 61, df_age_in_years.max() + 1] # Ajusta o último bin para incluir o max
-    labels = [f'{int(bins[i])}-{int(bins[i+1]-1)}' for i in range(len(bins)-2)] + [f'{int(bins[-2])}+']
-    
-    # Garante que pd.cut não gere erros se o df_age_in_years estiver vazio
-    if not df_age_in_years.empty:
-        age_bins = pd.cut(
-            df_age_in_years,
-            bins=bins,
-            right=False,
-            labels=labels,
-            include_lowest=True
-        )
-        age_bins.name = 'age_bins'
-        return age_bins
-    return pd.Series([], dtype='object') # Retorna uma série vazia com dtype compatível
-
-
-def plot_risk_distribution(df):
-            # Conta os tipos de risco
-    risk_counts = df['risk'].value_counts()
-    num_riscos = risk_counts.size
-
-    if num_riscos > 1:
-        # Quando tem mais de um risco, mostra proporção
-        risk_dist = risk_counts.reset_index()
-        risk_dist.columns = ['Risco', 'Contagem']
-        risk_dist['Proporcao'] = (risk_dist['Contagem'] / risk_dist['Contagem'].sum()) * 100
-
-        fig = px.bar(
-            risk_dist,
-            x=["Distribuição de Risco"] * num_riscos,
-            y='Proporcao',
-            color='Risco',
-            text='Proporcao',
-            labels={'Proporcao': 'Proporção (%)'},
-            title='Distribuição Percentual de Risco de Crédito',
-        )
-
-        fig.update_layout(
-            barmode='stack',
-            yaxis=dict(range=[0, 100]),
-            xaxis_title='',
-            yaxis_title='Proporção (%)',
-            showlegend=True
-        )
-
-        fig.update_traces(
-            texttemplate='%{text:.1f}%',
-            textposition='inside'
-        )
-
-    else:
-        # Quando só tem um risco, mostra a contagem absoluta
-        risco = risk_counts.index[0]
-        contagem = risk_counts.iloc[0]
-
-        df_count = {'Risco': [risco], 'Contagem': [contagem]}
-        fig = px.bar(
-            df_count,
-            x='Risco',
-            y='Contagem',
-            text='Contagem',
-            labels={'Contagem': 'Quantidade'},
-            title='Quantidade de Solicitantes por Tipo de Risco',
-        )
-
-        fig.update_traces(
-            texttemplate='%{text}',
-            textposition='outside'
-        )
-        fig.update_layout(
-            yaxis=dict(range=[0, contagem * 1.2]),
-            showlegend=False
-        )
-    return fig
-
-
-def plot_risk_by_age(df):
-    """Gera um gráfico de barras empilhadas de risco por faixa etária."""
-    age_bins = get_age_bins(df['age_in_years'])
-    if age_bins.empty or df['risk'].empty:
-        return px.bar(title="Dados insuficientes para Risco por Faixa Etária")
-
-    temp_df = pd.DataFrame({'age_bins': age_bins, 'risk': df['risk']})
-
-    single_risk_class = temp_df['risk'].nunique() == 1
-    normalize = 'index' if not single_risk_class else False
-
-    risk_by_age = pd.crosstab(temp_df['age_bins'], temp_df['risk'], normalize=normalize)
-    
-    # Adiciona colunas ausentes com 0s
-    all_risks = ['Good Risk', 'Bad Risk']
-    for r in all_risks:
-        if r not in risk_by_age.columns:
-            risk_by_age[r] = 0.0
-
-    risk_by_age = risk_by_age[all_risks]
-    risk_by_age_long = risk_by_age.reset_index().melt(id_vars='age_bins', value_name='valor', var_name='risk')
-
-    y_label = 'Percentual (%)' if not single_risk_class else 'Contagem'
-
-    fig = px.bar(
-        risk_by_age_long,
-        x='age_bins',
-        y='valor',
-        color='risk',
-        title="Distribuição de Risco por Faixa Etária" + (" (%)" if not single_risk_class else " (Contagem)"),
-        labels={'age_bins': 'Faixa Etária', 'valor': y_label},
-        color_discrete_map={'Good Risk': '#2ecc71', 'Bad Risk': '#e74c3c'}
-    )
-    fig.update_layout(barmode='stack', font=dict(size=14), height=400)
-    return fig
-
-
-def plot_age_distribution(df):
-    """Gera um histograma da distribuição de idade."""
-    fig = px.histogram(
-        df, x='age_in_years', nbins=20, title="Distribuição de Idade dos Solicitantes",
-        labels={'age_in_years': 'Idade', 'count': 'Quantidade'},
-        color_discrete_sequence=['#3498db']
-    )
-    fig.update_layout(font=dict(size=14), height=400)
-    return fig
-
-def plot_personal_status(df):
-    """Gera um gráfico de barras do status pessoal e sexo."""
-    personal_status_counts = df['personal_status_sex'].value_counts()
-    fig = px.bar(
-        x=personal_status_counts.values, y=personal_status_counts.index, orientation='h',
-        title="Status Pessoal e Sexo", labels={'x': 'Quantidade', 'y': 'Status'},
-        color_discrete_sequence=['#9b59b6']
-    )
-    fig.update_layout(font=dict(size=14), height=400)
-    return fig
-
-def plot_credit_amount_distribution(df):
-    """Gera um histograma da distribuição do valor do crédito."""
-    fig = px.histogram(
-        df, x='credit_amount', nbins=30, title="Distribuição do Valor do Crédito",
-        labels={'credit_amount': 'Valor do Crédito (DM)', 'count': 'Quantidade'},
-        color_discrete_sequence=['#f39c12']
-    )
-    fig.update_layout(font=dict(size=14), height=400)
-    return fig
-
-def plot_credit_vs_duration(df):
-    """Gera um gráfico de dispersão de valor do crédito vs duração."""
-    fig = px.scatter(
-        df, x='credit_amount', y='duration_in_month', color='risk',
-        title="Valor do Crédito vs Duração",
-        labels={'credit_amount': 'Valor do Crédito (DM)', 'duration_in_month': 'Duração (meses)'},
-        color_discrete_map={'Good Risk': '#2ecc71', 'Bad Risk': '#e74c3c'}
-    )
-    fig.update_layout(font=dict(size=14), height=400)
-    return fig
-
-def plot_purpose_distribution(df):
-    """Gera um gráfico de barras da distribuição do propósito do crédito."""
-    purpose_counts = df['purpose'].value_counts()
-    fig = px.bar(
-        x=purpose_counts.values, y=purpose_counts.index, orientation='h', title="Propósito do Crédito",
-        labels={'x': 'Quantidade', 'y': 'Propósito'},
-        color_discrete_sequence=['#1abc9c']
-    )
-    fig.update_layout(font=dict(size=14), height=500)
-    return fig
-
-def plot_housing_type_distribution(df):
-    """Gera um gráfico de pizza da distribuição do tipo de habitação."""
-    housing_counts = df['housing_type'].value_counts()
-    fig = px.pie(
-        values=housing_counts.values, names=housing_counts.index, title="Tipo de Habitação",
-        color_discrete_sequence=['#ff6b6b', '#4ecdc4', '#45b7d1']
-    )
-    fig.update_traces(textposition='inside', textinfo='percent+label')
-    fig.update_layout(font=dict(size=14), height=400)
-    return fig
-
-def plot_risk_by_category(df, column, title, xaxis_label):
-    """Gera gráfico de barras empilhadas para qualquer coluna categórica."""
-    if df.empty or df['risk'].empty or column not in df.columns:
-        return px.bar(title=f"Dados insuficientes para {title}")
-
-    single_risk_class = df['risk'].nunique() == 1
-    normalize = 'index' if not single_risk_class else False
-
-    risk_by_category = pd.crosstab(df[column], df['risk'], normalize=normalize)
-
-    all_risks = ['Good Risk', 'Bad Risk']
-    for r in all_risks:
-        if r not in risk_by_category.columns:
-            risk_by_category[r] = 0.0
-
-    risk_by_category = risk_by_category[all_risks]
-    risk_by_category_long = risk_by_category.reset_index().melt(id_vars=column, value_name='valor', var_name='risk')
-
-    y_label = 'Percentual (%)' if not single_risk_class else 'Contagem'
-
-    fig = px.bar(
-        risk_by_category_long,
-        x=column,
-        y='valor',
-        color='risk',
-        title=title + (" (%)" if not single_risk_class else " (Contagem)"),
-        labels={column: xaxis_label, 'valor': y_label},
-        color_discrete_map={'Good Risk': '#2ecc71', 'Bad Risk': '#e74c3c'}
-    )
-    fig.update_layout(barmode='stack', font=dict(size=14), height=400)
-    return fig
-
+@st.cache_resource
+def get_dashboard():
+    """Dataset, índices, cubo e cache de figuras, carregados uma vez e compartilhados entre as sessões."""
+    # cache_resource compartilha os mesmos objetos (o snapshot fica mapeado em memória)
+    # em vez de desserializar uma cópia por execução como o cache_data.
+    # CREDIT_WATCH_INTERVAL > 0 liga a observação do CSV de origem
+    return Dashboard(DATA_PATH, backend=DATA_BACKEND, watch_interval=WATCH_INTERVAL)
 
 # --- 4. Carregamento e Filtragem de Dados ---
-df = load_data()
+with profiler.stage('load_data'):
+    dashboard = get_dashboard()
+    summary = dashboard.summary
 
 st.markdown('<h1 class="main-header">Customer Profile Analysis Dashboard</h1>', unsafe_allow_html=True)
 
@@ -412,9 +214,7 @@ com base em 20 atributos diferentes.
 
 st.sidebar.markdown("## Filtros")
 
-# Garante que os valores únicos de 'risk' sejam obtidos do DataFrame original
-# para que o multiselect sempre tenha todas as opções, mesmo que filtradas.
-all_risks = df['risk'].unique().tolist()
+all_risks = summary['risk_options']
 risk_filter = st.sidebar.multiselect(
     "Selecione o tipo de risco:",
     options=all_risks,
@@ -423,49 +223,311 @@ risk_filter = st.sidebar.multiselect(
 
 age_range = st.sidebar.slider(
     "Faixa etária:",
-    min_value=int(df['age_in_years'].min()),
-    max_value=int(df['age_in_years'].max()),
-    value=(int(df['age_in_years'].min()), int(df['age_in_years'].max()))
+    min_value=summary['age_bounds'][0],
+    max_value=summary['age_bounds'][1],
+    value=summary['age_bounds']
 )
 
 credit_range = st.sidebar.slider(
     "Valor do crédito (DM):",
-    min_value=int(df['credit_amount'].min()),
-    max_value=int(df['credit_amount'].max()),
-    value=(int(df['credit_amount'].min()), int(df['credit_amount'].max()))
+    min_value=summary['credit_bounds'][0],
+    max_value=summary['credit_bounds'][1],
+    value=summary['credit_bounds']
 )
 
-# Aplicar filtros de forma robusta
-filtered_df = df.copy() # Trabalha em uma cópia para não modificar o df original
+# Fonte particionada por período (ex.: extratos mensais): as partições fora dos períodos
+# escolhidos nem chegam a ser carregadas
+period_filter = None
+if 'periods' in summary:
+    period_filter = st.sidebar.multiselect(
+        "Período:",
+        options=summary['periods'],
+        default=summary['periods']
+    )
 
-if risk_filter:
-    filtered_df = filtered_df[filtered_df['risk'].isin(risk_filter)]
-else:
-    filtered_df = pd.DataFrame() # Se nenhum risco for selecionado, o DF fica vazio
+# Figuras são reaproveitadas entre sessões pela versão do dataset + filtros normalizados
+figure_cache = dashboard.figure_cache
+filter_key = dashboard.normalize(risk_filter, age_range, credit_range, period_filter)
+
+# Aplicar filtros pelos índices pré-construídos e pelo cubo pré-agregado. A seleção fica
+# na sessão: ao arrastar um slider só as linhas da faixa alterada são somadas ou subtraídas.
+# Em datasets muito grandes (modo aproximado) a primeira resposta vem de uma amostra e é
+# refinada em segundo plano; a estimativa atual fica na sessão.
+estimate = refinement = None
+with profiler.stage('filters'):
+    if dashboard.sample is not None:
+        selection = None
+        estimate = st.session_state.get('estimate')
+        if estimate is None or estimate.version != dashboard.version or estimate.filters != filter_key:
+            estimate = st.session_state['estimate'] = dashboard.estimate(filter_key)
+            st.session_state['refinement'] = dashboard.refine_async(estimate)
+        refinement = st.session_state.get('refinement')
+        aggregates = estimate.aggregates
+    elif dashboard.backend != 'memory':
+        selection = None
+        aggregates = dashboard.aggregate(filter_key)
+    else:
+        selection = st.session_state.get('selection')
+        if selection is None or selection.cube is not dashboard.cube:
+            selection = st.session_state['selection'] = dashboard.new_selection()
+        aggregates = selection.update(risk_filter, age_range, credit_range)
+
+approximate = estimate is not None and not estimate.exact
+st.sidebar.markdown(f"**Registros exibidos:** {'~' if approximate else ''}{aggregates.total} de {summary['rows']}")
+if dashboard.partitions is not None:
+    read = len(dashboard.partitions.prune(*filter_key))
+    st.sidebar.caption(f"Partições lidas: {read} de {len(dashboard.partitions.partitions)}")
+
+# Figuras de uma amostra ficam no cache separadas das exatas, pelo nível da amostra
+figure_variant = f"amostra-{estimate.level}" if approximate else None
+
+def margin_text(metric, unit=''):
+    """Texto ' (± x)' com a semi-amplitude do IC 95% de `metric` no modo aproximado."""
+    margin = estimate.margin(metric) if approximate else 0
+    return f" (± {margin:,.1f}{unit})" if round(margin, 1) else ""
+
+def show_chart(name, aggregates, rows=None):
+    """Desenha o gráfico `name` do dashboard, buscando-o no cache compartilhado ou construindo-o.
+
+    rows() devolve as linhas já selecionadas pela sessão, usadas só se a figura precisar
+    ser construída. Construção, serialização e envio ao navegador são cronometrados
+    separadamente.
+    """
+    profiler = st.session_state['profiler']
+    figure_json = dashboard.figure_json(
+        name, filter_key, aggregates, rows=rows, profiler=profiler, variant=figure_variant
+    )
+    with profiler.stage(name, 'render'):
+        # Como dict (e não go.Figure), o Plotly não revalida o template a cada gráfico
+        st.plotly_chart(json.loads(figure_json), use_container_width=True)
+
+def prefetch_charts(names, aggregates, rows=None):
+    """Com o pool de gráficos ativo, constrói juntas as figuras que faltam no cache.
+
+    Os show_chart seguintes as encontram prontas; sem pool não faz nada.
+    """
+    if dashboard.chart_pool is not None:
+        dashboard.figures_json(
+            names, filter_key, aggregates, rows=rows, profiler=st.session_state['profiler'], variant=figure_variant
+        )
 
-if not filtered_df.empty:
-    filtered_df = filtered_df[
-        (filtered_df['age_in_years'] >= age_range[0]) &
-        (filtered_df['age_in_years'] <= age_range[1]) &
-        (filtered_df['credit_amount'] >= credit_range[0]) &
-        (filtered_df['credit_amount'] <= credit_range[1])
-    ]
+@contextmanager
+def fragment_profiling(name):
+    """Mede a reexecução isolada de um fragmento com um profiler próprio, gravando seu log.
+
+    Dentro da execução completa do script o fragmento usa o profiler da execução.
+    """
+    if not st.session_state['profiler'].finished:
+        yield
+        return
+    fragment_profiler = RerunProfiler(scope=f'fragment:{name}')
+    st.session_state['profiler'] = fragment_profiler
+    try:
+        yield
+    finally:
+        fragment_profiler.finish()
+        fragment_profiler.log(session=session_id, dataset_version=summary['version'])
+
+def profiled_fragment(func):
+    """st.fragment cujas reexecuções isoladas também entram nos logs de desempenho."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with fragment_profiling(func.__name__):
+            return func(*args, **kwargs)
+    return st.fragment(wrapper)
+
+# Abas do conteúdo principal; só a escolhida é calculada e enviada ao navegador
+DASHBOARD_TABS = ["📈 Análise de Risco", "👥 Demografia", "💰 Análise Financeira", "📊 Características Sociais"]
+
+@profiled_fragment
+def render_dashboard_tab(aggregates, selection):
+    """Desenha somente a aba selecionada; trocar de aba reexecuta apenas este fragmento."""
+    tab = st.radio(
+        "Seção do dashboard", DASHBOARD_TABS, horizontal=True,
+        key='dashboard_tab', label_visibility='collapsed'
+    )
+
+    if tab == DASHBOARD_TABS[0]:
+        st.markdown('<h2 class="sub-header">Análise de Risco de Crédito</h2>', unsafe_allow_html=True)
+        prefetch_charts(['risk_distribution', 'risk_by_age'], aggregates)
+        col1, col2 = st.columns(2)
+
+        with col1:
+            show_chart('risk_distribution', aggregates)
+
+        with col2:
+            show_chart('risk_by_age', aggregates)
+
+        # Insight principal de risco
+        risk_counts = aggregates.risk_counts()
+        if 'Bad Risk' in risk_counts:
+            bad_risk_pct_val = risk_counts['Bad Risk'] / aggregates.total * 100
+            st.markdown(f"""
+            <div class="insight-box">
+            <h4>Insight Principal</h4>
+            {bad_risk_pct_val:.1f}% dos solicitantes nos filtros atuais são classificados como mau risco.
+            A análise por faixa etária tende a mostrar que clientes mais jovens têm maior proporção de mau risco.
+            </div>
+            """, unsafe_allow_html=True)
+        else:
+            st.markdown("""
+            <div class="insight-box">
+            <h4>Insight Principal</h4>
+            Para aqueles caracterizados com bom risco, observa-se que a maioria desses são clientes que possuem mais temporalidade em seus empregos, além de realizar operações de crédito em sua maioria para carros, móveis e equipamento de rádio ou tv.
+            </div>
+            """, unsafe_allow_html=True)
+
+    elif tab == DASHBOARD_TABS[1]:
+        st.markdown('<h2 class="sub-header">Análise Demográfica</h2>', unsafe_allow_html=True)
+        prefetch_charts(['age_distribution', 'personal_status'], aggregates)
+        col1, col2 = st.columns(2)
+
+        with col1:
+            show_chart('age_distribution', aggregates)
+
+        with col2:
+            show_chart('personal_status', aggregates)
+
+    elif tab == DASHBOARD_TABS[2]:
+        st.markdown('<h2 class="sub-header">Análise Financeira</h2>', unsafe_allow_html=True)
+        if approximate:
+            scatter_rows = lambda: dashboard.sample.rows(estimate.level, *filter_key)
+        else:
+            scatter_rows = (lambda: selection.rows) if selection else None
+        prefetch_charts(['credit_amount_distribution', 'credit_vs_duration'], aggregates, rows=scatter_rows)
+        col1, col2 = st.columns(2)
+
+        with col1:
+            show_chart('credit_amount_distribution', aggregates)
+
+        with col2:
+            show_chart('credit_vs_duration', aggregates, rows=scatter_rows)
+
+    elif tab == DASHBOARD_TABS[3]:
+        st.markdown('<h2 class="sub-header">Características Sociais</h2>', unsafe_allow_html=True)
+        prefetch_charts(['purpose_distribution', 'housing_type_distribution'], aggregates)
+        col1, col2 = st.columns(2)
+
+        with col1:
+            show_chart('purpose_distribution', aggregates)
+
+        with col2:
+            show_chart('housing_type_distribution', aggregates)
+
+@profiled_fragment
+def render_risk_by_characteristics(aggregates):
+    """Gráficos de risco por característica, calculados apenas quando o usuário os abre."""
+    st.markdown('<h3>Análise de Risco por Características</h3>', unsafe_allow_html=True)
+    if not st.toggle("Mostrar risco por propósito e status de emprego", key='show_risk_by_characteristics'):
+        return
+
+    prefetch_charts(['risk_by_purpose', 'risk_by_employment_status'], aggregates)
+    col1, col2 = st.columns(2)
+
+    with col1:
+        show_chart('risk_by_purpose', aggregates)
+
+    with col2:
+        show_chart('risk_by_employment_status', aggregates)
+
+# Normalizações da tabela cruzada: {rótulo: normalize do pd.crosstab}
+CROSSTAB_NORMALIZE = {"Contagem": False, "% da linha": 'index', "% da coluna": 'columns', "% do total": 'all'}
+
+@profiled_fragment
+def render_crosstab():
+    """Tabela cruzada de duas características quaisquer, sob os filtros atuais.
+
+    As contagens saem das tabelas de contingência pré-agregadas do dashboard (uma
+    passada pelo dataset na primeira vez que um par é pedido, depois só as células).
+    """
+    st.markdown('<h3>Tabela Cruzada</h3>', unsafe_allow_html=True)
+    if not st.toggle("Cruzar duas características", key='show_crosstab'):
+        return
+
+    columns = dashboard.crosstab_columns
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        rows = st.selectbox("Linhas:", columns, index=columns.index('purpose'), key='crosstab_rows')
+    with col2:
+        others = [column for column in columns if column != rows]
+        column = st.selectbox("Colunas:", others, index=others.index('risk') if 'risk' in others else 0,
+                              key='crosstab_columns')
+    with col3:
+        normalize = CROSSTAB_NORMALIZE[st.selectbox("Valores:", list(CROSSTAB_NORMALIZE), key='crosstab_normalize')]
+
+    profiler = st.session_state['profiler']
+    with profiler.stage('crosstab', 'compute'):
+        crosstab = dashboard.crosstab(filter_key, rows, column)
+        figure_json = dashboard.crosstab_json(filter_key, rows, column, normalize, crosstab=crosstab)
+    with profiler.stage('crosstab', 'render'):
+        st.plotly_chart(json.loads(figure_json), use_container_width=True)
+        if not crosstab.empty:
+            table = crosstab.table(normalize)
+            st.dataframe((table * 100).round(1) if normalize else table, use_container_width=True)
+
+@profiled_fragment
+def render_export():
+    """Exportação das linhas dentro dos filtros atuais, em CSV ou Parquet.
+
+    Com o api.py configurado (CREDIT_EXPORT_API_URL) o botão leva ao GET /export, que
+    envia o arquivo em blocos sem passar pela sessão. Sem ele, o arquivo é gravado em
+    disco bloco a bloco (export.write_export), reaproveitado por outras sessões com a
+    mesma versão do dataset e os mesmos filtros, e só é oferecido no st.download_button
+    até export.EXPORT_DOWNLOAD_MAX_BYTES.
+    """
+    st.markdown('<h3>Exportar Dados Filtrados</h3>', unsafe_allow_html=True)
+    if not st.toggle("Exportar as linhas dentro dos filtros", key='show_export'):
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        fmt = st.selectbox("Formato:", list(export.FORMATS), format_func=str.upper, key='export_format')
+    with col2:
+        st.write("")
+        if export.EXPORT_API_URL:
+            st.link_button(f"Baixar {fmt.upper()}", export.export_url(export.EXPORT_API_URL, filter_key, fmt))
+            return
+        if st.button("Gerar arquivo", key='export_generate'):
+            with st.session_state['profiler'].stage('export', 'compute'), st.spinner("Gerando arquivo..."):
+                st.session_state['export'] = (filter_key, fmt, *export.write_export(dashboard, filter_key, fmt))
+
+    # Só oferece o arquivo gerado para os filtros, o formato e a versão atuais
+    generated = st.session_state.get('export')
+    if generated is None or generated[:2] != (filter_key, fmt) or generated[3]['dataset_version'] != dashboard.version:
+        return
+    path, metadata = generated[2:]
+    if not os.path.exists(path):
+        return
+    size = os.path.getsize(path)
+    if size <= export.EXPORT_DOWNLOAD_MAX_BYTES:
+        with open(path, 'rb') as f:
+            st.download_button(f"Baixar {os.path.basename(path)}", f, file_name=os.path.basename(path),
+                               mime=export.FORMATS[fmt][0], key='export_download')
+    else:
+        st.info(
+            f"Arquivo grande demais para o download pela interface "
+            f"(limite de {export.EXPORT_DOWNLOAD_MAX_BYTES / 2**20:,.0f} MB). Ele está em `{path}`; "
+            f"para baixá-lo por streaming, rode o api.py e defina CREDIT_EXPORT_API_URL."
+        )
+    st.caption(
+        f"{metadata['rows']:,} linhas, versão do dataset {metadata['dataset_version']} "
+        f"({size / 1024:,.0f} KB)."
+    )
 
-st.sidebar.markdown(f"**Registros exibidos:** {len(filtered_df)} de {len(df)}")
 
 # --- 5. Seção Principal do Dashboard ---
-if filtered_df.empty:
+if aggregates.empty:
     st.warning("Por favor, selecione ao menos um tipo de risco ou ajuste os filtros para exibir dados.")
 else:
     # Métricas principais
     st.markdown('<h2 class="sub-header">Métricas Principais</h2>', unsafe_allow_html=True)
     col1, col2, col3, col4 = st.columns(4)
 
-    total_applicants = len(filtered_df)
-    good_risk_count = (filtered_df['risk'] == 'Good Risk').sum()
-    good_risk_pct = (good_risk_count / total_applicants * 100) if total_applicants > 0 else 0.0
-    avg_age = filtered_df['age_in_years'].mean()
-    avg_credit = filtered_df['credit_amount'].mean()
+    with profiler.stage('metrics'):
+        metrics = compute_metrics(aggregates)
+        risk_counts = metrics['risk_counts']
+        avg_age = metrics['avg_age']
+        avg_credit = metrics['avg_credit']
 
     with col1:
         st.markdown(f"""
@@ -476,16 +538,13 @@ else:
         """, unsafe_allow_html=True)
 
     with col2:
-        if not filtered_df.empty:
-            risk_counts = filtered_df['risk'].value_counts()
-        
         if 'Bad Risk' in risk_counts and 'Good Risk' in risk_counts:
             # Ambos riscos presentes - mostra % bom risco
-            good_pct = (risk_counts['Good Risk'] / total_applicants * 100)
+            good_pct = metrics['good_risk_pct']
             st.markdown(f"""
             <div class="metric-container">
                 <div class="metric-value">{good_pct:.1f}%</div>
-                <div class="metric-label">Bom Risco</div>
+                <div class="metric-label">Bom Risco{margin_text('good_risk_pct', ' p.p.')}</div>
             </div>
             """, unsafe_allow_html=True)
         elif 'Bad Risk' in risk_counts:
@@ -493,7 +552,7 @@ else:
             st.markdown(f"""
             <div class="metric-container" style="background: linear-gradient(135deg, #e74c3c 0%, #c0392b 100%);">
                 <div class="metric-value">{risk_counts['Bad Risk']}</div>
-                <div class="metric-label">Mau Risco (total)</div>
+                <div class="metric-label">Mau Risco (total){margin_text('total')}</div>
             </div>
             """, unsafe_allow_html=True)
         else:
@@ -501,100 +560,44 @@ else:
             st.markdown(f"""
             <div class="metric-container" style="background: linear-gradient(135deg, #2ecc71 0%, #27ae60 100%);">
                 <div class="metric-value">{risk_counts['Good Risk']}</div>
-                <div class="metric-label">Bom Risco (total)</div>
+                <div class="metric-label">Bom Risco (total){margin_text('total')}</div>
             </div>
             """, unsafe_allow_html=True)
 
     with col3:
-        avg_age = filtered_df['age_in_years'].mean()
         st.markdown(f"""
         <div class="metric-container" style="linear-gradient(135deg, #F39C12 0%, #D35400 100%)">
             <div class="metric-value">{avg_age:.1f}</div>
-            <div class="metric-label">Idade Média</div>
+            <div class="metric-label">Idade Média{margin_text('avg_age')}</div>
         </div>
         """, unsafe_allow_html=True)
 
     with col4:
-        avg_credit = filtered_df['credit_amount'].mean()
         st.markdown(f"""
         <div class="metric-container" style="background: linear-gradient(135deg, #9B59B6 0%, #8E44AD 100%);">
             <div class="metric-value">{avg_credit:,.0f}</div>
-            <div class="metric-label">Crédito Médio (DM)</div>
+            <div class="metric-label">Crédito Médio (DM){margin_text('avg_credit')}</div>
         </div>
         """, unsafe_allow_html=True)
 
-    # Abas para organizar o conteúdo
-    tab1, tab2, tab3, tab4 = st.tabs(["📈 Análise de Risco", "👥 Demografia", "💰 Análise Financeira", "📊 Características Sociais"])
-
-    with tab1:
-        st.markdown('<h2 class="sub-header">Análise de Risco de Crédito</h2>', unsafe_allow_html=True)
-        col1, col2 = st.columns(2)
-
-        with col1:
-            st.plotly_chart(plot_risk_distribution(filtered_df), use_container_width=True)
-
-        with col2:
-            st.plotly_chart(plot_risk_by_age(filtered_df), use_container_width=True)
-
-        # Insight principal de risco
-        if 'Bad Risk' in filtered_df['risk'].unique():
-            bad_risk_pct_val = (filtered_df['risk'] == 'Bad Risk').mean() * 100
-            st.markdown(f"""
-            <div class="insight-box">
-            <h4>Insight Principal</h4>
-            {bad_risk_pct_val:.1f}% dos solicitantes nos filtros atuais são classificados como mau risco.
-            A análise por faixa etária tende a mostrar que clientes mais jovens têm maior proporção de mau risco.
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown("""
-            <div class="insight-box">
-            <h4>Insight Principal</h4>
-            Para aqueles caracterizados com bom risco, observa-se que a maioria desses são clientes que possuem mais temporalidade em seus empregos, além de realizar operações de crédito em sua maioria para carros, móveis e equipamento de rádio ou tv.
-            </div>
-            """, unsafe_allow_html=True)
-
-    with tab2:
-        st.markdown('<h2 class="sub-header">Análise Demográfica</h2>', unsafe_allow_html=True)
-        col1, col2 = st.columns(2)
-
-        with col1:
-            st.plotly_chart(plot_age_distribution(filtered_df), use_container_width=True)
-
-        with col2:
-            st.plotly_chart(plot_personal_status(filtered_df), use_container_width=True)
-
-    with tab3:
-        st.markdown('<h2 class="sub-header">Análise Financeira</h2>', unsafe_allow_html=True)
-        col1, col2 = st.columns(2)
-
-        with col1:
-            st.plotly_chart(plot_credit_amount_distribution(filtered_df), use_container_width=True)
-
-        with col2:
-            st.plotly_chart(plot_credit_vs_duration(filtered_df), use_container_width=True)
-
-    with tab4:
-        st.markdown('<h2 class="sub-header">Características Sociais</h2>', unsafe_allow_html=True)
-        col1, col2 = st.columns(2)
-
-        with col1:
-            st.plotly_chart(plot_purpose_distribution(filtered_df), use_container_width=True)
+    if approximate:
+        st.caption(
+            f"Valores estimados por uma amostra estratificada de {estimate.sample_rows:,} linhas "
+            f"(± = intervalo de confiança de 95%)"
+            + ("; refinando em segundo plano..." if refinement is not None else ".")
+        )
 
-        with col2:
-            st.plotly_chart(plot_housing_type_distribution(filtered_df), use_container_width=True)
+    # Abas para organizar o conteúdo (desenhadas sob demanda)
+    render_dashboard_tab(aggregates, selection)
 
     # Seção de análise avançada
-    #st.markdown('<h2 class="sub-header">Análise Avançada</h2>', unsafe_allow_html=True)
-
-    st.markdown('<h3>Análise de Risco por Características</h3>', unsafe_allow_html=True)
-    col1, col2 = st.columns(2)
+    render_risk_by_characteristics(aggregates)
 
-    with col1:
-        st.plotly_chart(plot_risk_by_category(filtered_df, 'purpose', 'Propósito', 'Propósito'), use_container_width=True)
+    # Tabela cruzada de duas características escolhidas
+    render_crosstab()
 
-    with col2:
-        st.plotly_chart(plot_risk_by_category(filtered_df, 'employment_status', 'Status de Emprego', 'Status de Emprego'), use_container_width=True)
+    # Exportação das linhas filtradas
+    render_export()
 
     # Rodapé
     st.markdown("---")
@@ -605,4 +608,74 @@ else:
     </div>
     """, unsafe_allow_html=True)
 
+# Estatísticas do cache de figuras compartilhado entre as sessões
+cache_stats = figure_cache.stats()
+st.sidebar.caption(
+    f"Cache de gráficos: {cache_stats['hits']} acertos, {cache_stats['misses']} faltas, "
+    f"{cache_stats['entries']} figuras ({cache_stats['size_bytes'] / 1024:,.0f} KB)"
+)
+
+# --- Painel de desempenho ---
+# O relatório da execução vai para os logs JSON (com CREDIT_PROFILE_LOG); o painel o mostra na sidebar quando ligado
+profiler.finish()
+profiler.log(
+    session=session_id, dataset_version=summary['version'],
+    selection_update=selection.last_update if selection else None,
+    session_bytes=selection.nbytes if selection else 0,
+)
+
+def request_cprofile():
+    st.session_state['cprofile_next_run'] = True
 
+if st.sidebar.toggle("Painel de desempenho", key='show_profiling_panel'):
+    with st.sidebar.container(border=True):
+        by_kind = profiler.totals_by_kind()
+        st.caption(
+            f"Execução: {profiler.total_seconds * 1000:,.0f} ms | "
+            + " | ".join(f"{kind}: {seconds * 1000:,.0f} ms" for kind, seconds in by_kind.items())
+        )
+        st.dataframe(
+            [
+                {'etapa': record['stage'], 'tipo': record['kind'], 'ms': round(record['seconds'] * 1000, 2)}
+                for record in profiler.stages
+            ],
+            hide_index=True, use_container_width=True,
+        )
+        st.caption("Trocas de aba e do toggle reexecutam só o fragmento e aparecem apenas nos logs (CREDIT_PROFILE_LOG).")
+        # Dataset, índices e cubo são compartilhados; cada sessão guarda só o bitmap da sua seleção
+        memory = dashboard.memory_report()
+        st.caption(
+            f"Memória: dataset {memory['dataset_bytes'] / 2**20:,.2f} MB (mapeado) e índices/cubo "
+            f"{memory['shared_bytes'] / 2**20:,.2f} MB compartilhados | esta sessão "
+            f"{(selection.nbytes if selection else 0) / 1024:,.1f} KB | {memory['sessions']} sessões: "
+            f"{sum(memory['session_bytes']) / 1024:,.1f} KB"
+        )
+        st.button("Perfilar próxima execução (cProfile)", on_click=request_cprofile)
+        if profiler.cprofile_error:
+            st.warning(f"cProfile indisponível nesta execução: {profiler.cprofile_error}")
+        if profiler.has_cprofile:
+            st.code(profiler.cprofile_text(), language=None)
+            st.download_button(
+                "Baixar estatísticas (.prof)", profiler.cprofile_dump(),
+                file_name=f"rerun-{profiler.started_at:%Y%m%d-%H%M%S}.prof",
+            )
+
+# --- Modo aproximado: refinamento ---
+# A página acima foi desenhada com a estimativa atual, sem esperar o refinamento em segundo
+# plano. Enquanto ele não termina, este fragmento verifica a cada REFINE_POLL_SECONDS se já
+# há resultado; quando há, a estimativa refinada é guardada na sessão e a página é redesenhada.
+REFINE_POLL_SECONDS = 0.25
+
+@st.fragment(run_every=REFINE_POLL_SECONDS)
+def watch_refinement():
+    refinement = st.session_state.get('refinement')
+    if refinement is None or not refinement.done():
+        return
+    st.session_state['refinement'] = None
+    refined, current = refinement.result(), st.session_state.get('estimate')
+    if current is not None and (refined.version, refined.filters) == (current.version, current.filters):
+        st.session_state['estimate'] = refined
+    st.rerun()
+
+if refinement is not None:
+    watch_refinement()
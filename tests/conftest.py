@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_data import SOURCE_PATH  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def source():
+    """German Credit original, com as colunas de texto como categorias."""
+    df = pd.read_csv(os.path.join(ROOT, SOURCE_PATH))
+    for column in df.select_dtypes("object").columns:
+        df[column] = df[column].astype("category")
+    return df
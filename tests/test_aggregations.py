@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from aggregations import DensityGrid
+
+
+def risk_frame(risk, credit, duration):
+    return pd.DataFrame({
+        'risk': pd.Categorical(risk, categories=['Bad Risk', 'Good Risk']),
+        'credit_amount': credit,
+        'duration_in_month': duration,
+    })
+
+
+def test_density_grid_drops_rows_without_risk():
+    df = risk_frame(['Good Risk', None, 'Bad Risk'], [1000, 2000, 3000], [12, 24, 36])
+    grid = DensityGrid(df, 'credit_amount', 'duration_in_month', x_bins=4, y_bins=3)
+
+    counts = grid.counts(np.arange(len(df)))
+    assert counts.sum() == 2
+    assert counts[0].sum() == 1 and counts[1].sum() == 1
+    cells = grid.cells_frame(np.arange(len(df)))
+    assert sorted(cells['risk']) == ['Bad Risk', 'Good Risk']
+
+
+def test_density_grid_extended_drops_appended_rows_without_risk():
+    df = risk_frame(['Good Risk', 'Bad Risk'], [1000, 3000], [12, 36])
+    grid = DensityGrid(df, 'credit_amount', 'duration_in_month', x_bins=4, y_bins=3)
+
+    appended = risk_frame(['Good Risk', 'Bad Risk', None, 'Good Risk'], [1000, 3000, 2000, 2500], [12, 36, 24, 30])
+    extended = grid.extended(appended)
+    assert extended is not None
+    counts = extended.counts(np.arange(len(appended)))
+    assert counts.sum() == 3
+    assert np.array_equal(extended.counts(np.arange(2)), grid.counts(np.arange(2)))
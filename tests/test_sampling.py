@@ -0,0 +1,60 @@
+import os
+
+import pandas as pd
+import pytest
+
+import dashboard as dashboard_module
+from dashboard import Dashboard
+from generate_data import CreditDataGenerator
+from sampling import Estimate, refine
+
+
+@pytest.fixture(scope="module")
+def approx_dashboard(tmp_path_factory, source):
+    """Dashboard no modo aproximado sobre 4.000 linhas sintéticas (níveis de 200 e 800 linhas)."""
+    path = os.path.join(tmp_path_factory.mktemp("approx"), "german_credit.csv")
+    raw = source.astype({column: object for column in source.select_dtypes("category").columns})
+    CreditDataGenerator(raw, seed=7).write_csv(path, 4000)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(dashboard_module, "APPROX_SAMPLE_ROWS", 200)
+        dashboard = Dashboard(path, approx_min_rows=1000, chart_workers=0)
+    yield dashboard
+    dashboard.close()
+
+
+def missed_filter(dashboard):
+    """Filtros de uma única idade e valor de crédito presentes no dataset mas em nenhuma linha do nível 0."""
+    df = dashboard.df
+    ages, credit = df["age_in_years"].to_numpy(), df["credit_amount"].to_numpy()
+    sampled = dashboard.sample.rows(0, dashboard.cube.risk_labels, (ages.min(), ages.max()), (credit.min(), credit.max()))
+    taken = set(zip(ages[sampled].tolist(), credit[sampled].tolist()))
+    for age, amount in zip(ages.tolist(), credit.tolist()):
+        if (age, amount) not in taken:
+            return dashboard.normalize(None, (age, age), (amount, amount))
+    pytest.skip("o nível 0 cobre todas as combinações de idade e crédito")
+
+
+def test_empty_sample_estimate_is_not_within_error(approx_dashboard):
+    filters = missed_filter(approx_dashboard)
+    aggregates, intervals, rows = approx_dashboard.sample.query(0, *filters)
+    assert aggregates.total == 0 and intervals == {}
+
+    estimate = Estimate(approx_dashboard.version, filters, aggregates, intervals, level=0, sample_rows=rows)
+    assert not estimate.within(0.01)
+    refined = refine(estimate, approx_dashboard.sample, lambda: approx_dashboard.aggregate(filters), 0.01)
+    assert refined.exact
+    assert refined.aggregates.total == approx_dashboard.aggregate(filters).total > 0
+
+
+def test_estimate_falls_back_to_exact_when_sample_misses(approx_dashboard):
+    filters = missed_filter(approx_dashboard)
+    estimate = approx_dashboard.estimate(filters)
+    assert estimate.exact
+    assert estimate.aggregates.total == approx_dashboard.aggregate(filters).total > 0
+    assert approx_dashboard.refine_async(estimate) is None
+
+
+def test_estimate_uses_sample_for_wide_filters(approx_dashboard):
+    estimate = approx_dashboard.estimate(approx_dashboard.normalize())
+    assert estimate.level == 0
+    assert abs(estimate.aggregates.total - 4000) <= estimate.margin("total") + 1
@@ -0,0 +1,48 @@
+"""Observa o CSV de origem e atualiza o Dashboard quando o arquivo muda.
+
+A cada `interval` segundos o SourceWatcher chama Dashboard.refresh(): enquanto o CSV
+não muda isso custa um os.stat e a leitura do meta.json do snapshot. Linhas
+acrescentadas ao fim do arquivo (a carga noturna) são ingeridas sem reler o resto;
+qualquer outra mudança reconstrói o snapshot (ver data.refresh_snapshot).
+"""
+import logging
+import threading
+
+
+logger = logging.getLogger("credit_dashboard.watcher")
+
+
+class SourceWatcher:
+    """Thread de fundo que verifica periodicamente o CSV de um Dashboard.
+
+    refreshes conta as atualizações feitas; error guarda o erro da última verificação
+    (None se ela deu certo), que é repetida no intervalo seguinte.
+    """
+
+    def __init__(self, dashboard, interval):
+        self.dashboard = dashboard
+        self.interval = interval
+        self.refreshes = 0
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="source-watcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self.dashboard.refresh():
+                    self.refreshes += 1
+                    logger.info(
+                        "dataset atualizado: versão %s, %d linhas", self.dashboard.version,
+                        self.dashboard.summary['rows'],
+                    )
+                self.error = None
+            except Exception as error:
+                # Ex.: o arquivo sendo regravado no momento da leitura; tenta de novo depois
+                self.error = error
+                logger.warning("falha ao atualizar o dataset: %s", error)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()